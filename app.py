@@ -1,50 +1,73 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
+
 import time
-import sys
-import traceback
 
-from datetime import datetime,date
+# Start of the app import, the reference point of the startup report.
+IMPORT_STARTED = time.perf_counter()
+
+# pylint: disable=wrong-import-position
+import asyncio
+import logging
+import multiprocessing
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from http import HTTPStatus
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict
+
 from aiohttp import web
 from aiohttp.web import Request, Response, json_response
-from botbuilder.core import (
-    BotFrameworkAdapterSettings,
-    TurnContext,
-    BotFrameworkAdapter,
-    MessageFactory,
-    CardFactory
-)
-from botbuilder.core.integration import aiohttp_error_middleware
-from botbuilder.schema import (
-    Activity,
-    ActivityTypes,
-    ConversationReference,
-    CardAction,
-    ActionTypes,
-    HeroCard,
-    SuggestedActions
-)
 
-from bots import TeamsFileUploadBot
 from config import DefaultConfig
+from helpers import metrics
+
+if TYPE_CHECKING:
+    from botbuilder.core import TurnContext
+    from botbuilder.schema import ConversationReference
 
 CONFIG = DefaultConfig()
+logging.basicConfig(
+    level=CONFIG.LOG_LEVEL, format="%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# With several server processes, state that must be seen by all of them lives in SQLite.
+SHARED_STATE = CONFIG.WEB_WORKERS > 1
+
+# If the channel is the Emulator, and authentication is not in use, the AppId will be null.
+# We generate a random AppId for this case only. This is not required for production, since
+# the AppId will have a value.
+APP_ID = CONFIG.APP_ID if CONFIG.APP_ID else str(uuid.uuid4())
+
+# The adapter and the bot are built on first use (see _ensure_adapter and _ensure_bot),
+# so the server starts listening without importing the Bot Framework SDK. With
+# LazyStartup=0 they are built while the server starts instead.
+ADAPTER = None
+BOT = None
+INGRESS = None
+# Tasks started with the adapter and the bot, cancelled on shutdown.
+BACKGROUND_TASKS: Dict[str, asyncio.Future] = {}
+FIRST_ACTIVITY_REPORTED = False
+
 
-# Create adapter.
-# See https://aka.ms/about-bot-adapter to learn more about how bots work.
-SETTINGS = BotFrameworkAdapterSettings(CONFIG.APP_ID, CONFIG.APP_PASSWORD)
-ADAPTER = BotFrameworkAdapter(SETTINGS)
+def _report_startup_phase(phase: str, started: float):
+    seconds = time.perf_counter() - started
+    metrics.STARTUP_SECONDS.set(seconds, phase)
+    logger.info("Startup: %s took %.3fs", phase, seconds)
 
 
 # Catch-all for errors.
-async def on_error(context: TurnContext, error: Exception):
+async def on_error(context: "TurnContext", error: Exception):
+    from botbuilder.schema import Activity, ActivityTypes
+
     # This check writes out errors to console log .vs. app insights.
     # NOTE: In production environment, you should consider logging this to Azure
     #       application insights.
-    print(f"\n [on_turn_error] unhandled error: {error}", file=sys.stderr)
-    traceback.print_exc()
+    logger.error("Unhandled error in turn, error %r", error, exc_info=error)
+    metrics.TURN_ERRORS.inc()
+    # The turn failed, so let a redelivery of this activity be processed again.
+    SEEN_ACTIVITIES.forget(context.activity)
 
     # Send a message to the user
     await context.send_activity("The bot encountered an error or bug.")
@@ -66,17 +89,225 @@ async def on_error(context: TurnContext, error: Exception):
         await context.send_activity(trace_activity)
 
 
-ADAPTER.on_turn_error = on_error
-# Create a shared dictionary.  The Bot will add conversation references when users
-# join the conversation and send messages.
-CONVERSATION_REFERENCES: Dict[str, ConversationReference] = dict()
+def _ensure_adapter():
+    """
+    Build what /api/messages needs to authenticate and acknowledge an activity:
+    the adapter, the deduplicator and the ingress queue.
+    """
+    # pylint: disable=global-statement
+    global CREDENTIALS, SETTINGS, ADAPTER, SEEN_ACTIVITIES, INGRESS
+    if ADAPTER is not None:
+        return
+    started = time.perf_counter()
+    from botbuilder.core import BotFrameworkAdapterSettings
+    from helpers import (
+        ActivityDeduplicator,
+        IngressQueue,
+        PooledBotFrameworkAdapter,
+        RefreshingAppCredentials,
+        ReplyBatchingMiddleware,
+        SqliteActivityDeduplicator,
+    )
 
-# If the channel is the Emulator, and authentication is not in use, the AppId will be null.
-# We generate a random AppId for this case only. This is not required for production, since
-# the AppId will have a value.
-APP_ID = SETTINGS.app_id if SETTINGS.app_id else uuid.uuid4()
-# Create the Bot
-BOT = TeamsFileUploadBot(CONFIG.APP_ID, CONFIG.APP_PASSWORD,CONVERSATION_REFERENCES)
+    # Create adapter.
+    # See https://aka.ms/about-bot-adapter to learn more about how bots work.
+    # The app token is refreshed in the background, and connector clients are pooled per service URL.
+    CREDENTIALS = RefreshingAppCredentials(
+        CONFIG.APP_ID, CONFIG.APP_PASSWORD, refresh_margin=CONFIG.TOKEN_REFRESH_MARGIN
+    )
+    SETTINGS = BotFrameworkAdapterSettings(
+        CONFIG.APP_ID, CONFIG.APP_PASSWORD, app_credentials=CREDENTIALS
+    )
+    ADAPTER = PooledBotFrameworkAdapter(
+        SETTINGS, pool_size=CONFIG.CONNECTOR_POOL_SIZE, timeout=CONFIG.CONNECTOR_TIMEOUT
+    )
+    ADAPTER.on_turn_error = on_error
+    if CONFIG.REPLY_BATCHING:
+        ADAPTER.use(ReplyBatchingMiddleware(max_retries=CONFIG.REPLY_MAX_RETRIES))
+
+    # Recently processed activity ids, shared between workers when there are several.
+    if SHARED_STATE:
+        SEEN_ACTIVITIES = SqliteActivityDeduplicator(
+            CONFIG.SHARED_STATE_PATH, ttl=CONFIG.ACTIVITY_DEDUP_TTL, max_entries=CONFIG.ACTIVITY_DEDUP_SIZE
+        )
+    else:
+        SEEN_ACTIVITIES = ActivityDeduplicator(
+            ttl=CONFIG.ACTIVITY_DEDUP_TTL, max_entries=CONFIG.ACTIVITY_DEDUP_SIZE
+        )
+
+    INGRESS = IngressQueue(
+        _process_turn,
+        max_concurrency=CONFIG.TURN_CONCURRENCY,
+        max_pending=CONFIG.INGRESS_QUEUE_SIZE,
+        enqueue_timeout=CONFIG.INGRESS_ENQUEUE_TIMEOUT,
+    )
+    metrics.QUEUE_DEPTH.set_function(lambda: INGRESS.pending, "turns")
+
+    BACKGROUND_TASKS["token_refresher"] = asyncio.ensure_future(CREDENTIALS.run_refresher())
+    _report_startup_phase("adapter", started)
+
+
+def _ensure_bot():
+    """ Build the bot and the stores and services behind it, and start their background tasks. """
+    # pylint: disable=global-statement
+    global CONVERSATION_REFERENCES, FILE_TRANSFER, UPLOADER, ROSTER_CACHE, FAN_OUT, CARD_TEMPLATES
+    global REPORTS, REPORT_ENGINE, COMPRESSED_REPORTS, PARAMETERS, USER_SETTINGS, ONBOARDING, BOT, BROADCAST_JOBS
+    if BOT is not None:
+        return
+    _ensure_adapter()
+    started = time.perf_counter()
+    from bots import TeamsFileUploadBot
+    from helpers import (
+        BroadcastJobManager,
+        CardTemplates,
+        ChunkedUploader,
+        CoalescingReferenceStore,
+        CompressedReportCache,
+        FanOutScheduler,
+        FileTransferClient,
+        ParameterStore,
+        ReportEngine,
+        ReportRegistry,
+        RosterCache,
+        SqliteBroadcastJobManager,
+        SqliteOnboardingIndex,
+        SqliteRosterCache,
+        UserSettingsStore,
+        create_reference_store,
+    )
+
+    # Create the shared conversation reference store. The Bot will add conversation
+    # references when users join the conversation and send messages; unchanged
+    # references are skipped and real changes are written in periodic batches.
+    CONVERSATION_REFERENCES = CoalescingReferenceStore(
+        create_reference_store(
+            "sqlite" if SHARED_STATE else CONFIG.REFERENCE_STORE,
+            CONFIG.REFERENCE_STORE_PATH,
+            cache_size=CONFIG.REFERENCE_CACHE_SIZE,
+            cache_ttl=CONFIG.REFERENCE_CACHE_TTL if SHARED_STATE else None,
+        ),
+        max_batch=CONFIG.REFERENCE_FLUSH_BATCH,
+        cache_size=CONFIG.REFERENCE_CACHE_SIZE,
+    )
+    # Shared pooled HTTP client for OneDrive uploads and attachment downloads.
+    FILE_TRANSFER = FileTransferClient(
+        limit=CONFIG.TRANSFER_CONNECTION_LIMIT,
+        limit_per_host=CONFIG.TRANSFER_CONNECTION_LIMIT_PER_HOST,
+        timeout=CONFIG.TRANSFER_TIMEOUT,
+        retries=CONFIG.TRANSFER_RETRIES,
+    )
+    UPLOADER = ChunkedUploader(
+        FILE_TRANSFER,
+        chunk_size=CONFIG.UPLOAD_CHUNK_SIZE,
+        max_resumes=CONFIG.UPLOAD_MAX_RESUMES,
+    )
+    if SHARED_STATE:
+        ROSTER_CACHE = SqliteRosterCache(
+            CONFIG.SHARED_STATE_PATH, ttl=CONFIG.ROSTER_CACHE_TTL, max_rosters=CONFIG.ROSTER_CACHE_SIZE
+        )
+    else:
+        ROSTER_CACHE = RosterCache(ttl=CONFIG.ROSTER_CACHE_TTL, max_rosters=CONFIG.ROSTER_CACHE_SIZE)
+    # The Teams rate limit is per bot, so the workers split it between them.
+    FAN_OUT = FanOutScheduler(
+        workers=CONFIG.FANOUT_WORKERS,
+        rate=CONFIG.FANOUT_RATE / CONFIG.WEB_WORKERS,
+        burst=max(CONFIG.FANOUT_BURST / CONFIG.WEB_WORKERS, 1),
+        max_retries=CONFIG.FANOUT_MAX_RETRIES,
+    )
+    CARD_TEMPLATES = CardTemplates()
+    REPORTS = ReportRegistry(CONFIG.REPORTS_DIRECTORY)
+    REPORT_ENGINE = ReportEngine(
+        REPORTS,
+        CONFIG.REPORT_CACHE_DIRECTORY,
+        max_cache_bytes=CONFIG.REPORT_CACHE_BYTES,
+        workers=CONFIG.REPORT_WORKERS,
+    )
+    COMPRESSED_REPORTS = (
+        CompressedReportCache(
+            CONFIG.COMPRESSED_REPORT_DIRECTORY,
+            compression=CONFIG.REPORT_COMPRESSION,
+            level=CONFIG.REPORT_COMPRESSION_LEVEL,
+            max_cache_bytes=CONFIG.COMPRESSED_REPORT_CACHE_BYTES,
+        )
+        if CONFIG.REPORT_COMPRESSION != "none"
+        else None
+    )
+    PARAMETERS = ParameterStore(CONFIG.PARAMETER_STORE_DIRECTORY, max_errors=CONFIG.PARAMETER_MAX_ERRORS)
+    USER_SETTINGS = UserSettingsStore(CONFIG.USER_SETTINGS_DIRECTORY, shared=SHARED_STATE)
+    ONBOARDING = SqliteOnboardingIndex(
+        CONFIG.ONBOARDING_INDEX_PATH, claim_timeout=CONFIG.ONBOARDING_CLAIM_TIMEOUT
+    )
+    # Create the Bot
+    BOT = TeamsFileUploadBot(
+        APP_ID,
+        CONFIG.APP_PASSWORD,
+        CONVERSATION_REFERENCES,
+        FILE_TRANSFER,
+        UPLOADER,
+        ROSTER_CACHE,
+        FAN_OUT,
+        CARD_TEMPLATES,
+        REPORTS,
+        REPORT_ENGINE,
+        USER_SETTINGS,
+        compressed_reports=COMPRESSED_REPORTS,
+        parameters=PARAMETERS,
+        onboarding=ONBOARDING,
+        onboarding_batch_size=CONFIG.ONBOARDING_BATCH_SIZE,
+    )
+
+    # Broadcasts queued by /api/notify. With several workers the job is split into
+    # shards that every worker claims from the shared database, so each member is
+    # messaged once whichever worker took the request.
+    if SHARED_STATE:
+        BROADCAST_JOBS = SqliteBroadcastJobManager(
+            CONFIG.SHARED_STATE_PATH,
+            FAN_OUT,
+            _send_proactive_message,
+            CONVERSATION_REFERENCES.__getitem__,
+            max_history=CONFIG.BROADCAST_JOB_HISTORY,
+            shard_size=CONFIG.BROADCAST_SHARD_SIZE,
+            lease=CONFIG.BROADCAST_LEASE,
+        )
+    else:
+        BROADCAST_JOBS = BroadcastJobManager(
+            FAN_OUT,
+            _send_proactive_message,
+            CONVERSATION_REFERENCES.__getitem__,
+            max_history=CONFIG.BROADCAST_JOB_HISTORY,
+        )
+
+    metrics.QUEUE_DEPTH.set_function(lambda: CONVERSATION_REFERENCES.pending, "reference_writes")
+    metrics.QUEUE_DEPTH.set_function(lambda: REPORT_ENGINE.pending, "report_generation")
+    metrics.QUEUE_DEPTH.set_function(lambda: BROADCAST_JOBS.running, "broadcasts")
+
+    BACKGROUND_TASKS["reference_flusher"] = asyncio.ensure_future(
+        CONVERSATION_REFERENCES.run_flusher(CONFIG.REFERENCE_FLUSH_INTERVAL)
+    )
+    BACKGROUND_TASKS["report_watcher"] = asyncio.ensure_future(
+        REPORTS.run_watcher(CONFIG.REPORTS_POLL_INTERVAL)
+    )
+    BACKGROUND_TASKS["report_cache"] = asyncio.ensure_future(REPORT_ENGINE.load())
+    if SHARED_STATE:
+        BACKGROUND_TASKS["broadcast_worker"] = asyncio.ensure_future(
+            BROADCAST_JOBS.run_worker(CONFIG.BROADCAST_POLL_INTERVAL)
+        )
+    _report_startup_phase("bot", started)
+
+
+# Every turn runs here, through INGRESS: in order per conversation, so a consent accept
+# never races the message that offered the file, and in parallel across conversations.
+# With several web workers the order only holds among the turns each worker received.
+async def _process_turn(item):
+    activity, identity, queued_at = item
+    metrics.TURN_WAIT_SECONDS.observe(time.perf_counter() - queued_at)
+    _ensure_bot()
+    await REPORTS.wait_indexed()
+    try:
+        return await ADAPTER.process_activity_with_identity(activity, identity, BOT.on_turn)
+    except Exception:
+        SEEN_ACTIVITIES.forget(activity)
+        raise
 
 
 # Listen for incoming requests on /api/messages.s
@@ -87,24 +318,78 @@ async def messages(req: Request) -> Response:
     else:
         return Response(status=HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
 
+    _ensure_adapter()
+    from botbuilder.schema import Activity, ActivityTypes
+
     activity = Activity().deserialize(body)
     auth_header = req.headers["Authorization"] if "Authorization" in req.headers else ""
 
-    invoke_response = await ADAPTER.process_activity(
-        activity, auth_header, BOT.on_turn
+    # Reject unauthenticated requests before acknowledging or deduplicating them.
+    identity = await ADAPTER._authenticate_request(  # pylint: disable=protected-access
+        activity, auth_header
     )
-    if invoke_response:
-        return json_response(
-            data=invoke_response.body, status=invoke_response.status
-        )
-    return Response(status=HTTPStatus.OK)
+    # The connector redelivers activities it thinks timed out; drop the copies.
+    if not SEEN_ACTIVITIES.claim(activity):
+        metrics.ACTIVITIES.inc(activity.type, "duplicate")
+        return Response(status=HTTPStatus.OK)
+
+    conversation_id = activity.conversation.id if activity.conversation else ""
+    item = (activity, identity, time.perf_counter())
+
+    # Invokes (file consent) need their response in this request, so the request waits for the turn.
+    if not CONFIG.INGRESS_QUEUE or activity.type == ActivityTypes.invoke:
+        metrics.ACTIVITIES.inc(activity.type, "inline")
+        try:
+            invoke_response = await INGRESS.run(conversation_id, item)
+        except asyncio.QueueFull:
+            SEEN_ACTIVITIES.forget(activity)
+            metrics.ACTIVITIES.inc(activity.type, "rejected")
+            return Response(status=HTTPStatus.SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+        _report_first_activity()
+        if invoke_response:
+            return json_response(
+                data=invoke_response.body, status=invoke_response.status
+            )
+        return Response(status=HTTPStatus.OK)
+
+    if not await INGRESS.submit(conversation_id, item):
+        SEEN_ACTIVITIES.forget(activity)
+        metrics.ACTIVITIES.inc(activity.type, "rejected")
+        return Response(status=HTTPStatus.SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+    metrics.ACTIVITIES.inc(activity.type, "queued")
+    _report_first_activity()
+    return Response(status=HTTPStatus.ACCEPTED)
 
-# Listen for requests on /api/notify, and send a messages to all conversation members.
+
+def _report_first_activity():
+    # pylint: disable=global-statement
+    global FIRST_ACTIVITY_REPORTED
+    if not FIRST_ACTIVITY_REPORTED:
+        FIRST_ACTIVITY_REPORTED = True
+        _report_startup_phase("first_activity", IMPORT_STARTED)
+
+# Listen for requests on /api/notify, and queue a broadcast to all conversation members.
 async def notify(req: Request) -> Response:  # pylint: disable=unused-argument
-    await _send_proactive_message()
-    return Response(status=HTTPStatus.OK, text="Messages have been sent")
+    _ensure_bot()
+    # Only the user ids are read here; each reference is loaded when its message is sent.
+    job = BROADCAST_JOBS.submit(CONVERSATION_REFERENCES)
+    data = job.to_dict()
+    data["status_url"] = f"/api/notify/{job.id}"
+    return json_response(data=data, status=HTTPStatus.ACCEPTED)
+
+
+# Report the progress of a broadcast queued by /api/notify.
+async def notify_status(req: Request) -> Response:
+    _ensure_bot()
+    job = BROADCAST_JOBS.get(req.match_info["job_id"])
+    if job is None:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    return json_response(data=job.to_dict())
+
+async def teams_create_conversation(turn_context: "TurnContext", teams_channel_id: str, message):
+    from botbuilder.core import TurnContext
+    from botbuilder.schema import ConversationParameters
 
-async def teams_create_conversation(self, turn_context: TurnContext, teams_channel_id: str, message):
     params = ConversationParameters(
                                         is_group=True,
                                         channel_data={"channel": {"id": teams_channel_id}},
@@ -112,49 +397,128 @@ async def teams_create_conversation(self, turn_context: TurnContext, teams_chann
                                         )
 
 
-    connector_client = await turn_context.adapter.create_connector_client(turn_context.activity.service_url)
+    # Reuse the turn's pooled connector client rather than building another one.
+    connector_client = turn_context.turn_state.get(turn_context.adapter.BOT_CONNECTOR_CLIENT_KEY)
+    if connector_client is None:
+        connector_client = await turn_context.adapter.create_connector_client(turn_context.activity.service_url)
     conversation_resource_response = await connector_client.conversations.create_conversation(params)
     conversation_reference = TurnContext.get_conversation_reference(turn_context.activity)
     conversation_reference.conversation.id = conversation_resource_response.id
     return [conversation_reference, conversation_resource_response.activity_id]
 
-# Send a message to all conversation members.
-# This uses the shared Dictionary that the Bot adds conversation references to.
-async def _send_proactive_message():
-    for conversation_reference in CONVERSATION_REFERENCES.values():
-        reply = MessageFactory.list([])
-        card = HeroCard(
-            text=f"Hello, {conversation_reference.user.name} today is {date.today().strftime('%B %d, %Y')}, would you like to see the report?",
-            buttons=[
-                CardAction(
-                    type=ActionTypes.im_back, title="Yes", value="Yes, I want to see the Report."
-                ),
-                CardAction(
-                    type=ActionTypes.im_back, title="No", value="No, I don't want to see the Report."
-                ),
-            ],
-        )
-        reply.attachments.insert(0,CardFactory.hero_card(card))
-        await ADAPTER.continue_conversation(
-            conversation_reference,
-            lambda turn_context: turn_context.send_activity(reply),
-            APP_ID,
-        )
+# Send the report prompt to one stored conversation.
+# /api/notify fans this out over the shared store that the Bot adds conversation references to.
+async def _send_proactive_message(conversation_reference: "ConversationReference"):
+    from botbuilder.core import MessageFactory
+    from helpers import run_proactive_turn
+
+    reply = MessageFactory.attachment(CARD_TEMPLATES.report_prompt(conversation_reference.user.name))
+    # A failed send is raised to the broadcast's fan-out (which retries throttling and
+    # counts failures) instead of going to on_error, which would message the user.
+    await run_proactive_turn(
+        lambda callback: ADAPTER.continue_conversation(conversation_reference, callback, APP_ID),
+        lambda turn_context: turn_context.send_activity(reply),
+    )
+
+
+async def _start_background_services(app: web.Application):  # pylint: disable=unused-argument
+    # Connector requests run on the default executor, so give it a thread per pooled connection.
+    asyncio.get_event_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=CONFIG.CONNECTOR_POOL_SIZE)
+    )
+    if not CONFIG.LAZY_STARTUP:
+        _ensure_bot()
+    _report_startup_phase("listen", IMPORT_STARTED)
+
+
+async def _close_background_services(app: web.Application):  # pylint: disable=unused-argument
+    if INGRESS is not None:
+        await INGRESS.close(CONFIG.INGRESS_DRAIN_TIMEOUT)
+    for task in BACKGROUND_TASKS.values():
+        task.cancel()
+    await asyncio.gather(*BACKGROUND_TASKS.values(), return_exceptions=True)
+    BACKGROUND_TASKS.clear()
+    if BOT is not None:
+        if SHARED_STATE:
+            ROSTER_CACHE.close()
+        await BROADCAST_JOBS.close()
+        await FILE_TRANSFER.close()
+        CONVERSATION_REFERENCES.close()
+        ONBOARDING.close()
+        REPORT_ENGINE.close()
+    if ADAPTER is not None:
+        if SHARED_STATE:
+            SEEN_ACTIVITIES.close()
+        await ADAPTER.close()
+
+
+# Prometheus scrape endpoint. Each worker process reports its own metrics.
+async def metrics_endpoint(req: Request) -> Response:  # pylint: disable=unused-argument
+    return Response(
+        body=metrics.REGISTRY.render().encode("utf-8"),
+        headers={"Content-Type": metrics.MetricsRegistry.CONTENT_TYPE},
+    )
+
 
-        #reply = MessageFactory.list([])
-        #reply.attachments.append(self._send_suggested_actions_yes_no(member.name))
-        #return await turn_context.send_activity(reply)
+# The mapping of botbuilder's aiohttp_error_middleware (e.g. a rejected token is a 401),
+# without importing the SDK before the first activity needs it. This app has no skill
+# endpoints, so the SDK's BotActionNotImplementedError is never raised here.
+@web.middleware
+async def error_middleware(request: Request, handler):
+    try:
+        return await handler(request)
+    except NotImplementedError:
+        raise web.HTTPNotImplemented()
+    except PermissionError:
+        raise web.HTTPUnauthorized()
+    except KeyError:
+        raise web.HTTPNotFound()
+    except web.HTTPException:
+        raise
+    except Exception as error:
+        logger.exception("Unhandled error serving %s, error %r", request.path, error)
+        raise web.HTTPInternalServerError()
 
 
 def init_func(argv):
-    APP = web.Application(middlewares=[aiohttp_error_middleware])
+    APP = web.Application(middlewares=[error_middleware])
     APP.router.add_post("/api/messages", messages)
     APP.router.add_get("/api/notify", notify)
+    APP.router.add_get("/api/notify/{job_id}", notify_status)
+    APP.router.add_get("/api/metrics", metrics_endpoint)
+    APP.on_startup.append(_start_background_services)
+    APP.on_cleanup.append(_close_background_services)
     return APP
 
+
+# Application factory for Gunicorn, with WebWorkers set to the same worker count:
+#   WebWorkers=4 gunicorn app:create_app --bind 0.0.0.0:3978 \
+#       --worker-class aiohttp.GunicornWebWorker --workers 4
+async def create_app() -> web.Application:
+    return init_func(None)
+
+
+def _serve():
+    # SO_REUSEPORT lets every worker process accept connections on the same port.
+    web.run_app(
+        init_func(None), host="0.0.0.0", port=CONFIG.PORT, reuse_port=SHARED_STATE
+    )
+
+
+_report_startup_phase("import", IMPORT_STARTED)
+
 if __name__ == "__main__":
-    APP = init_func(None)
+    WORKERS = [
+        multiprocessing.Process(target=_serve, name=f"worker-{index}")
+        for index in range(1, CONFIG.WEB_WORKERS)
+    ]
+    for WORKER in WORKERS:
+        WORKER.start()
     try:
-        web.run_app(APP, host="0.0.0.0", port=CONFIG.PORT)
+        _serve()
     except Exception as error:
         raise error
+    finally:
+        for WORKER in WORKERS:
+            WORKER.terminate()
+            WORKER.join()
@@ -0,0 +1,233 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Local stand-in for the Bot Framework connector and a OneDrive upload session.
+
+Implements the parts of the REST API the bot uses: creating conversations,
+sending and replying to activities, paging through team members, and
+resumable uploads with Content-Range. Every request can be delayed by a fixed
+latency, and a fraction of the connector calls answered with HTTP 429 to
+exercise the bot's throttling paths.
+
+Run on its own to inspect the traffic of a bot started by hand:
+
+    python -m benchmarks.fake_connector --port 3990 --roster 5000 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class FakeConnector:
+    """
+    In-process fake of the connector service. Received activities are recorded
+    so a load driver can measure end-to-end latency: `expect_reply` resolves
+    when the bot answers a given activity id.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            throttle_rate: float = 0.0,
+            retry_after: float = 0.1,
+            roster_size: int = 100,
+            max_page_size: int = 500,
+    ):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.roster_size = roster_size
+        self.max_page_size = max_page_size
+
+        self.base_url = ""
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.throttled = 0
+        self.conversations_created = 0
+        # Activities sent into conversations the bot created, i.e. 1:1 messages to members
+        self.member_messages = 0
+        self._created_conversations = set()
+        self.activities: List[dict] = []
+        self.activities_by_conversation: Dict[str, int] = defaultdict(int)
+        self.uploads: Dict[str, dict] = {}
+        # First member index of each conversation's roster; others start at 0.
+        self.roster_offsets: Dict[str, int] = {}
+        self._reply_waiters: Dict[str, asyncio.Future] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v3/conversations", self._create_conversation)
+        app.router.add_post("/v3/conversations/{conversation_id}/activities", self._send_activity)
+        app.router.add_post(
+            "/v3/conversations/{conversation_id}/activities/{activity_id}", self._send_activity
+        )
+        app.router.add_get("/v3/conversations/{conversation_id}/pagedmembers", self._paged_members)
+        app.router.add_put("/upload/{session_id}", self._upload_range)
+        app.router.add_get("/upload/{session_id}", self._upload_status)
+        app.router.add_route("*", "/{tail:.*}", self._unknown)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 3990):
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.base_url = f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def upload_url(self) -> str:
+        """ A fresh upload session, as returned in a file consent response. """
+        session_id = uuid.uuid4().hex
+        self.uploads[session_id] = {"received": 0, "total": None, "completed_at": None}
+        return f"{self.base_url}/upload/{session_id}"
+
+    def expect_reply(self, activity_id: str) -> asyncio.Future:
+        """ A future resolved with the receipt time of the bot's first reply to `activity_id`. """
+        future = asyncio.get_event_loop().create_future()
+        self._reply_waiters[activity_id] = future
+        return future
+
+    def member(self, index: int) -> dict:
+        return {
+            "id": f"29:member-{index}",
+            "name": f"Member {index}",
+            "aadObjectId": f"00000000-0000-0000-0000-{index:012d}",
+            "givenName": "Member",
+            "surname": str(index),
+            "email": f"member{index}@contoso.example",
+            "userPrincipalName": f"member{index}@contoso.example",
+            "tenantId": "tenant",
+            "userRole": "user",
+        }
+
+    async def _delay(self, kind: str) -> Optional[web.Response]:
+        """ Apply the configured latency, and a 429 for a share of connector calls. """
+        self.requests[kind] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if kind != "upload" and self.throttle_rate and random.random() < self.throttle_rate:
+            self.throttled += 1
+            return web.json_response(
+                {"error": {"code": "TooManyRequests", "message": "Throttled by the fake connector"}},
+                status=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        return None
+
+    async def _create_conversation(self, request: web.Request) -> web.Response:
+        throttled = await self._delay("create_conversation")
+        if throttled is not None:
+            return throttled
+        body = await request.json()
+        self.conversations_created += 1
+        conversation_id = f"a:{uuid.uuid4().hex}"
+        self._created_conversations.add(conversation_id)
+        if body.get("activity"):
+            self._record(conversation_id, body["activity"])
+        return web.json_response(
+            {"id": conversation_id, "activityId": uuid.uuid4().hex, "serviceUrl": self.base_url},
+            status=201,
+        )
+
+    async def _send_activity(self, request: web.Request) -> web.Response:
+        throttled = await self._delay("send_activity")
+        if throttled is not None:
+            return throttled
+        activity = await request.json()
+        self._record(request.match_info["conversation_id"], activity)
+        return web.json_response({"id": uuid.uuid4().hex}, status=201)
+
+    def _record(self, conversation_id: str, activity: dict):
+        received_at = time.perf_counter()
+        self.activities.append(activity)
+        self.activities_by_conversation[conversation_id] += 1
+        if conversation_id in self._created_conversations:
+            self.member_messages += 1
+        waiter = self._reply_waiters.pop(activity.get("replyToId") or "", None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(received_at)
+
+    async def _paged_members(self, request: web.Request) -> web.Response:
+        throttled = await self._delay("paged_members")
+        if throttled is not None:
+            return throttled
+        page_size = min(int(request.query.get("pageSize") or self.max_page_size), self.max_page_size)
+        offset = self.roster_offsets.get(request.match_info["conversation_id"], 0)
+        start = int(request.query.get("continuationToken") or 0)
+        end = min(start + page_size, self.roster_size)
+        return web.json_response(
+            {
+                "members": [self.member(offset + index) for index in range(start, end)],
+                "continuationToken": str(end) if end < self.roster_size else None,
+            }
+        )
+
+    async def _upload_range(self, request: web.Request) -> web.Response:
+        await self._delay("upload")
+        session = self.uploads.get(request.match_info["session_id"])
+        if session is None:
+            return web.Response(status=404)
+        data = await request.read()
+        match = CONTENT_RANGE.match(request.headers.get("Content-Range", ""))
+        if match is None:
+            start, total = 0, len(data)
+        else:
+            start, total = int(match.group(1)), int(match.group(3))
+        if start != session["received"]:
+            return web.json_response(
+                {"nextExpectedRanges": [f"{session['received']}-"]}, status=416
+            )
+
+        session["received"] += len(data)
+        session["total"] = total
+        if session["received"] >= total:
+            session["completed_at"] = time.perf_counter()
+            return web.json_response({"id": uuid.uuid4().hex, "size": total}, status=201)
+        return web.json_response({"nextExpectedRanges": [f"{session['received']}-"]}, status=202)
+
+    async def _upload_status(self, request: web.Request) -> web.Response:
+        session = self.uploads.get(request.match_info["session_id"])
+        if session is None:
+            return web.Response(status=404)
+        return web.json_response({"nextExpectedRanges": [f"{session['received']}-"]})
+
+    async def _unknown(self, request: web.Request) -> web.Response:
+        self.requests[f"unknown {request.method} {request.path}"] += 1
+        return web.json_response({}, status=200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3990)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--roster", type=int, default=100, help="members in every team")
+    args = parser.parse_args()
+
+    connector = FakeConnector(
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        roster_size=args.roster,
+    )
+    connector.base_url = f"http://{args.host}:{args.port}"
+    web.run_app(connector.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Load test for the bot against a local fake connector.
+
+Starts the fake connector in-process and the bot (app.py) as a subprocess with
+authentication disabled and all of its state in a temporary directory, then
+drives /api/messages and /api/notify with synthetic Teams traffic:
+
+    personal   1:1 messages from many users; ack and reply latency
+    consent    file consent accepts, each uploading the report to the fake OneDrive
+    onboard    the bot added to a team, onboarding every member of a large roster
+    fanout     "MessageAllMembers", a 1:1 message to every roster member
+    notify     /api/notify broadcast to every stored conversation, polled to completion
+
+and prints the count, throughput and p50/p99 latency of each. Typical runs:
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --users 200 --roster 2000 --latency 0.05 --throttle-rate 0.02
+    python -m benchmarks.load_test --scenarios personal consent --report-size 50000000
+    python -m benchmarks.load_test --bot-env WebWorkers=4 --bot-env FanOutRate=200
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import aiohttp
+
+from .fake_connector import FakeConnector
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TENANT_ID = "tenant"
+BOT_ACCOUNT = {"id": "28:bot", "name": "File Bot"}
+FILE_CONSENT_CARD = "application/vnd.microsoft.teams.card.file.consent"
+PERSONAL_MESSAGES = (
+    "hello",
+    "settings",
+    "Update Options for Report",
+    "No, I don't want to see the Report.",
+    "report",
+)
+
+
+class ScenarioResult:
+    """ Latencies (seconds) of one scenario, and how long the whole run took. """
+
+    def __init__(self, name: str, unit: str = "requests"):
+        self.name = name
+        self.unit = unit
+        self.latencies: List[float] = []
+        self.count = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        self.notes: List[str] = []
+
+    @property
+    def throughput(self) -> float:
+        return self.count / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+    def row(self) -> str:
+        def millis(value: Optional[float]) -> str:
+            return "-" if value is None else f"{value * 1000:.1f}"
+
+        return (
+            f"{self.name:<18} {self.count:>8} {self.unit:<9} {self.errors:>6} "
+            f"{self.elapsed:>9.2f} {self.throughput:>10.1f} "
+            f"{millis(self.percentile(0.5)):>9} {millis(self.percentile(0.99)):>9}"
+        )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.connector = FakeConnector(
+            latency=args.latency,
+            throttle_rate=args.throttle_rate,
+            retry_after=args.retry_after,
+            roster_size=args.roster,
+        )
+        self.bot_url = f"http://127.0.0.1:{args.bot_port}"
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.bot: Optional[subprocess.Popen] = None
+        self._sequence = itertools.count()
+        self._teams = itertools.count()
+
+    # Activities
+
+    def _activity(self, user: int, conversation: dict, **fields) -> dict:
+        activity = {
+            "id": f"bench-{next(self._sequence)}-{uuid.uuid4().hex[:8]}",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "serviceUrl": self.connector.base_url,
+            "channelId": "msteams",
+            "from": {
+                "id": f"29:user-{user}",
+                "name": f"User {user}",
+                "aadObjectId": f"10000000-0000-0000-0000-{user:012d}",
+            },
+            "conversation": conversation,
+            "recipient": BOT_ACCOUNT,
+            "channelData": {"tenant": {"id": TENANT_ID}},
+        }
+        activity.update(fields)
+        return activity
+
+    @staticmethod
+    def _personal_conversation(user: int) -> dict:
+        return {"id": f"a:personal-{user}", "conversationType": "personal", "tenantId": TENANT_ID}
+
+    async def _post(self, activity: dict) -> aiohttp.ClientResponse:
+        async with self.session.post(f"{self.bot_url}/api/messages", json=activity) as response:
+            await response.read()
+            return response
+
+    # Scenarios
+
+    async def personal(self) -> List[ScenarioResult]:
+        """ Each user sends a series of messages; latency is until the bot's reply reaches the connector. """
+        result = ScenarioResult("personal", "messages")
+        acks = ScenarioResult("personal (ack)", "messages")
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def send(user: int, text: str):
+            activity = self._activity(
+                user, self._personal_conversation(user), type="message", text=text
+            )
+            async with semaphore:
+                reply = self.connector.expect_reply(activity["id"])
+                started = time.perf_counter()
+                response = await self._post(activity)
+                acks.latencies.append(time.perf_counter() - started)
+                if response.status >= 300:
+                    result.errors += 1
+                    return
+                try:
+                    replied_at = await asyncio.wait_for(reply, self.args.reply_timeout)
+                except asyncio.TimeoutError:
+                    result.errors += 1
+                    return
+                result.latencies.append(replied_at - started)
+
+        async def conversation(user: int):
+            for index in range(self.args.messages):
+                await send(user, PERSONAL_MESSAGES[(user + index) % len(PERSONAL_MESSAGES)])
+
+        started = time.perf_counter()
+        await asyncio.gather(*[conversation(user) for user in range(self.args.users)])
+        result.elapsed = acks.elapsed = time.perf_counter() - started
+        result.count = len(result.latencies)
+        acks.count = len(acks.latencies)
+        return [acks, result]
+
+    async def _offered_report(self) -> Tuple[str, dict]:
+        """ Ask for the report once and return the file name and accept context of the consent card. """
+        activity = self._activity(0, self._personal_conversation(0), type="message", text="report")
+        reply = self.connector.expect_reply(activity["id"])
+        await self._post(activity)
+        await asyncio.wait_for(reply, self.args.reply_timeout)
+        for sent in reversed(self.connector.activities):
+            for attachment in sent.get("attachments") or []:
+                if attachment.get("contentType") == FILE_CONSENT_CARD:
+                    return attachment["name"], attachment["content"]["acceptContext"]
+        return "report.csv", {"filename": "report.csv"}
+
+    async def consent(self) -> List[ScenarioResult]:
+        """ Users accept the report's file consent card; the invoke returns once the upload is done. """
+        result = ScenarioResult("consent", "uploads")
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        name, context = await self._offered_report()
+
+        async def accept(user: int):
+            upload_url = self.connector.upload_url()
+            activity = self._activity(
+                user,
+                self._personal_conversation(user),
+                type="invoke",
+                name="fileConsent/invoke",
+                value={
+                    "type": "fileUpload",
+                    "action": "accept",
+                    "context": context,
+                    "uploadInfo": {
+                        "name": name,
+                        "uploadUrl": upload_url,
+                        "contentUrl": upload_url,
+                        "uniqueId": uuid.uuid4().hex,
+                        "fileType": name.rsplit(".", 1)[-1],
+                    },
+                },
+            )
+            async with semaphore:
+                started = time.perf_counter()
+                response = await self._post(activity)
+                if response.status >= 300:
+                    result.errors += 1
+                    return
+                result.latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[accept(user) for user in range(self.args.users)])
+        result.elapsed = time.perf_counter() - started
+        result.count = len(result.latencies)
+        uploaded = sum(session["received"] for session in self.connector.uploads.values())
+        result.notes.append(f"offered {name}")
+        if result.elapsed:
+            result.notes.append(f"uploaded {uploaded / 1e6:.1f} MB, {uploaded / 1e6 / result.elapsed:.1f} MB/s")
+        return [result]
+
+    async def onboard(self) -> List[ScenarioResult]:
+        """ The bot is added to a team of new members and opens a 1:1 conversation with each. """
+        result = ScenarioResult("onboard", "members")
+        team_id = f"19:{uuid.uuid4().hex}@thread.tacv2"
+        # Every team gets its own members; the first one shares the fan-out scenario's roster.
+        self.connector.roster_offsets[team_id] = next(self._teams) * self.args.roster
+        activity = self._activity(
+            0,
+            {"id": team_id, "conversationType": "channel", "isGroup": True, "tenantId": TENANT_ID},
+            type="conversationUpdate",
+            membersAdded=[BOT_ACCOUNT],
+            channelData={
+                "tenant": {"id": TENANT_ID},
+                "team": {"id": team_id, "name": "Benchmark team"},
+                "eventType": "teamMemberAdded",
+            },
+        )
+        sent = self.connector.member_messages
+        started = time.perf_counter()
+        response = await self._post(activity)
+        if response.status >= 300:
+            result.errors += 1
+            return [result]
+        result.latencies.append(time.perf_counter() - started)
+
+        target = sent + self.args.roster
+        deadline = started + self.args.timeout
+        while self.connector.member_messages < target and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        result.elapsed = time.perf_counter() - started
+        result.count = self.connector.member_messages - sent
+        result.errors += max(self.args.roster - result.count, 0)
+        return [result]
+
+    async def fanout(self) -> List[ScenarioResult]:
+        """ "MessageAllMembers" from a 1:1 chat; latency is until the bot reports the fan-out done. """
+        result = ScenarioResult("fanout", "members")
+        activity = self._activity(
+            0, self._personal_conversation(0), type="message", text="MessageAllMembers"
+        )
+        sent = self.connector.member_messages
+        throttled = self.connector.throttled
+        reply = self.connector.expect_reply(activity["id"])
+        started = time.perf_counter()
+        response = await self._post(activity)
+        if response.status >= 300:
+            result.errors += 1
+            return [result]
+        try:
+            replied_at = await asyncio.wait_for(reply, self.args.timeout)
+        except asyncio.TimeoutError:
+            result.errors += 1
+            replied_at = time.perf_counter()
+        else:
+            result.latencies.append(replied_at - started)
+        result.elapsed = replied_at - started
+        result.count = self.connector.member_messages - sent
+        result.notes.append(f"{self.connector.throttled - throttled} connector calls throttled")
+        return [result]
+
+    async def notify(self) -> List[ScenarioResult]:
+        """ /api/notify to every stored conversation, polled until the job finishes. """
+        result = ScenarioResult("notify", "messages")
+        started = time.perf_counter()
+        async with self.session.get(f"{self.bot_url}/api/notify") as response:
+            if response.status >= 300:
+                result.errors += 1
+                return [result]
+            job = await response.json()
+        result.latencies.append(time.perf_counter() - started)
+
+        deadline = started + self.args.timeout
+        while job["status"] in ("queued", "running") and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+            async with self.session.get(f"{self.bot_url}{job.get('status_url') or '/api/notify/' + job['id']}") as response:
+                if response.status == 200:
+                    job = await response.json()
+        result.elapsed = time.perf_counter() - started
+        result.count = job["delivered"]
+        result.errors += job["failed"] + job["pending"]
+        result.notes.append(f"job {job['status']}, {job['total']} references")
+        return [result]
+
+    # Bot process
+
+    def _write_report(self, directory: str):
+        """ A CSV report of roughly --report-size bytes for the consent scenario. """
+        row = "region,product,units,revenue\n"
+        line = "north,widget,12,345.67\n"
+        with open(os.path.join(directory, "report.csv"), "w") as report:
+            report.write(row)
+            report.write(line * max(self.args.report_size // len(line), 1))
+
+    def _start_bot(self, directory: str):
+        reports = os.path.join(directory, "files")
+        os.makedirs(reports)
+        self._write_report(reports)
+        env = dict(os.environ)
+        env.update(
+            {
+                "MicrosoftAppId": "",
+                "MicrosoftAppPassword": "",
+                "Port": str(self.args.bot_port),
+                "LogLevel": "WARNING",
+                # Measure steady state, not the first request building the bot.
+                "LazyStartup": "0",
+                "ReportsDirectory": reports,
+                "ReferenceStorePath": os.path.join(directory, "references.db"),
+                "SharedStatePath": os.path.join(directory, "shared_state.db"),
+                "OnboardingIndexPath": os.path.join(directory, "onboarding.db"),
+                "ReportCacheDirectory": os.path.join(directory, "reports"),
+                "CompressedReportDirectory": os.path.join(directory, "compressed"),
+                "ParameterStoreDirectory": os.path.join(directory, "parameters"),
+                "UserSettingsDirectory": os.path.join(directory, "users"),
+            }
+        )
+        for setting in self.args.bot_env:
+            name, _, value = setting.partition("=")
+            env[name] = value
+        self.bot = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env)
+
+    async def _wait_for_bot(self):
+        deadline = time.perf_counter() + 60
+        while time.perf_counter() < deadline:
+            if self.bot.poll() is not None:
+                raise RuntimeError(f"The bot exited with status {self.bot.returncode}")
+            try:
+                async with self.session.get(f"{self.bot_url}/api/metrics") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError("The bot did not start within 60 seconds")
+
+    def _stop_bot(self):
+        if self.bot is not None and self.bot.poll() is None:
+            self.bot.terminate()
+            try:
+                self.bot.wait(15)
+            except subprocess.TimeoutExpired:
+                self.bot.kill()
+
+    async def run(self) -> List[ScenarioResult]:
+        results: List[ScenarioResult] = []
+        await self.connector.start(port=self.args.connector_port)
+        connector = aiohttp.TCPConnector(limit=self.args.concurrency * 2)
+        self.session = aiohttp.ClientSession(connector=connector)
+        with tempfile.TemporaryDirectory(prefix="bot-benchmark-") as directory:
+            try:
+                self._start_bot(directory)
+                await self._wait_for_bot()
+                for scenario in self.args.scenarios:
+                    print(f"running {scenario}...", file=sys.stderr)
+                    results.extend(await getattr(self, scenario)())
+            finally:
+                await self.session.close()
+                self._stop_bot()
+                await self.connector.stop()
+        return results
+
+
+def _print_results(results: List[ScenarioResult], connector: FakeConnector):
+    print(
+        f"{'scenario':<18} {'count':>8} {'unit':<9} {'errors':>6} "
+        f"{'seconds':>9} {'per sec':>10} {'p50 ms':>9} {'p99 ms':>9}"
+    )
+    for result in results:
+        print(result.row())
+        for note in result.notes:
+            print(f"{'':<18}   {note}")
+    calls = ", ".join(f"{kind} {count}" for kind, count in sorted(connector.requests.items()))
+    print(f"\nconnector calls: {calls}; throttled {connector.throttled}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=["personal", "consent", "onboard", "fanout", "notify"],
+        default=["personal", "consent", "onboard", "fanout", "notify"],
+    )
+    parser.add_argument("--users", type=int, default=50, help="distinct 1:1 users")
+    parser.add_argument("--messages", type=int, default=5, help="messages per user")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight")
+    parser.add_argument("--roster", type=int, default=200, help="members in every team roster")
+    parser.add_argument("--report-size", type=int, default=5 * 1024 * 1024, help="bytes in report.csv")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every connector call")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of connector calls given a 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After of injected 429s")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for each scenario")
+    parser.add_argument("--reply-timeout", type=float, default=30, help="seconds to wait for a reply")
+    parser.add_argument("--bot-port", type=int, default=None)
+    parser.add_argument("--connector-port", type=int, default=None)
+    parser.add_argument(
+        "--bot-env", action="append", default=[], metavar="NAME=VALUE", help="extra bot setting"
+    )
+    args = parser.parse_args()
+    args.bot_port = args.bot_port or _free_port()
+    args.connector_port = args.connector_port or _free_port()
+
+    test = LoadTest(args)
+    results = asyncio.get_event_loop().run_until_complete(test.run())
+    _print_results(results, test.connector)
+
+
+if __name__ == "__main__":
+    main()
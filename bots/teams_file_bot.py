@@ -1,14 +1,18 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
-from datetime import datetime,date
-import os
+from datetime import datetime
+import asyncio
 import csv
-import requests
+import html
+import os
+import logging
 import time
-from typing import List, Dict
-from botbuilder.core import TurnContext,ActivityHandler, MessageFactory, CardFactory
-from botbuilder.core.teams import TeamsActivityHandler, TeamsInfo,teams_get_channel_id
+import aiohttp
+from collections import OrderedDict
+from typing import List, Dict, Hashable, Optional
+from botbuilder.core import TurnContext, MessageFactory
+from botbuilder.core.teams import TeamsActivityHandler, TeamsInfo, teams_get_team_info
 from botbuilder.schema import (
     Activity,
     Attachment,
@@ -17,11 +21,6 @@ from botbuilder.schema import (
     ConversationAccount,
     ConversationParameters,
     ConversationReference,
-    Attachment,
-    CardAction,
-    ActionTypes,
-    HeroCard,
-    SuggestedActions
 )
 from botbuilder.schema.teams import (
     FileDownloadInfo,
@@ -32,20 +31,89 @@ from botbuilder.schema.teams import (
     TeamsChannelAccount
 )
 from botbuilder.schema.teams.additional_properties import ContentType
+from helpers import (
+    CardTemplates,
+    ChunkedUploader,
+    CompressedReportCache,
+    ConversationReferenceStore,
+    FanOutResult,
+    FanOutScheduler,
+    FileTransferClient,
+    IntentRouter,
+    OnboardingIndex,
+    ParameterStore,
+    ReportArtifact,
+    ReportEngine,
+    ReportRegistry,
+    RosterCache,
+    UserSettingsStore,
+    flush_replies,
+    metrics,
+    run_proactive_turn,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class TeamsFileUploadBot(TeamsActivityHandler):
 
-    def __init__(self, app_id: str, app_password: str,conversation_references: Dict[str, ConversationReference]):
+    # Uploads spanning more chunks than this send progress updates to the user.
+    PROGRESS_REPORT_MIN_CHUNKS = 4
+    # Rosters whose last fully onboarded version is remembered.
+    MAX_ONBOARDED_ROSTERS = 10000
+
+    def __init__(
+            self,
+            app_id: str,
+            app_password: str,
+            conversation_references: ConversationReferenceStore,
+            file_transfer: FileTransferClient = None,
+            uploader: ChunkedUploader = None,
+            roster_cache: RosterCache = None,
+            fan_out: FanOutScheduler = None,
+            cards: CardTemplates = None,
+            reports: ReportRegistry = None,
+            report_engine: ReportEngine = None,
+            settings: UserSettingsStore = None,
+            compressed_reports: CompressedReportCache = None,
+            parameters: ParameterStore = None,
+            onboarding: OnboardingIndex = None,
+            onboarding_batch_size: int = 100,
+    ):
         self._app_id = app_id
         self._app_password = app_password
         self.conversation_references = conversation_references
+        self._file_transfer = file_transfer or FileTransferClient()
+        self._uploader = uploader or ChunkedUploader(self._file_transfer)
+        # Built on the first template upload; most processes never see one.
+        self._csv_ingest = None
+        self._roster_cache = roster_cache or RosterCache()
+        self._roster_resyncs = set()
+        self._onboarding = onboarding or OnboardingIndex()
+        self._onboarding_batch_size = onboarding_batch_size
+        self._onboarding_jobs = set()
+        # Roster versions whose members have all been onboarded by this process.
+        self._onboarded_rosters: Dict[str, Hashable] = OrderedDict()
+        self._fan_out = fan_out or FanOutScheduler()
+        self._cards = cards or CardTemplates()
+        if reports is None:
+            # Nothing watches a registry made here, so index it once up front.
+            reports = ReportRegistry("files")
+            reports.refresh()
+        self._reports = reports
+        self._report_engine = report_engine or ReportEngine(self._reports, "data/reports")
+        self._settings = settings or UserSettingsStore("data/users")
+        self._parameters = parameters or ParameterStore("data/parameters")
+        # Reports are offered uncompressed unless a compressed report cache is given.
+        self._compressed_reports = compressed_reports
+        self._intents = self._create_intent_router()
         
 
     async def on_conversation_update_activity(self, turn_context: TurnContext):
+        # The members-added handler patches the cached roster first, so onboarding sees the new members.
+        result = await super().on_conversation_update_activity(turn_context)
         await self._add_conversation_reference(turn_context)
-        
-        return await super().on_conversation_update_activity(turn_context)
+        return result
 
     async def on_teams_members_added(  # pylint: disable=unused-argument
             self,
@@ -53,7 +121,7 @@ class TeamsFileUploadBot(TeamsActivityHandler):
             team_info: TeamInfo,
             turn_context: TurnContext,
     ):
-        await self._add_conversation_reference(turn_context)
+        self._roster_cache.add_members(self._roster_key(turn_context.activity), teams_members_added)
         for member in teams_members_added:
             if member.id != turn_context.activity.recipient.id:
                 reply = MessageFactory.list([])
@@ -62,6 +130,20 @@ class TeamsFileUploadBot(TeamsActivityHandler):
 
 
 
+    async def on_teams_members_removed(  # pylint: disable=unused-argument
+            self,
+            teams_members_removed: [TeamsChannelAccount],
+            team_info: TeamInfo,
+            turn_context: TurnContext,
+    ):
+        roster_key = self._roster_key(turn_context.activity)
+        if any(member.id == turn_context.activity.recipient.id for member in teams_members_removed):
+            self._roster_cache.invalidate(roster_key)
+        else:
+            self._roster_cache.remove_members(
+                roster_key, [member.id for member in teams_members_removed]
+            )
+
     async def on_message_activity(self, turn_context: TurnContext):
         
         await self._add_conversation_reference(turn_context)
@@ -72,28 +154,13 @@ class TeamsFileUploadBot(TeamsActivityHandler):
         )
 
         if message_with_file_download:
-            file = turn_context.activity.attachments[0]
-            file_download = FileDownloadInfo.deserialize(file.content)
-            file_path = "files/" + file.name
-
-            response = requests.get(file_download.download_url, allow_redirects=True)
-            open(file_path, "wb").write(response.content)
-            with open(file_path) as csv_file:
-                csv_reader = csv.reader(csv_file, delimiter=',')
-                line_count = 0
-                for row in csv_reader:
-                    if line_count == 0:
-                        head=", ".join(row)
-            reply = self._create_reply(
-                turn_context.activity, f"Your parameters have been updated using the template in <b>{file.name}</b> with Headings <b>{head}</b>", "xml"
-            )
-            await turn_context.send_activity(reply)
+            await self._ingest_template(turn_context, turn_context.activity.attachments[0])
         elif turn_context.activity.text != None:
             text = turn_context.activity.text
             if turn_context.activity.conversation.conversation_type =='personal':
                 filename = "report.csv"
-                file_path = "files/" + filename
-                file_size = os.path.getsize(file_path)
+                report = self._reports.get(filename)
+                file_size = report.size if report else 0
                 await self._process_input(turn_context,text,filename, file_size)
             else:
                 if text.find("hello")!=-1:
@@ -111,112 +178,226 @@ class TeamsFileUploadBot(TeamsActivityHandler):
         else:
             filename = "report.csv"
             reply = self._create_reply(
-                turn_context.activity, f"Hello, Rod today is {date.today().strftime('%B %d, %Y')}, would you like to see the report?", "xml"
+                turn_context.activity, self._cards.report_prompt_text("Rod"), "xml"
             )
             await turn_context.send_activity(reply)
             reply = MessageFactory.list([])
             reply.attachments.append(self._send_suggested_actions_yes_no("Rod"))
             await turn_context.send_activity(reply)
 
-    def _send_suggested_actions_yes_no(self,name:str) -> Attachment:
-        card = HeroCard(
-            text=f"Hello, {name} today is {date.today().strftime('%B %d, %Y')}, would you like to see the report?",
-            buttons=[
-                CardAction(
-                    type=ActionTypes.im_back, title="Yes", value="Yes, I want to see the Report."
-                ),
-                CardAction(
-                    type=ActionTypes.im_back, title="No", value="No, I don't want to see the Report."
-                ),
-            ],
-        )
-
-        return CardFactory.hero_card(card)
-
-    async def _process_input(self,turn_context: TurnContext, text: str, filename: str, file_size: int):
-
-        if text.find("hello")!=-1:
-            reply = MessageFactory.list([])
-            reply.attachments.append(self._send_suggested_actions_yes_no(""))
-            await turn_context.send_activity(reply)
+    async def _ingest_template(self, turn_context: TurnContext, file: Attachment):
+        """
+        Stream an uploaded parameter template to disk, replying with its headings
+        as soon as the header row has arrived, then validate it against the report
+        and store its columns. A template with errors is rejected with their
+        positions, and the user's parameters are left as they were.
+        """
+        if self._csv_ingest is None:
+            from helpers import CsvIngest  # pylint: disable=import-outside-toplevel
 
-        elif text.find("MessageAllMembers")!=-1:
+            self._csv_ingest = CsvIngest()
+        file_download = FileDownloadInfo.deserialize(file.content)
+        user_id = turn_context.activity.from_property.id
+        file_path = os.path.join(self._settings.uploads_directory(user_id), os.path.basename(file.name))
 
-            await self._message_all_members(turn_context)
+        async def send_headings(header: List[str]):
             reply = self._create_reply(
-                turn_context.activity,
-                f"Successfully Messaged All Members", "xml"
+                turn_context.activity, f"Reading the template in <b>{file.name}</b> with Headings <b>{', '.join(header)}</b>", "xml"
             )
             await turn_context.send_activity(reply)
+            await flush_replies(turn_context)
 
-        elif text.find("Yes, I want to see the Report.")!=-1 or text.find("report")!=-1:
-            await self._send_file_card(turn_context, filename, file_size)
-            reply = self._create_reply(
-                turn_context.activity,
-                f"Please type 'settings' to update report settings", "xml"
+        started = time.perf_counter()
+        try:
+            result = await self._csv_ingest.ingest(
+                self._file_transfer.iter_chunks(file_download.download_url), file_path, send_headings
             )
-            await turn_context.send_activity(reply)
-
-        elif text.find("No, I don't want to see the Report.")!=-1:
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+            metrics.TRANSFER_FAILURES.inc("download")
+            logger.warning("Failed to download template, error %r, file_path=%s", error, file_path)
             reply = self._create_reply(
-                turn_context.activity,
-                f"ThankYou. Get back to me when you need it. I'm here to serve you!", "xml"
+                turn_context.activity, f"Sorry, I couldn't read the template <b>{file.name}</b>. Please upload it again.", "xml"
             )
             await turn_context.send_activity(reply)
+            return
 
+        metrics.observe_transfer("download", result.size, time.perf_counter() - started)
 
-        elif text.find("settings")!=-1:
+        if not result.header:
             reply = self._create_reply(
-                turn_context.activity,
-                f"Would you like to update report parameters or the options for this report?", "xml"
+                turn_context.activity, f"The template <b>{file.name}</b> is empty. Please update the template and upload.", "xml"
             )
             await turn_context.send_activity(reply)
-            reply=MessageFactory.list([])
-            reply.attachments.append(self._send_suggested_actions_reportparameters_options())
-            await turn_context.send_activity(reply)
-
-        elif text.find("Update Report Parameters for Report")!=-1:
-            await self._send_file_card(turn_context, filename, file_size)
-            reply = self._create_reply(
-                turn_context.activity,
-                f"Please update the template and upload.", "xml"
+            return
+
+        report = self._reports.get("report.csv")
+        try:
+            parsed = await self._parameters.parse(
+                result.path,
+                result.sha256,
+                report.path if report else None,
+                report.content_key if report else None,
             )
-            await turn_context.send_activity(reply)
-
-        elif text.find("Update Options for Report")!=-1:
+        except (OSError, UnicodeDecodeError, csv.Error) as error:
+            logger.warning("Failed to parse template, error %r, file_path=%s", error, file_path)
             reply = self._create_reply(
-                turn_context.activity,
-                f"What threshold would you like to set for this report?", "xml"
+                turn_context.activity, f"Sorry, I couldn't read the template <b>{file.name}</b>. Please upload it again.", "xml"
             )
             await turn_context.send_activity(reply)
+            return
 
-        elif all([xi in '1234567890' for xi in text.lstrip('-')]):
+        if not parsed.valid:
+            problems = "<br>".join(html.escape(str(error), quote=False) for error in parsed.errors)
+            if parsed.error_count > len(parsed.errors):
+                problems += f"<br>... and {parsed.error_count - len(parsed.errors)} more"
             reply = self._create_reply(
-                turn_context.activity,
-                f"Thanks your new threshold is {text}", "xml"
+                turn_context.activity, f"The template <b>{file.name}</b> has {parsed.error_count} problem(s), so your parameters were not updated:<br>{problems}<br>Please fix the template and upload it again.", "xml"
             )
             await turn_context.send_activity(reply)
-        else:
+            return
+
+        self._settings.update(
+            user_id, parameters_path=parsed.path, parameters_sha256=result.sha256
+        )
+        self._user_report(user_id, "report.csv")
+        reply = self._create_reply(
+            turn_context.activity, f"Your parameters have been updated using the template in <b>{file.name}</b> ({parsed.rows} rows).", "xml"
+        )
+        await turn_context.send_activity(reply)
+
+    def _send_suggested_actions_yes_no(self,name:str) -> Attachment:
+        return self._cards.report_prompt(name)
+
+    def _create_intent_router(self) -> IntentRouter:
+        """
+        Register the personal-chat intents. Keywords and patterns keep the priority
+        of the original if/elif chain; button values resolve with one lookup.
+        """
+        router = IntentRouter()
+        router.add_exact("Yes, I want to see the Report.", self._on_report_intent, "report")
+        router.add_exact("No, I don't want to see the Report.", self._on_decline_report_intent, "decline_report")
+        router.add_exact("Update Report Parameters for Report", self._on_report_parameters_intent, "report_parameters")
+        router.add_exact("Update Options for Report", self._on_report_options_intent, "report_options")
+
+        router.add_keyword("hello", self._on_hello_intent)
+        router.add_keyword("MessageAllMembers", self._on_message_all_members_intent)
+        router.add_keyword("Yes, I want to see the Report.", self._on_report_intent, "report")
+        router.add_keyword("report", self._on_report_intent, "report")
+        router.add_keyword("No, I don't want to see the Report.", self._on_decline_report_intent, "decline_report")
+        router.add_keyword("settings", self._on_settings_intent)
+        router.add_keyword("Update Report Parameters for Report", self._on_report_parameters_intent, "report_parameters")
+        router.add_keyword("Update Options for Report", self._on_report_options_intent, "report_options")
+        router.add_pattern("-*[0-9]*", self._on_threshold_intent, "threshold")
+        router.set_fallback(self._on_unknown_intent, "unknown")
+        return router
+
+    async def _process_input(self,turn_context: TurnContext, text: str, filename: str, file_size: int):
+        intent = self._intents.resolve(text)
+        if intent is None:
+            return
+        name, handler = intent
+        with metrics.TURN_SECONDS.time(name):
+            await handler(turn_context, text, filename, file_size)
+
+    async def _on_hello_intent(self, turn_context: TurnContext, text: str, filename: str, file_size: int):
+        reply = MessageFactory.list([])
+        reply.attachments.append(self._send_suggested_actions_yes_no(""))
+        await turn_context.send_activity(reply)
+
+    async def _on_message_all_members_intent(self, turn_context: TurnContext, text: str, filename: str, file_size: int):
+        result = await self._message_all_members(turn_context)
+        if not result.failed:
             reply = self._create_reply(
                 turn_context.activity,
-                f"Sorry, I couldn't Understand. Please Enter a valid Value.", "xml"
+                f"Successfully Messaged All Members", "xml"
             )
             await turn_context.send_activity(reply)
 
-    def _send_suggested_actions_reportparameters_options(self) -> Attachment:
-        card = HeroCard(
-            text="Would you like to update report parameters or the options for this report?",
-            buttons=[
-                CardAction(
-                    type=ActionTypes.im_back, title="Report Parameters", value="Update Report Parameters for Report"
-                ),
-                CardAction(
-                    type=ActionTypes.im_back, title="Options", value="Update Options for Report"
-                ),
-            ],
+    async def _on_report_intent(self, turn_context: TurnContext, text: str, filename: str, file_size: int):
+        await self._send_file_card(turn_context, filename, file_size)
+        reply = self._create_reply(
+            turn_context.activity,
+            f"Please type 'settings' to update report settings", "xml"
+        )
+        await turn_context.send_activity(reply)
+
+    async def _on_decline_report_intent(self, turn_context: TurnContext, text: str, filename: str, file_size: int):
+        reply = self._create_reply(
+            turn_context.activity,
+            f"ThankYou. Get back to me when you need it. I'm here to serve you!", "xml"
+        )
+        await turn_context.send_activity(reply)
+
+    async def _on_settings_intent(self, turn_context: TurnContext, text: str, filename: str, file_size: int):
+        reply = self._create_reply(
+            turn_context.activity,
+            CardTemplates.REPORT_SETTINGS_PROMPT, "xml"
+        )
+        await turn_context.send_activity(reply)
+        reply=MessageFactory.list([])
+        reply.attachments.append(self._send_suggested_actions_reportparameters_options())
+        await turn_context.send_activity(reply)
+
+    async def _on_report_parameters_intent(self, turn_context: TurnContext, text: str, filename: str, file_size: int):
+        await self._send_file_card(turn_context, filename, file_size)
+        reply = self._create_reply(
+            turn_context.activity,
+            f"Please update the template and upload.", "xml"
+        )
+        await turn_context.send_activity(reply)
+
+    async def _on_report_options_intent(self, turn_context: TurnContext, text: str, filename: str, file_size: int):
+        reply = self._create_reply(
+            turn_context.activity,
+            f"What threshold would you like to set for this report?", "xml"
+        )
+        await turn_context.send_activity(reply)
+
+    async def _on_threshold_intent(self, turn_context: TurnContext, text: str, filename: str, file_size: int):
+        try:
+            threshold = float(text)
+        except ValueError:
+            threshold = None
+        if threshold is not None:
+            user_id = turn_context.activity.from_property.id
+            self._settings.update(user_id, threshold=threshold)
+            self._user_report(user_id, filename)
+        reply = self._create_reply(
+            turn_context.activity,
+            f"Thanks your new threshold is {text}", "xml"
+        )
+        await turn_context.send_activity(reply)
+
+    async def _on_unknown_intent(self, turn_context: TurnContext, text: str, filename: str, file_size: int):
+        reply = self._create_reply(
+            turn_context.activity,
+            f"Sorry, I couldn't Understand. Please Enter a valid Value.", "xml"
         )
+        await turn_context.send_activity(reply)
 
-        return CardFactory.hero_card(card)
+    def _send_suggested_actions_reportparameters_options(self) -> Attachment:
+        return self._cards.report_settings()
+
+    def _user_report(self, user_id: str, filename: str) -> Optional["asyncio.Future[ReportArtifact]"]:
+        """
+        Start (or join) generating the report for the user's saved parameters and
+        threshold. Returns None when the user hasn't customised the report.
+        """
+        settings = self._settings.get(user_id)
+        if not settings:
+            return None
+        try:
+            report = self._report_engine.submit(
+                filename,
+                parameters_path=settings.get("parameters_path"),
+                parameters_sha256=settings.get("parameters_sha256"),
+                threshold=settings.get("threshold"),
+            )
+        except KeyError:
+            return None
+        # Generation is started ahead of the card; don't warn about an unobserved failure.
+        report.add_done_callback(lambda future: future.cancelled() or future.exception())
+        return report
 
     async def _send_file_card(
             self, turn_context: TurnContext, filename: str, file_size: int
@@ -226,6 +407,36 @@ class TeamsFileUploadBot(TeamsActivityHandler):
         """
 
         consent_context = {"filename": filename}
+        source = self._reports.get(filename)
+
+        report = self._user_report(turn_context.activity.from_property.id, filename)
+        if report is not None and not report.done():
+            # Don't hold the turn for generation: offer the base report and let it finish in the background.
+            reply = self._create_reply(
+                turn_context.activity,
+                "Your customised report is still being prepared, so here is the full report. "
+                "Ask for the report again in a moment to get your version.", "xml"
+            )
+            await turn_context.send_activity(reply)
+        elif report is not None:
+            try:
+                artifact = report.result()
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("Failed to generate report, error %r, filename=%s", error, filename)
+            else:
+                file_size = artifact.size
+                consent_context["report_key"] = artifact.key
+                source = artifact
+
+        card_name = filename
+        if self._compressed_reports is not None and source is not None:
+            try:
+                compressed = await self._compressed_reports.get(filename, source.path, source.content_key)
+            except OSError as error:
+                logger.warning("Failed to compress report, error %r, filename=%s", error, filename)
+            else:
+                card_name, file_size = compressed.name, compressed.size
+                consent_context["compression"] = self._compressed_reports.compression
 
         file_card = FileConsentCard(
             description="This is the file I want to send you",
@@ -235,7 +446,7 @@ class TeamsFileUploadBot(TeamsActivityHandler):
         )
 
         as_attachment = Attachment(
-            content=file_card.serialize(), content_type=ContentType.FILE_CONSENT_CARD, name=filename
+            content=file_card.serialize(), content_type=ContentType.FILE_CONSENT_CARD, name=card_name
         )
 
         reply_activity = self._create_reply(turn_context.activity)
@@ -251,23 +462,86 @@ class TeamsFileUploadBot(TeamsActivityHandler):
         The user accepted the file upload request.  Do the actual upload now.
         """
 
-        file_path = "files/" + file_consent_card_response.context["filename"]
-        file_size = os.path.getsize(file_path)
-
-        headers = {
-            "Content-Length": f"\"{file_size}\"",
-            "Content-Range": f"bytes 0-{file_size-1}/{file_size}"
-        }
-        response = requests.put(
-            file_consent_card_response.upload_info.upload_url, open(file_path, "rb"), headers=headers
-        )
+        context = file_consent_card_response.context
+        report = await self._resolve_upload(turn_context, context)
+        if report is None:
+            await self._file_upload_failed(turn_context, "The report is no longer available.")
+            return
+        if "compression" in context:
+            # The card offered a compressed copy; it is usually cached from when the card was sent.
+            if self._compressed_reports is None or self._compressed_reports.compression != context["compression"]:
+                await self._file_upload_failed(turn_context, "The report format has changed. Please ask for the report again.")
+                return
+            try:
+                report = await self._compressed_reports.get(context["filename"], report.path, report.content_key)
+            except OSError as error:
+                logger.warning("Failed to compress report, error %r, filename=%s", error, context["filename"])
+                await self._file_upload_failed(turn_context, "Unable to upload file.")
+                return
+        file_path = report.path
+
+        started = time.perf_counter()
+        try:
+            response = await self._uploader.upload_file(
+                file_consent_card_response.upload_info.upload_url,
+                file_path,
+                progress=self._upload_progress_reporter(turn_context, report.size),
+                size=report.size,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            metrics.TRANSFER_FAILURES.inc("upload")
+            logger.warning("Failed to upload, error %r, file_path=%s", error, file_path)
+            await self._file_upload_failed(turn_context, "Unable to upload file.")
+            return
 
-        if response.status_code != 201:
-            print(f"Failed to upload, status {response.status_code}, file_path={file_path}")
+        if response.status not in (200, 201):
+            metrics.TRANSFER_FAILURES.inc("upload")
+            logger.warning("Failed to upload, status %s, file_path=%s", response.status, file_path)
             await self._file_upload_failed(turn_context, "Unable to upload file.")
         else:
+            metrics.observe_transfer("upload", report.size, time.perf_counter() - started)
             await self._file_upload_complete(turn_context, file_consent_card_response)
 
+    async def _resolve_upload(self, turn_context: TurnContext, context: Dict[str, str]):
+        """
+        Find the file a consent card offered: the user's generated report (rebuilt
+        if it has since been evicted) or a report from the registry.
+        """
+        if "report_key" not in context:
+            return self._reports.get(context["filename"])
+
+        artifact = self._report_engine.get(context["report_key"])
+        if artifact is None:
+            report = self._user_report(turn_context.activity.from_property.id, context["filename"])
+            if report is not None:
+                try:
+                    artifact = await report
+                except Exception as error:  # pylint: disable=broad-except
+                    logger.warning("Failed to generate report, error %r, filename=%s", error, context["filename"])
+        return artifact
+
+    def _upload_progress_reporter(self, turn_context: TurnContext, file_size: int):
+        """
+        Build a progress callback that tells the user how a large upload is going,
+        once per quarter. Files that fit in a few chunks upload silently.
+        """
+        if file_size <= self.PROGRESS_REPORT_MIN_CHUNKS * self._uploader.chunk_size:
+            return None
+
+        reported = {"quarter": 0}
+
+        async def report(uploaded: int, total: int):
+            quarter = (uploaded * 4) // total
+            if quarter <= reported["quarter"] or uploaded >= total:
+                return
+            reported["quarter"] = quarter
+            await turn_context.send_activity(
+                self._create_reply(turn_context.activity, f"Uploading your report... {quarter * 25}%")
+            )
+            await flush_replies(turn_context)
+
+        return report
+
     async def on_teams_file_consent_decline(
             self,
             turn_context: TurnContext,
@@ -354,43 +628,70 @@ class TeamsFileUploadBot(TeamsActivityHandler):
             locale=activity.locale,
         )
         
-    async def _message_all_members(self, turn_context: TurnContext):
-        team_members = await self._get_paged_members(turn_context)
-
-        for member in team_members:
-            conversation_reference = TurnContext.get_conversation_reference(
-                turn_context.activity
-            )
-            #await self._add_conversation_reference(turn_context)
+    async def _message_all_members(self, turn_context: TurnContext) -> FanOutResult:
+        team_members = await self._get_roster(turn_context)
+        conversation_reference = TurnContext.get_conversation_reference(
+            turn_context.activity
+        )
 
-            conversation_parameters = ConversationParameters(
-                is_group=False,
-                bot=turn_context.activity.recipient,
-                members=[member],
-                tenant_id=turn_context.activity.conversation.tenant_id,
+        async def message_member(member: TeamsChannelAccount):
+            await self._create_member_conversation(
+                turn_context, conversation_reference, member, store_reference=False
             )
 
-            async def get_ref(tc1):
-                conversation_reference_inner = TurnContext.get_conversation_reference(
-                    tc1.activity
-                )
-                return await tc1.adapter.continue_conversation(
-                    conversation_reference_inner, send_message, self._app_id
-                )
-
-            async def send_message(tc2: TurnContext):
-                reply = MessageFactory.list([])
-                reply.attachments.append(self._send_suggested_actions_yes_no(member.name))
+        result = await self._fan_out.run(team_members, message_member)
+        await turn_context.send_activity(
+            MessageFactory.text(result.summary())
+        )
+        return result
 
-                return await tc2.send_activity(reply)
-                
+    async def _create_member_conversation(
+            self,
+            turn_context: TurnContext,
+            conversation_reference: ConversationReference,
+            member: TeamsChannelAccount,
+            store_reference: bool,
+    ):
+        """
+        Open a 1:1 conversation with a roster member and send the report card,
+        optionally remembering the new conversation for proactive messages.
+        """
+        conversation_parameters = ConversationParameters(
+            is_group=False,
+            bot=turn_context.activity.recipient,
+            members=[member],
+            tenant_id=turn_context.activity.conversation.tenant_id,
+        )
 
-            await turn_context.adapter.create_conversation(
-                conversation_reference, get_ref, conversation_parameters
+        async def get_ref(tc1):
+            conversation_reference_inner = TurnContext.get_conversation_reference(
+                tc1.activity
             )
-            #await self._add_conversation_reference(turn_context)
-        await turn_context.send_activity(
-            MessageFactory.text("All messages have been sent")
+            await run_proactive_turn(
+                lambda callback: tc1.adapter.continue_conversation(
+                    conversation_reference_inner, callback, self._app_id
+                ),
+                send_message,
+            )
+
+        async def send_message(tc2: TurnContext):
+            reply = MessageFactory.list([])
+            reply.attachments.append(self._send_suggested_actions_yes_no(member.name))
+            if store_reference:
+                new_conversation_reference = TurnContext.get_conversation_reference(tc2.activity)
+                new_conversation_reference.user = member
+                self.conversation_references[
+                    new_conversation_reference.user.id
+                ] = new_conversation_reference
+            return await tc2.send_activity(reply)
+
+        # Send errors are raised here rather than handled by on_turn_error, so the
+        # fan-out sees throttling and counts failed members.
+        await run_proactive_turn(
+            lambda callback: turn_context.adapter.create_conversation(
+                conversation_reference, callback, conversation_parameters
+            ),
+            get_ref,
         )
 
     async def _get_paged_members(
@@ -399,18 +700,73 @@ class TeamsFileUploadBot(TeamsActivityHandler):
         paged_members = []
         continuation_token = None
 
-        while True:
-            current_page = await TeamsInfo.get_paged_members(
-                turn_context, continuation_token, 100
-            )
-            continuation_token = current_page.continuation_token
-            paged_members.extend(current_page.members)
+        with metrics.ROSTER_FETCH_SECONDS.time():
+            while True:
+                current_page = await TeamsInfo.get_paged_members(
+                    turn_context, continuation_token, 100
+                )
+                continuation_token = current_page.continuation_token
+                paged_members.extend(current_page.members)
 
-            if continuation_token is None:
-                break
+                if continuation_token is None:
+                    break
 
+        metrics.ROSTER_MEMBERS.inc(amount=len(paged_members))
         return paged_members
 
+    @staticmethod
+    def _roster_key(activity: Activity) -> str:
+        team_info = teams_get_team_info(activity)
+        return team_info.id if team_info and team_info.id else activity.conversation.id
+
+    async def _get_roster(self, turn_context: TurnContext) -> List[TeamsChannelAccount]:
+        """
+        Return the team or group chat roster from the cache. Only the first message
+        in a conversation pages through the members API; stale rosters are served
+        as-is while a full resync runs in the background.
+        """
+        roster_key = self._roster_key(turn_context.activity)
+        members = self._roster_cache.get(roster_key)
+        if members is None:
+            members = await self._get_paged_members(turn_context)
+            self._roster_cache.set(roster_key, members)
+        elif self._roster_cache.is_stale(roster_key):
+            self._schedule_roster_resync(turn_context, roster_key)
+        return members
+
+    def _schedule_roster_resync(self, turn_context: TurnContext, roster_key: str):
+        if roster_key in self._roster_resyncs:
+            return
+        self._roster_resyncs.add(roster_key)
+        team_info = teams_get_team_info(turn_context.activity)
+        asyncio.ensure_future(
+            self._resync_roster(
+                turn_context.adapter,
+                TurnContext.get_conversation_reference(turn_context.activity),
+                roster_key,
+                team_info.id if team_info else None,
+            )
+        )
+
+    async def _resync_roster(
+            self, adapter, conversation_reference: ConversationReference, roster_key: str, team_id: str
+    ):
+        async def resync(turn_context: TurnContext):
+            # Continuation activities carry no channel data; give TeamsInfo the team it pages.
+            turn_context.activity.channel_data = {"team": {"id": team_id}} if team_id else {}
+            self._roster_cache.set(roster_key, await self._get_paged_members(turn_context))
+
+        try:
+            # Errors are logged here rather than handled by on_turn_error, which would message the group.
+            await run_proactive_turn(
+                lambda callback: adapter.continue_conversation(conversation_reference, callback, self._app_id),
+                resync,
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("Failed to resync roster %s, error %r", roster_key, error)
+        finally:
+            self._roster_resyncs.discard(roster_key)
+
     async def _add_conversation_reference(self, turn_context: TurnContext):
         conversation_reference = TurnContext.get_conversation_reference(turn_context.activity)
         if conversation_reference.conversation.conversation_type =='personal':
@@ -418,40 +774,103 @@ class TeamsFileUploadBot(TeamsActivityHandler):
                 conversation_reference.user.id
             ] = conversation_reference
         else:
-            team_members = await self._get_paged_members(turn_context)
-            for member in team_members:
-                if member.id not in self.conversation_references:
-                    conversation_reference = TurnContext.get_conversation_reference(
-                        turn_context.activity
-                    )
-                    # await self._add_conversation_reference(turn_context)
+            self._schedule_onboarding(turn_context)
 
-                    conversation_parameters = ConversationParameters(
-                        is_group=False,
-                        bot=turn_context.activity.recipient,
-                        members=[member],
-                        tenant_id=turn_context.activity.conversation.tenant_id,
-                    )
+    @staticmethod
+    def _onboarding_key(member: TeamsChannelAccount) -> str:
+        return member.aad_object_id or member.id
 
-                    async def get_ref(tc1):
-                        conversation_reference_inner = TurnContext.get_conversation_reference(
-                            tc1.activity
-                        )
-                        return await tc1.adapter.continue_conversation(
-                            conversation_reference_inner, send_message, self._app_id
-                        )
-
-                    async def send_message(tc2: TurnContext):
-
-                        reply = MessageFactory.list([])
-                        reply.attachments.append(self._send_suggested_actions_yes_no(member.name))
-                        new_conversation_reference = TurnContext.get_conversation_reference(tc2.activity)
-                        new_conversation_reference.user=member
-                        self.conversation_references[
-                            new_conversation_reference.user.id
-                        ] = new_conversation_reference
-                        return await tc2.send_activity(reply)
-
-                    await turn_context.adapter.create_conversation(
-                        conversation_reference, get_ref, conversation_parameters
-                    )
+    def _schedule_onboarding(self, turn_context: TurnContext):
+        """
+        Onboard the roster's new members in a background job, so a group message
+        doesn't wait for the roster to be paged or for one conversation per new
+        member. One job runs per roster at a time, and none while the cached roster
+        is unchanged since a job onboarded all of it.
+        """
+        roster_key = self._roster_key(turn_context.activity)
+        if roster_key in self._onboarding_jobs:
+            return
+        version = self._roster_cache.version(roster_key)
+        if version is not None and self._onboarded_rosters.get(roster_key) == version:
+            return
+        self._onboarding_jobs.add(roster_key)
+        team_info = teams_get_team_info(turn_context.activity)
+        asyncio.ensure_future(
+            self._onboard_roster(
+                turn_context.adapter,
+                TurnContext.get_conversation_reference(turn_context.activity),
+                roster_key,
+                team_info.id if team_info else None,
+            )
+        )
+
+    async def _onboard_roster(
+            self, adapter, conversation_reference: ConversationReference, roster_key: str, team_id: str
+    ):
+        """
+        Diff the roster against the onboarding index, claim the members not yet
+        onboarded and open a 1:1 conversation with each. Onboarded members are
+        recorded in batches as the fan-out goes; failed ones are released for the
+        next job to retry.
+        """
+        tenant_id = conversation_reference.conversation.tenant_id or ""
+
+        async def onboard(turn_context: TurnContext):
+            # Continuation activities carry no channel data; give TeamsInfo the team it pages.
+            turn_context.activity.channel_data = {"team": {"id": team_id}} if team_id else {}
+            members = {
+                self._onboarding_key(member): member for member in await self._get_roster(turn_context)
+            }
+            version = self._roster_cache.version(roster_key)
+            claimed = self._onboarding.claim(tenant_id, members)
+            # Members onboarded before the index existed already have a stored conversation.
+            known = [key for key in claimed if members[key].id in self.conversation_references]
+            self._onboarding.complete(tenant_id, known)
+            known = set(known)
+            new_members = [members[key] for key in claimed if key not in known]
+            if not new_members:
+                # Members claimed by another job that then fails are retried once the roster
+                # changes, at the latest when its hourly resync gives it a new version.
+                self._remember_onboarded(roster_key, version)
+                return
+
+            recorded = {"delivered": 0}
+
+            def record(result: FanOutResult, final: bool = False):
+                pending = result.delivered[recorded["delivered"]:]
+                if pending and (final or len(pending) >= self._onboarding_batch_size):
+                    self._onboarding.complete(tenant_id, pending)
+                    recorded["delivered"] += len(pending)
+
+            async def onboard_member(member: TeamsChannelAccount):
+                await self._create_member_conversation(
+                    turn_context, conversation_reference, member, store_reference=True
+                )
+
+            result = await self._fan_out.run(
+                new_members, onboard_member, key=self._onboarding_key, on_done=record
+            )
+            record(result, final=True)
+            self._onboarding.release(tenant_id, result.failed)
+            if not result.failed:
+                self._remember_onboarded(roster_key, version)
+            logger.info("Onboarded roster %s: %s", roster_key, result.summary())
+
+        try:
+            # Errors are logged here rather than handled by on_turn_error, which would message the group.
+            await run_proactive_turn(
+                lambda callback: adapter.continue_conversation(conversation_reference, callback, self._app_id),
+                onboard,
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("Failed to onboard roster %s, error %r", roster_key, error)
+        finally:
+            self._onboarding_jobs.discard(roster_key)
+
+    def _remember_onboarded(self, roster_key: str, version: Optional[Hashable]):
+        if version is None:
+            return
+        self._onboarded_rosters[roster_key] = version
+        self._onboarded_rosters.move_to_end(roster_key)
+        while len(self._onboarded_rosters) > self.MAX_ONBOARDED_ROSTERS:
+            self._onboarded_rosters.popitem(last=False)
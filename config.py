@@ -8,6 +8,107 @@ import os
 class DefaultConfig:
     """ Bot Configuration """
 
-    PORT = 3978
+    PORT = int(os.environ.get("Port", 3978))
     APP_ID = os.environ.get("MicrosoftAppId", "bd4a8cbe-4d70-4b91-8c88-44924e845309")
     APP_PASSWORD = os.environ.get("MicrosoftAppPassword", "CkXVV3jRQ_I-DGtpU6sdVk6d.O1.g_54W6")
+    LOG_LEVEL = os.environ.get("LogLevel", "INFO")
+    # Build the adapter and the bot on the first request rather than at startup (0 = at startup)
+    LAZY_STARTUP = bool(int(os.environ.get("LazyStartup", 1)))
+
+    # Server processes sharing the port. With more than one, rosters, conversation
+    # references and /api/notify broadcasts are shared through SQLite at SHARED_STATE_PATH.
+    WEB_WORKERS = int(os.environ.get("WebWorkers", 1))
+    SHARED_STATE_PATH = os.environ.get("SharedStatePath", "data/shared_state.db")
+    # Turns run in arrival order per conversation and in parallel across conversations, at
+    # most TURN_CONCURRENCY at once per process; conversations with turns waiting take turns.
+    # The order holds per worker only: with WEB_WORKERS > 1 the kernel spreads connections
+    # over the workers, so two activities of a conversation can run at once, or out of order.
+    TURN_CONCURRENCY = int(os.environ.get("TurnConcurrency", 16))
+    # Non-invoke activities are acknowledged with 202 and their turns queued (0 = respond
+    # after the turn). Turns waiting to run, acknowledged or not, are bounded; a full queue
+    # makes the request wait up to the enqueue timeout, then get a 503.
+    INGRESS_QUEUE = bool(int(os.environ.get("IngressQueue", 1)))
+    INGRESS_QUEUE_SIZE = int(os.environ.get("IngressQueueSize", 1000))
+    INGRESS_ENQUEUE_TIMEOUT = float(os.environ.get("IngressEnqueueTimeout", 5))
+    # Seconds to keep processing queued turns on shutdown
+    INGRESS_DRAIN_TIMEOUT = float(os.environ.get("IngressDrainTimeout", 10))
+    # Redelivered activities are dropped if their id was seen within the ttl (seconds)
+    ACTIVITY_DEDUP_TTL = float(os.environ.get("ActivityDedupTtl", 600))
+    ACTIVITY_DEDUP_SIZE = int(os.environ.get("ActivityDedupSize", 100000))
+
+    # Bot Connector clients: connections kept per service URL (also the executor thread count),
+    # request timeout, and seconds before expiry that the app token is refreshed
+    CONNECTOR_POOL_SIZE = int(os.environ.get("ConnectorPoolSize", 32))
+    CONNECTOR_TIMEOUT = float(os.environ.get("ConnectorTimeout", 30))
+    TOKEN_REFRESH_MARGIN = float(os.environ.get("TokenRefreshMargin", 600))
+    # A turn's replies are sent when it ends, adjacent messages merged (0 = send each at once);
+    # throttled replies are retried this many times
+    REPLY_BATCHING = bool(int(os.environ.get("ReplyBatching", 1)))
+    REPLY_MAX_RETRIES = int(os.environ.get("ReplyMaxRetries", 3))
+
+    # Shared HTTP client for file uploads and attachment downloads
+    TRANSFER_CONNECTION_LIMIT = int(os.environ.get("TransferConnectionLimit", 100))
+    TRANSFER_CONNECTION_LIMIT_PER_HOST = int(os.environ.get("TransferConnectionLimitPerHost", 10))
+    TRANSFER_TIMEOUT = float(os.environ.get("TransferTimeout", 300))
+    TRANSFER_RETRIES = int(os.environ.get("TransferRetries", 3))
+    # Byte range sent per request when uploading reports to OneDrive (multiple of 320 KiB)
+    UPLOAD_CHUNK_SIZE = int(os.environ.get("UploadChunkSize", 10 * 320 * 1024))
+    UPLOAD_MAX_RESUMES = int(os.environ.get("UploadMaxResumes", 3))
+
+    # Team roster cache: seconds before a roster is resynced in the background, and rosters held
+    ROSTER_CACHE_TTL = float(os.environ.get("RosterCacheTtl", 3600))
+    ROSTER_CACHE_SIZE = int(os.environ.get("RosterCacheSize", 1000))
+
+    # Fan-out of 1:1 messages to roster members. The default rate stays under the
+    # Teams per-bot, per-tenant limit of 50 requests per second.
+    FANOUT_WORKERS = int(os.environ.get("FanOutWorkers", 16))
+    FANOUT_RATE = float(os.environ.get("FanOutRate", 30))
+    FANOUT_BURST = float(os.environ.get("FanOutBurst", 30))
+    FANOUT_MAX_RETRIES = int(os.environ.get("FanOutMaxRetries", 3))
+    # Finished /api/notify jobs kept for the status endpoint
+    BROADCAST_JOB_HISTORY = int(os.environ.get("BroadcastJobHistory", 100))
+    # Multi-worker broadcasts: members per shard, idle poll (seconds), and seconds before a dead worker's shard is reclaimed
+    BROADCAST_SHARD_SIZE = int(os.environ.get("BroadcastShardSize", 500))
+    BROADCAST_POLL_INTERVAL = float(os.environ.get("BroadcastPollInterval", 1))
+    BROADCAST_LEASE = float(os.environ.get("BroadcastLease", 30))
+
+    # Members already sent the onboarding card, per tenant, kept across restarts. A group message
+    # onboards the roster's new members in the background, recording them in batches; members
+    # claimed by a worker that died are retried after the claim timeout (seconds).
+    ONBOARDING_INDEX_PATH = os.environ.get("OnboardingIndexPath", "data/onboarding.db")
+    ONBOARDING_BATCH_SIZE = int(os.environ.get("OnboardingBatchSize", 100))
+    ONBOARDING_CLAIM_TIMEOUT = float(os.environ.get("OnboardingClaimTimeout", 600))
+
+    # Conversation reference store: "memory" or "sqlite", and the in-memory LRU size for sqlite
+    REFERENCE_STORE = os.environ.get("ReferenceStore", "sqlite")
+    REFERENCE_STORE_PATH = os.environ.get("ReferenceStorePath", "data/conversation_references.db")
+    REFERENCE_CACHE_SIZE = int(os.environ.get("ReferenceCacheSize", 10000))
+    # With several workers, seconds a cached reference is trusted before it is re-read from SQLite
+    REFERENCE_CACHE_TTL = float(os.environ.get("ReferenceCacheTtl", 30))
+    # Changed references are written in batches: every interval seconds, or once this many are pending
+    REFERENCE_FLUSH_INTERVAL = float(os.environ.get("ReferenceFlushInterval", 5))
+    REFERENCE_FLUSH_BATCH = int(os.environ.get("ReferenceFlushBatch", 500))
+
+    # Report files offered to users, re-indexed every poll interval (seconds)
+    REPORTS_DIRECTORY = os.environ.get("ReportsDirectory", "files")
+    REPORTS_POLL_INTERVAL = float(os.environ.get("ReportsPollInterval", 5))
+
+    # Per-user report generation: worker processes (0 = one per CPU) and the size-bounded result cache
+    REPORT_WORKERS = int(os.environ.get("ReportWorkers", 0)) or None
+    REPORT_CACHE_DIRECTORY = os.environ.get("ReportCacheDirectory", "data/reports")
+    REPORT_CACHE_BYTES = int(os.environ.get("ReportCacheBytes", 512 * 1024 * 1024))
+
+    # Reports can be offered as "gzip" or "zip" instead of "none" (plain files). Each report's
+    # compressed copy is made once per content hash and reused for every upload.
+    REPORT_COMPRESSION = os.environ.get("ReportCompression", "none")
+    REPORT_COMPRESSION_LEVEL = int(os.environ.get("ReportCompressionLevel", 6))
+    COMPRESSED_REPORT_DIRECTORY = os.environ.get("CompressedReportDirectory", "data/compressed")
+    COMPRESSED_REPORT_CACHE_BYTES = int(os.environ.get("CompressedReportCacheBytes", 512 * 1024 * 1024))
+
+    # Uploaded parameter templates, validated against the report and stored one .npy file per
+    # column (by content hash); at most this many errors are listed when a template is rejected
+    PARAMETER_STORE_DIRECTORY = os.environ.get("ParameterStoreDirectory", "data/parameters")
+    PARAMETER_MAX_ERRORS = int(os.environ.get("ParameterMaxErrors", 10))
+
+    # Per-user settings and uploaded templates, one private directory per user
+    USER_SETTINGS_DIRECTORY = os.environ.get("UserSettingsDirectory", "data/users")
@@ -0,0 +1,130 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import importlib
+import sys
+
+# Public names and the submodule defining each. Submodules are imported on first
+# access, so importing one helper (e.g. metrics) doesn't pull in the Bot
+# Framework SDK through the others.
+_EXPORTS = {
+    "ActivityDeduplicator": "activity_dedup",
+    "SqliteActivityDeduplicator": "activity_dedup",
+    "BroadcastJob": "broadcast_jobs",
+    "BroadcastJobManager": "broadcast_jobs",
+    "SqliteBroadcastJobManager": "broadcast_jobs",
+    "CardTemplates": "card_templates",
+    "ChunkedUploader": "chunked_upload",
+    "CompressedReport": "compressed_reports",
+    "CompressedReportCache": "compressed_reports",
+    "PooledBotFrameworkAdapter": "connector_pool",
+    "RefreshingAppCredentials": "connector_pool",
+    "CsvIngest": "csv_ingest",
+    "CsvIngestResult": "csv_ingest",
+    "FanOutResult": "fan_out",
+    "FanOutScheduler": "fan_out",
+    "TokenBucket": "fan_out",
+    "FileTransferClient": "file_transfer",
+    "TransferResponse": "file_transfer",
+    "IngressQueue": "ingress_queue",
+    "IntentRouter": "intent_router",
+    "Counter": "metrics",
+    "Gauge": "metrics",
+    "Histogram": "metrics",
+    "MetricsRegistry": "metrics",
+    "metrics": "metrics",
+    "OnboardingIndex": "onboarding_index",
+    "SqliteOnboardingIndex": "onboarding_index",
+    "CoalescingReferenceStore": "reference_store",
+    "ConversationReferenceStore": "reference_store",
+    "MemoryReferenceStore": "reference_store",
+    "SqliteReferenceStore": "reference_store",
+    "create_reference_store": "reference_store",
+    "ParameterError": "parameter_store",
+    "ParameterParseResult": "parameter_store",
+    "ParameterStore": "parameter_store",
+    "ParameterTable": "parameter_store",
+    "load_parameters": "parameter_store",
+    "run_proactive_turn": "proactive",
+    "ReplyBatchingMiddleware": "reply_batcher",
+    "flush_replies": "reply_batcher",
+    "ReportArtifact": "report_engine",
+    "ReportEngine": "report_engine",
+    "generate_report": "report_engine",
+    "ReportInfo": "report_registry",
+    "ReportRegistry": "report_registry",
+    "RosterCache": "roster_cache",
+    "SqliteRosterCache": "roster_cache",
+    "UserSettingsStore": "user_settings",
+}
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{module_name}", __name__)
+    value = module if name == module_name else getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+__all__ = [
+    "ActivityDeduplicator",
+    "BroadcastJob",
+    "BroadcastJobManager",
+    "CardTemplates",
+    "ChunkedUploader",
+    "CoalescingReferenceStore",
+    "CompressedReport",
+    "CompressedReportCache",
+    "Counter",
+    "ConversationReferenceStore",
+    "CsvIngest",
+    "CsvIngestResult",
+    "FanOutResult",
+    "FanOutScheduler",
+    "FileTransferClient",
+    "Gauge",
+    "Histogram",
+    "IngressQueue",
+    "IntentRouter",
+    "MemoryReferenceStore",
+    "MetricsRegistry",
+    "OnboardingIndex",
+    "ParameterError",
+    "ParameterParseResult",
+    "ParameterStore",
+    "ParameterTable",
+    "PooledBotFrameworkAdapter",
+    "RefreshingAppCredentials",
+    "ReplyBatchingMiddleware",
+    "ReportArtifact",
+    "ReportEngine",
+    "ReportInfo",
+    "ReportRegistry",
+    "RosterCache",
+    "SqliteActivityDeduplicator",
+    "SqliteBroadcastJobManager",
+    "SqliteOnboardingIndex",
+    "SqliteReferenceStore",
+    "SqliteRosterCache",
+    "TokenBucket",
+    "TransferResponse",
+    "UserSettingsStore",
+    "create_reference_store",
+    "flush_replies",
+    "generate_report",
+    "load_parameters",
+    "run_proactive_turn",
+]
+
+
+if sys.version_info < (3, 7):
+    # Module __getattr__ (PEP 562) needs Python 3.7, so import everything up front.
+    for _name in _EXPORTS:
+        __getattr__(_name)
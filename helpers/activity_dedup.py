@@ -0,0 +1,127 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from botbuilder.schema import Activity
+
+from .sqlite_backend import connect
+
+
+class ActivityDeduplicator:
+    """
+    Remembers recently seen activity ids so redelivered activities are dropped.
+
+    Ids are kept in arrival order with the time they were first seen, so expired
+    entries are always at the front and are trimmed in O(1) each. At most
+    `max_entries` ids are held whatever the traffic.
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 100000):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._seen: Dict[str, float] = OrderedDict()
+
+    @staticmethod
+    def key_for(activity: Activity) -> Optional[str]:
+        """ Activity ids are only unique within a conversation. None if the activity has no id. """
+        if not activity.id:
+            return None
+        conversation_id = activity.conversation.id if activity.conversation else ""
+        return f"{activity.channel_id}|{conversation_id}|{activity.id}"
+
+    def claim(self, activity: Activity) -> bool:
+        """ True the first time an activity is seen within the ttl, False for a redelivery. """
+        key = self.key_for(activity)
+        if key is None:
+            return True
+        now = time.time()
+        self._expire(now)
+        if key in self._seen:
+            return False
+        self._seen[key] = now
+        while len(self._seen) > self._max_entries:
+            self._seen.popitem(last=False)
+        return True
+
+    def forget(self, activity: Activity):
+        """ Let a redelivery of `activity` through again, e.g. after it failed. """
+        key = self.key_for(activity)
+        if key is not None:
+            self._seen.pop(key, None)
+
+    def _expire(self, now: float):
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if now - seen_at <= self._ttl:
+                return
+            del self._seen[key]
+
+
+class SqliteActivityDeduplicator(ActivityDeduplicator):
+    """
+    Deduplicator shared by several worker processes through SQLite, since a
+    connector retry may reach a different worker than the original delivery.
+    Every claim is a single upsert on the primary key; expired rows are pruned
+    in the same transaction at most once per PRUNE_INTERVAL.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS seen_activities (
+            activity_key TEXT PRIMARY KEY,
+            seen_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS seen_activities_seen_at ON seen_activities (seen_at);
+    """
+
+    # Expired rows are deleted at most this often (seconds).
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, path: str, ttl: float = 600, max_entries: int = 100000):
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        self._path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pruned_at = 0.0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = connect(self._path, self.SCHEMA)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def claim(self, activity: Activity) -> bool:
+        key = self.key_for(activity)
+        if key is None:
+            return True
+
+        now = time.time()
+        with self.connection:
+            if now - self._pruned_at > self.PRUNE_INTERVAL:
+                self.connection.execute(
+                    "DELETE FROM seen_activities WHERE seen_at < ?", (now - self._ttl,)
+                )
+                self._pruned_at = now
+            # INSERT OR IGNORE then UPDATE rather than an upsert, which needs SQLite 3.24.
+            claimed = self.connection.execute(
+                "INSERT OR IGNORE INTO seen_activities (activity_key, seen_at) VALUES (?, ?)", (key, now)
+            ).rowcount or self.connection.execute(
+                "UPDATE seen_activities SET seen_at = ? WHERE activity_key = ? AND seen_at < ?",
+                (now, key, now - self._ttl),
+            ).rowcount
+        return bool(claimed)
+
+    def forget(self, activity: Activity):
+        key = self.key_for(activity)
+        if key is not None:
+            with self.connection:
+                self.connection.execute(
+                    "DELETE FROM seen_activities WHERE activity_key = ?", (key,)
+                )
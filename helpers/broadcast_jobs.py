@@ -0,0 +1,392 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from .fan_out import FanOutResult, FanOutScheduler
+from .sqlite_backend import connect
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastJob:
+    """ Progress of one proactive broadcast. """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    # Failures kept on the job for the status endpoint.
+    MAX_REPORTED_FAILURES = 20
+
+    def __init__(self, total: int, job_id: str = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.status = BroadcastJob.QUEUED
+        self.total = total
+        self.delivered = 0
+        self.failed: Dict[str, str] = {}
+        self.failed_count = 0
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def update(self, result: FanOutResult):
+        self.delivered = len(result.delivered)
+        self.failed_count = len(result.failed)
+        if len(self.failed) < self.MAX_REPORTED_FAILURES:
+            for key, error in result.failed.items():
+                if len(self.failed) >= self.MAX_REPORTED_FAILURES:
+                    break
+                self.failed.setdefault(key, repr(error))
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = self.elapsed
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "delivered": self.delivered,
+            "failed": self.failed_count,
+            "pending": self.total - self.delivered - self.failed_count,
+            "elapsed_seconds": round(elapsed, 3),
+            "messages_per_second": round(self.delivered / elapsed, 2) if elapsed else 0.0,
+            "failures": self.failed,
+            "error": self.error,
+        }
+
+
+class BroadcastJobManager:
+    """
+    Runs proactive broadcasts in the background on a FanOutScheduler and keeps
+    the most recent jobs around so their progress can be polled.
+
+    A broadcast is submitted as the keys of its recipients; each recipient is
+    loaded with `load` just before its message is sent, so a job never holds
+    more than the fan-out's in-flight items.
+    """
+
+    def __init__(
+            self,
+            fan_out: FanOutScheduler,
+            send: Callable[[Any], Awaitable[Any]],
+            load: Callable[[str], Any],
+            max_history: int = 100,
+    ):
+        self._fan_out = fan_out
+        self._send = send
+        self._load = load
+        self._max_history = max_history
+        self._jobs: Dict[str, BroadcastJob] = OrderedDict()
+        self._tasks: Dict[str, asyncio.Future] = {}
+
+    def submit(self, item_keys: Iterable[str]) -> BroadcastJob:
+        item_keys = list(item_keys)
+        job = BroadcastJob(len(item_keys))
+        self._jobs[job.id] = job
+        while len(self._jobs) > self._max_history:
+            oldest_id = next(iter(self._jobs))
+            if oldest_id in self._tasks:
+                break
+            del self._jobs[oldest_id]
+
+        self._tasks[job.id] = asyncio.ensure_future(self._run(job, item_keys))
+        return job
+
+    @property
+    def running(self) -> int:
+        """ Broadcasts being sent by this process. """
+        return len(self._tasks)
+
+    def get(self, job_id: str) -> Optional[BroadcastJob]:
+        return self._jobs.get(job_id)
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _send_key(self, item_key: str):
+        await self._send(self._load(item_key))
+
+    async def _run(self, job: BroadcastJob, item_keys: List[str]):
+        job.status = BroadcastJob.RUNNING
+        job.started = time.time()
+        try:
+            result = await self._fan_out.run(
+                item_keys, self._send_key, key=lambda item_key: item_key, on_done=job.update
+            )
+            job.update(result)
+            job.status = BroadcastJob.COMPLETED
+        except Exception as error:  # pylint: disable=broad-except
+            job.error = repr(error)
+            job.status = BroadcastJob.FAILED
+        finally:
+            job.finished = time.time()
+            del self._tasks[job.id]
+
+
+class SqliteBroadcastJobManager(BroadcastJobManager):
+    """
+    Broadcast jobs shared by several worker processes through SQLite.
+
+    `submit` records the item keys, split into shards. Every worker runs
+    `run_worker`, which claims one unclaimed shard at a time, loads its items
+    with `load` and sends them on the worker's own FanOutScheduler, so a
+    broadcast is partitioned across workers rather than repeated by each one.
+    A claimed shard that stops heartbeating for `lease` seconds (its worker
+    died) is picked up by another worker, which sends only the pending items.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            job_id TEXT PRIMARY KEY,
+            total INTEGER NOT NULL,
+            created REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS broadcast_shards (
+            job_id TEXT NOT NULL,
+            shard INTEGER NOT NULL,
+            claimed_by TEXT,
+            heartbeat REAL,
+            started REAL,
+            finished REAL,
+            error TEXT,
+            PRIMARY KEY (job_id, shard)
+        );
+        CREATE INDEX IF NOT EXISTS broadcast_shards_open ON broadcast_shards (finished, heartbeat);
+        CREATE TABLE IF NOT EXISTS broadcast_items (
+            job_id TEXT NOT NULL,
+            shard INTEGER NOT NULL,
+            item_key TEXT NOT NULL,
+            status TEXT,
+            error TEXT,
+            PRIMARY KEY (job_id, shard, item_key)
+        );
+    """
+
+    DELIVERED = "delivered"
+    FAILED = "failed"
+
+    def __init__(
+            self,
+            path: str,
+            fan_out: FanOutScheduler,
+            send: Callable[[Any], Awaitable[Any]],
+            load: Callable[[str], Any],
+            max_history: int = 100,
+            shard_size: int = 500,
+            lease: float = 30,
+    ):
+        super().__init__(fan_out, send, load, max_history=max_history)
+        self._path = path
+        self._shard_size = shard_size
+        self._lease = lease
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = connect(self._path, self.SCHEMA)
+        return self._connection
+
+    def submit(self, item_keys: Iterable[str]) -> BroadcastJob:
+        keys = list(item_keys)
+        job = BroadcastJob(len(keys))
+        shards = range(0, len(keys), self._shard_size)
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO broadcast_jobs (job_id, total, created) VALUES (?, ?, ?)",
+                (job.id, job.total, job.created),
+            )
+            self.connection.executemany(
+                "INSERT INTO broadcast_shards (job_id, shard) VALUES (?, ?)",
+                [(job.id, shard) for shard, _ in enumerate(shards)],
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO broadcast_items (job_id, shard, item_key) VALUES (?, ?, ?)",
+                [
+                    (job.id, shard, item_key)
+                    for shard, start in enumerate(shards)
+                    for item_key in keys[start:start + self._shard_size]
+                ],
+            )
+            self._prune_history()
+        if not keys:
+            job.status = BroadcastJob.COMPLETED
+        return job
+
+    @property
+    def running(self) -> int:
+        """ Broadcasts being sent, by any worker. """
+        try:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM (SELECT job_id FROM broadcast_shards GROUP BY job_id "
+                "HAVING COUNT(started) > 0 AND COUNT(finished) < COUNT(*))"
+            ).fetchone()[0]
+        except sqlite3.Error as error:
+            logger.warning("Failed to count running broadcasts, error %r", error)
+            return 0
+
+    def get(self, job_id: str) -> Optional[BroadcastJob]:
+        row = self.connection.execute(
+            "SELECT total, created FROM broadcast_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        job = BroadcastJob(row[0], job_id=job_id)
+        job.created = row[1]
+        shards = self.connection.execute(
+            "SELECT COUNT(*), COUNT(started), COUNT(finished), MIN(started), MAX(finished), MAX(error) "
+            "FROM broadcast_shards WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()
+        count, started, finished, job.started, job.finished, job.error = shards
+        for status, total in self.connection.execute(
+                "SELECT status, COUNT(*) FROM broadcast_items WHERE job_id = ? AND status IS NOT NULL "
+                "GROUP BY status",
+                (job_id,),
+        ):
+            if status == self.DELIVERED:
+                job.delivered = total
+            else:
+                job.failed_count = total
+        job.failed = dict(self.connection.execute(
+            "SELECT item_key, error FROM broadcast_items WHERE job_id = ? AND status = ? LIMIT ?",
+            (job_id, self.FAILED, BroadcastJob.MAX_REPORTED_FAILURES),
+        ).fetchall())
+
+        if finished == count:
+            job.status = BroadcastJob.FAILED if job.error else BroadcastJob.COMPLETED
+        elif started:
+            job.status = BroadcastJob.RUNNING
+            job.finished = None
+        return job
+
+    async def run_worker(self, interval: float):
+        """ Claim and send shards until cancelled, polling every `interval` seconds when idle. """
+        while True:
+            try:
+                shard = self._claim_shard()
+                if shard is not None:
+                    await self._run_shard(*shard)
+            except sqlite3.Error as error:
+                # A shard whose progress couldn't be saved is resumed once its lease runs out.
+                logger.warning("Failed to run a broadcast shard, error %r", error)
+                shard = None
+            if shard is None:
+                await asyncio.sleep(interval)
+
+    async def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _claim_shard(self):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        now = time.time()
+        candidates = self.connection.execute(
+            "SELECT s.job_id, s.shard FROM broadcast_shards s JOIN broadcast_jobs j ON j.job_id = s.job_id "
+            "WHERE s.finished IS NULL AND (s.claimed_by IS NULL OR s.heartbeat < ?) "
+            "ORDER BY j.created, s.shard LIMIT 8",
+            (now - self._lease,),
+        ).fetchall()
+        for job_id, shard in candidates:
+            with self.connection:
+                claimed = self.connection.execute(
+                    "UPDATE broadcast_shards SET claimed_by = ?, heartbeat = ?, started = COALESCE(started, ?) "
+                    "WHERE job_id = ? AND shard = ? AND finished IS NULL "
+                    "AND (claimed_by IS NULL OR heartbeat < ?)",
+                    (worker_id, now, now, job_id, shard, now - self._lease),
+                ).rowcount
+            if claimed:
+                return job_id, shard
+        return None
+
+    async def _run_shard(self, job_id: str, shard: int):
+        keys = [
+            item_key for (item_key,) in self.connection.execute(
+                "SELECT item_key FROM broadcast_items WHERE job_id = ? AND shard = ? AND status IS NULL",
+                (job_id, shard),
+            )
+        ]
+        written = {"delivered": 0, "failed": 0}
+        latest = FanOutResult()
+
+        def record(result: FanOutResult):
+            nonlocal latest
+            latest = result
+
+        def save_progress(finished: bool = False, error: str = None, release: bool = False):
+            delivered = latest.delivered[written["delivered"]:]
+            failed = list(latest.failed.items())[written["failed"]:]
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE broadcast_items SET status = ?, error = NULL "
+                    "WHERE job_id = ? AND shard = ? AND item_key = ?",
+                    [(self.DELIVERED, job_id, shard, item_key) for item_key in delivered],
+                )
+                self.connection.executemany(
+                    "UPDATE broadcast_items SET status = ?, error = ? "
+                    "WHERE job_id = ? AND shard = ? AND item_key = ?",
+                    [(self.FAILED, repr(failure), job_id, shard, item_key) for item_key, failure in failed],
+                )
+                self.connection.execute(
+                    "UPDATE broadcast_shards SET heartbeat = ?, finished = ?, error = ?, "
+                    "claimed_by = CASE WHEN ? THEN NULL ELSE claimed_by END "
+                    "WHERE job_id = ? AND shard = ?",
+                    (time.time(), time.time() if finished else None, error, release, job_id, shard),
+                )
+            written["delivered"] += len(delivered)
+            written["failed"] += len(failed)
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self._lease / 3)
+                try:
+                    save_progress()
+                except sqlite3.Error as error:
+                    # Retried on the next beat, well inside the lease.
+                    logger.warning("Failed to save broadcast progress, error %r", error)
+
+        beating = asyncio.ensure_future(heartbeat())
+        try:
+            latest = await self._fan_out.run(keys, self._send_key, key=lambda item_key: item_key, on_done=record)
+        except asyncio.CancelledError:
+            save_progress(release=True)
+            raise
+        except Exception as error:  # pylint: disable=broad-except
+            save_progress(finished=True, error=repr(error))
+        else:
+            save_progress(finished=True)
+        finally:
+            beating.cancel()
+
+    def _prune_history(self):
+        stale = [
+            job_id for (job_id,) in self.connection.execute(
+                "SELECT job_id FROM broadcast_jobs WHERE job_id NOT IN "
+                "(SELECT job_id FROM broadcast_shards WHERE finished IS NULL) "
+                "ORDER BY created DESC LIMIT -1 OFFSET ?",
+                (self._max_history,),
+            )
+        ]
+        for table in ("broadcast_items", "broadcast_shards", "broadcast_jobs"):
+            self.connection.executemany(f"DELETE FROM {table} WHERE job_id = ?", [(job_id,) for job_id in stale])
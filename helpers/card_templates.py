@@ -0,0 +1,74 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+from datetime import date
+from typing import Any, Callable, Dict
+
+from botbuilder.core import CardFactory
+from botbuilder.schema import ActionTypes, Attachment, CardAction, HeroCard
+
+
+class CardTemplates:
+    """
+    Prebuilt hero card attachments.
+
+    Static cards are built once. The report prompt is serialized once and its
+    dated text is reformatted only when the day rolls over; each recipient gets a
+    shallow copy of that payload with their name substituted, so broadcasts don't
+    rebuild the card object graph per member.
+    """
+
+    REPORT_PROMPT = "Hello, {name} today is {today}, would you like to see the report?"
+    REPORT_SETTINGS_PROMPT = "Would you like to update report parameters or the options for this report?"
+
+    def __init__(self, today: Callable[[], date] = date.today):
+        self._today = today
+        self._day: date = None
+        self._prompt_prefix, self._prompt_suffix_template = self.REPORT_PROMPT.split("{name}")
+        self._prompt_suffix = ""
+        self._report_prompt_payload: Dict[str, Any] = HeroCard(
+            buttons=[
+                CardAction(
+                    type=ActionTypes.im_back, title="Yes", value="Yes, I want to see the Report."
+                ),
+                CardAction(
+                    type=ActionTypes.im_back, title="No", value="No, I don't want to see the Report."
+                ),
+            ],
+        ).serialize()
+        self._report_settings = CardFactory.hero_card(
+            HeroCard(
+                text=self.REPORT_SETTINGS_PROMPT,
+                buttons=[
+                    CardAction(
+                        type=ActionTypes.im_back, title="Report Parameters", value="Update Report Parameters for Report"
+                    ),
+                    CardAction(
+                        type=ActionTypes.im_back, title="Options", value="Update Options for Report"
+                    ),
+                ],
+            )
+        )
+
+    def report_prompt_text(self, name: str) -> str:
+        self._refresh_day()
+        return self._prompt_prefix + name + self._prompt_suffix
+
+    def report_prompt(self, name: str) -> Attachment:
+        """ The Yes/No report card addressed to `name`. """
+        self._refresh_day()
+        content = dict(self._report_prompt_payload)
+        content["text"] = self._prompt_prefix + name + self._prompt_suffix
+        return Attachment(content_type=CardFactory.content_types.hero_card, content=content)
+
+    def report_settings(self) -> Attachment:
+        """ The Report Parameters/Options card. Shared, so callers must not modify it. """
+        return self._report_settings
+
+    def _refresh_day(self):
+        today = self._today()
+        if today == self._day:
+            return
+
+        self._prompt_suffix = self._prompt_suffix_template.format(today=today.strftime("%B %d, %Y"))
+        self._day = today
@@ -0,0 +1,122 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import inspect
+import json
+import os
+from typing import Awaitable, Callable, Optional, Union
+
+import aiohttp
+
+from .file_transfer import FileTransferClient, TransferResponse
+
+ProgressCallback = Callable[[int, int], Union[None, Awaitable[None]]]
+
+
+class ChunkedUploader:
+    """
+    Streams a file to a OneDrive upload session in fixed-size byte ranges.
+
+    Only one chunk is held in memory at a time, whatever the file size. When a
+    range fails after the transfer client's own retries, the uploader asks the
+    upload session for its next expected range and resumes from there.
+    """
+
+    # OneDrive requires every range except the last to be a multiple of 320 KiB.
+    CHUNK_ALIGNMENT = 320 * 1024
+    COMPLETED_STATUSES = frozenset([200, 201])
+    RESUMABLE_STATUSES = frozenset([408, 416, 429, 500, 502, 503, 504])
+
+    def __init__(
+            self,
+            file_transfer: FileTransferClient,
+            chunk_size: int = 10 * CHUNK_ALIGNMENT,
+            max_resumes: int = 3,
+    ):
+        aligned = (chunk_size // self.CHUNK_ALIGNMENT) * self.CHUNK_ALIGNMENT
+        self._file_transfer = file_transfer
+        self._chunk_size = max(aligned, self.CHUNK_ALIGNMENT)
+        self._max_resumes = max_resumes
+
+    @property
+    def chunk_size(self) -> int:
+        return self._chunk_size
+
+    async def upload_file(
+            self,
+            upload_url: str,
+            file_path: str,
+            progress: ProgressCallback = None,
+            size: int = None,
+    ) -> TransferResponse:
+        total = os.path.getsize(file_path) if size is None else size
+        if total == 0:
+            return await self._file_transfer.upload(upload_url, b"")
+
+        loop = asyncio.get_event_loop()
+        offset = 0
+        resumes = 0
+        with open(file_path, "rb") as source:
+            while True:
+                length = min(self._chunk_size, total - offset)
+                chunk = await loop.run_in_executor(
+                    None, self._read_range, source, offset, length
+                )
+                headers = {"Content-Range": f"bytes {offset}-{offset + length - 1}/{total}"}
+
+                response: Optional[TransferResponse] = None
+                try:
+                    response = await self._file_transfer.upload(upload_url, chunk, headers=headers)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if resumes >= self._max_resumes:
+                        raise
+                del chunk
+
+                if response is not None:
+                    if response.status in self.COMPLETED_STATUSES:
+                        await self._report(progress, total, total)
+                        return response
+                    if response.status == 202:
+                        offset = self._next_expected_offset(response.body, offset + length)
+                        await self._report(progress, offset, total)
+                        continue
+                    if response.status not in self.RESUMABLE_STATUSES or resumes >= self._max_resumes:
+                        return response
+
+                resumes += 1
+                offset = await self._query_next_offset(upload_url, offset)
+
+    @staticmethod
+    def _read_range(source, offset: int, length: int) -> bytes:
+        source.seek(offset)
+        return source.read(length)
+
+    async def _query_next_offset(self, upload_url: str, fallback: int) -> int:
+        """
+        Ask the upload session which range it expects next, falling back to the
+        last acknowledged offset when the session can't be queried.
+        """
+        try:
+            response = await self._file_transfer.download(upload_url)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return fallback
+        if response.status != 200:
+            return fallback
+        return self._next_expected_offset(response.body, fallback)
+
+    @staticmethod
+    def _next_expected_offset(body: bytes, fallback: int) -> int:
+        try:
+            ranges = json.loads(body.decode("utf-8")).get("nextExpectedRanges")
+            return int(ranges[0].split("-")[0])
+        except (ValueError, AttributeError, TypeError, IndexError, UnicodeDecodeError):
+            return fallback
+
+    @staticmethod
+    async def _report(progress: ProgressCallback, uploaded: int, total: int):
+        if progress is None:
+            return
+        result = progress(uploaded, total)
+        if inspect.isawaitable(result):
+            await result
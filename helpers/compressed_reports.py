@@ -0,0 +1,150 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import gzip
+import os
+import shutil
+import sys
+import zipfile
+from collections import OrderedDict
+from typing import Dict, List
+
+
+def compress_file(source_path: str, output_path: str, name: str, compression: str, level: int) -> int:
+    """
+    Compress `source_path` to `output_path` as a gzip file or a zip archive with
+    one member called `name`. Output is written next to its final path and moved
+    into place, so readers never see a partial file. Returns the compressed size.
+    """
+    partial_path = f"{output_path}.{os.getpid()}.part"
+    with open(source_path, "rb") as source:
+        if compression == CompressedReportCache.GZIP:
+            # mtime=0 keeps the output a pure function of the content.
+            with open(partial_path, "wb") as raw, gzip.GzipFile(
+                    filename=name, mode="wb", compresslevel=level, fileobj=raw, mtime=0
+            ) as output:
+                shutil.copyfileobj(source, output, CompressedReportCache.BLOCK_SIZE)
+        else:
+            # ZipFile takes a compression level from Python 3.7; before that it always uses the default.
+            options = {"compresslevel": level} if sys.version_info >= (3, 7) else {}
+            with zipfile.ZipFile(
+                    partial_path, "w", compression=zipfile.ZIP_DEFLATED, **options
+            ) as archive, archive.open(name, "w", force_zip64=True) as output:
+                shutil.copyfileobj(source, output, CompressedReportCache.BLOCK_SIZE)
+    os.replace(partial_path, output_path)
+    return os.path.getsize(output_path)
+
+
+class CompressedReport:
+    """ A compressed copy of a report in the cache. """
+
+    def __init__(self, key: str, name: str, path: str, size: int, original_size: int):
+        self.key = key
+        self.name = name
+        self.path = path
+        self.size = size
+        self.original_size = original_size
+
+
+class CompressedReportCache:
+    """
+    Compressed copies of report files, keyed by the content hash of the original.
+
+    A report sent to many users is compressed once: later requests for the same
+    content get the cached file, and concurrent requests share one compression.
+    Files are named by content hash, so worker processes sharing `directory`
+    reuse each other's output. The cache is bounded in bytes, evicting the least
+    recently used files.
+    """
+
+    GZIP = "gzip"
+    ZIP = "zip"
+    EXTENSIONS = {GZIP: ".gz", ZIP: ".zip"}
+    BLOCK_SIZE = 1024 * 1024
+
+    def __init__(
+            self,
+            directory: str,
+            compression: str = GZIP,
+            level: int = 6,
+            max_cache_bytes: int = 512 * 1024 * 1024,
+    ):
+        if compression not in self.EXTENSIONS:
+            raise ValueError(f"Unsupported report compression {compression!r}")
+        self._directory = directory
+        self._compression = compression
+        self._level = level
+        self._max_cache_bytes = max_cache_bytes
+        self._reports: Dict[str, CompressedReport] = OrderedDict()
+        self._cache_bytes = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @property
+    def compression(self) -> str:
+        return self._compression
+
+    def compressed_name(self, name: str) -> str:
+        """ The file name users see, e.g. report.csv.gz or report.zip. """
+        if self._compression == self.ZIP:
+            return os.path.splitext(name)[0] + ".zip"
+        return name + self.EXTENSIONS[self._compression]
+
+    def get(self, name: str, path: str, content_key: str) -> "asyncio.Future[CompressedReport]":
+        """
+        Return a future for the compressed copy of the file at `path`, whose
+        content hash is `content_key`; completed at once when it is cached.
+        """
+        # A cache holds one format, so the content hash alone keys it.
+        loop = asyncio.get_event_loop()
+        report = self._reports.get(content_key)
+        if report is not None and os.path.exists(report.path):
+            self._reports.move_to_end(content_key)
+            future = loop.create_future()
+            future.set_result(report)
+            return future
+
+        future = self._pending.get(content_key)
+        if future is None:
+            future = asyncio.ensure_future(self._compress(content_key, name, path))
+            self._pending[content_key] = future
+        return future
+
+    async def _compress(self, key: str, name: str, path: str) -> CompressedReport:
+        output_path = os.path.join(self._directory, key + self.EXTENSIONS[self._compression])
+        try:
+            self._forget(key)
+            if os.path.exists(output_path):
+                # Another worker already compressed this content.
+                size = os.path.getsize(output_path)
+            else:
+                os.makedirs(self._directory, exist_ok=True)
+                size = await asyncio.get_event_loop().run_in_executor(
+                    None, compress_file, path, output_path, name, self._compression, self._level
+                )
+            report = CompressedReport(
+                key, self.compressed_name(name), output_path, size, os.path.getsize(path)
+            )
+            self._remember(report)
+            return report
+        finally:
+            del self._pending[key]
+
+    def _forget(self, key: str):
+        report = self._reports.pop(key, None)
+        if report is not None:
+            self._cache_bytes -= report.size
+
+    def _remember(self, report: CompressedReport):
+        self._reports[report.key] = report
+        self._cache_bytes += report.size
+        evicted: List[CompressedReport] = []
+        while self._cache_bytes > self._max_cache_bytes and len(self._reports) > 1:
+            _, oldest = self._reports.popitem(last=False)
+            self._cache_bytes -= oldest.size
+            evicted.append(oldest)
+        for oldest in evicted:
+            try:
+                os.remove(oldest.path)
+            except OSError:
+                pass
@@ -0,0 +1,133 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import base64
+import json
+import logging
+import time
+from typing import Optional
+
+import msal
+import requests
+from botbuilder.core import BotFrameworkAdapter, BotFrameworkAdapterSettings
+from botframework.connector import ConnectorClient
+from botframework.connector.auth import AppCredentials, MicrosoftAppCredentials
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshingAppCredentials(MicrosoftAppCredentials):
+    """
+    App credentials that keep their bearer token ahead of its expiry.
+
+    The connector signs every request synchronously on the event loop, so a
+    token fetched on demand stalls every in-flight turn for an AAD round trip.
+    `run_refresher` fetches a new token in the executor `refresh_margin`
+    seconds before the current one expires; requests only ever read the cached
+    token, and fall back to fetching inline only if none is valid.
+    """
+
+    # Tokens are not handed out when they have less than this left (seconds).
+    MIN_VALIDITY = 60
+    # Lifetime assumed when a token's expiry can't be read.
+    DEFAULT_LIFETIME = 3000
+
+    def __init__(
+            self,
+            app_id: str,
+            password: str,
+            channel_auth_tenant: str = None,
+            oauth_scope: str = None,
+            refresh_margin: float = 600,
+    ):
+        super().__init__(app_id, password, channel_auth_tenant=channel_auth_tenant, oauth_scope=oauth_scope)
+        self._refresh_margin = refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+
+    def get_access_token(self, force_refresh: bool = False) -> str:
+        token = self._token
+        if token and not force_refresh and time.time() < self._expires_at - self.MIN_VALIDITY:
+            return token
+        if force_refresh and self.app is not None:
+            # MSAL would return its cached token until it is nearly expired.
+            self.app.token_cache = msal.TokenCache()
+        token = super().get_access_token()
+        self._token, self._expires_at = token, self._expiry(token)
+        return token
+
+    async def run_refresher(self, retry_interval: float = 30):
+        """ Refresh the token shortly before it expires, until cancelled. """
+        if not self.microsoft_app_id:
+            return
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(max(self._expires_at - self._refresh_margin - time.time(), 0))
+            try:
+                await loop.run_in_executor(None, self.get_access_token, self._token is not None)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("App token refresh failed, error %r", error)
+                await asyncio.sleep(retry_interval)
+            else:
+                if self._expires_at - self._refresh_margin <= time.time():
+                    # The token lives shorter than the margin; don't refresh in a tight loop.
+                    await asyncio.sleep(retry_interval)
+
+    @classmethod
+    def _expiry(cls, token: str) -> float:
+        """ The `exp` claim of a JWT access token, without verifying it. """
+        try:
+            payload = token.split(".")[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+            return float(claims["exp"])
+        except (IndexError, ValueError, KeyError, TypeError):
+            return time.time() + cls.DEFAULT_LIFETIME
+
+
+class PooledBotFrameworkAdapter(BotFrameworkAdapter):
+    """
+    Adapter whose cached connector clients keep enough warm connections for
+    concurrent sends to the same service URL.
+
+    The base adapter already reuses one ConnectorClient per service URL, but
+    its HTTP session keeps only 10 idle connections per host, so a fan-out
+    with more concurrent sends than that reconnects (and redoes TLS) for the
+    excess on every message. Clients are closed with `close`.
+    """
+
+    def __init__(
+            self,
+            settings: BotFrameworkAdapterSettings,
+            pool_size: int = 32,
+            timeout: float = 30,
+    ):
+        super().__init__(settings)
+        self._pool_size = pool_size
+        self._timeout = timeout
+
+    def _get_or_create_connector_client(
+            self, service_url: str, credentials: AppCredentials
+    ) -> ConnectorClient:
+        client = super()._get_or_create_connector_client(service_url, credentials)
+        if client.config.session_configuration_callback != self._configure_session:
+            client.config.connection.timeout = self._timeout
+            client.config.session_configuration_callback = self._configure_session
+        return client
+
+    async def close(self):
+        clients = list(self._connector_client_cache.values())
+        self._connector_client_cache.clear()
+        for client in clients:
+            await client.__aexit__(None, None, None)
+
+    def _configure_session(self, session: requests.Session, global_config, local_config, **kwargs):
+        # pylint: disable=unused-argument
+        adapter = session.get_adapter("https://")
+        if getattr(adapter, "_pool_maxsize", None) != self._pool_size:
+            pooled = requests.adapters.HTTPAdapter(
+                pool_connections=4, pool_maxsize=self._pool_size, max_retries=adapter.max_retries
+            )
+            session.mount("https://", pooled)
+            session.mount("http://", pooled)
+        return kwargs
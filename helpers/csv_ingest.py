@@ -0,0 +1,93 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import codecs
+import csv
+import hashlib
+import os
+import tempfile
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+HeaderCallback = Callable[[List[str]], Awaitable[None]]
+
+
+class CsvIngestResult:
+    """ Summary of an ingested CSV upload. """
+
+    def __init__(self, path: str, header: List[str], size: int, sha256: str):
+        self.path = path
+        self.header = header
+        self.size = size
+        self.sha256 = sha256
+
+
+class CsvIngest:
+    """
+    Persists a CSV download chunk by chunk, hashing it on the way.
+
+    Only the header row is parsed: it is handed to `on_header` as soon as it has
+    arrived, before the rest of the file has landed. The rows are validated
+    later, in one pass, by ParameterStore. The file is written to a unique
+    temporary file next to its destination and moved into place once complete,
+    so concurrent uploads never interleave.
+    """
+
+    def __init__(self, encoding: str = "utf-8-sig", max_header_bytes: int = 64 * 1024):
+        self._encoding = encoding
+        self._max_header_bytes = max_header_bytes
+
+    async def ingest(
+            self,
+            chunks: AsyncIterator[bytes],
+            destination: str,
+            on_header: Optional[HeaderCallback] = None,
+    ) -> CsvIngestResult:
+        loop = asyncio.get_event_loop()
+        descriptor, partial_path = tempfile.mkstemp(
+            dir=os.path.dirname(destination) or ".", suffix=".part"
+        )
+        decoder = codecs.getincrementaldecoder(self._encoding)(errors="replace")
+        header: Optional[List[str]] = None
+        pending = ""
+        size = 0
+        digest = hashlib.sha256()
+
+        target = os.fdopen(descriptor, "wb")
+        try:
+            async for chunk in chunks:
+                await loop.run_in_executor(None, target.write, chunk)
+                size += len(chunk)
+                digest.update(chunk)
+                if header is not None:
+                    continue
+
+                pending += decoder.decode(chunk)
+                lines = pending.splitlines(True)
+                if not lines or not lines[0].endswith(("\n", "\r")):
+                    if len(pending) > self._max_header_bytes:
+                        raise ValueError("CSV header row is too long")
+                    continue
+                header = self._parse_header(lines[0])
+                pending = ""
+                if on_header is not None:
+                    await on_header(header)
+
+            if header is None:
+                pending += decoder.decode(b"", final=True)
+                if pending:
+                    header = self._parse_header(pending)
+                    if on_header is not None:
+                        await on_header(header)
+        except BaseException:
+            target.close()
+            os.remove(partial_path)
+            raise
+
+        target.close()
+        os.replace(partial_path, destination)
+        return CsvIngestResult(destination, header or [], size, digest.hexdigest())
+
+    @staticmethod
+    def _parse_header(line: str) -> List[str]:
+        return next(csv.reader([line]), [])
@@ -0,0 +1,146 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from . import metrics
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by every task that talks to the connector.
+    A throttling response pauses the whole bucket until its Retry-After passes.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class FanOutResult:
+    """ Delivered and failed item keys of a fan-out run. """
+
+    def __init__(self):
+        self.delivered: List[str] = []
+        self.failed: Dict[str, Exception] = {}
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def total(self) -> int:
+        return len(self.delivered) + len(self.failed)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def summary(self) -> str:
+        text = f"Delivered to {len(self.delivered)} of {self.total} members"
+        if self.failed:
+            text += f", {len(self.failed)} failed"
+        return text
+
+
+class FanOutScheduler:
+    """
+    Runs one send per item with bounded concurrency under a shared rate limit.
+
+    Throttled sends (HTTP 429) are retried after the server's Retry-After, and
+    meanwhile every worker waits, so a large broadcast slows down instead of
+    piling up more throttled requests.
+    """
+
+    DEFAULT_RETRY_AFTER = 1.0
+
+    def __init__(
+            self,
+            workers: int = 16,
+            rate: float = 30,
+            burst: float = 30,
+            max_retries: int = 3,
+    ):
+        self._workers = workers
+        self._bucket = TokenBucket(rate, burst)
+        self._max_retries = max_retries
+
+    async def run(
+            self,
+            items: Iterable[Any],
+            send: Callable[[Any], Awaitable[Any]],
+            key: Callable[[Any], str] = lambda item: item.id,
+            on_done: Callable[[FanOutResult], None] = None,
+    ) -> FanOutResult:
+        result = FanOutResult()
+        queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+
+        async def worker():
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                error = await self._send_with_retry(send, item)
+                if error is None:
+                    result.delivered.append(key(item))
+                    metrics.FANOUT_MESSAGES.inc("delivered")
+                else:
+                    result.failed[key(item)] = error
+                    metrics.FANOUT_MESSAGES.inc("failed")
+                if on_done is not None:
+                    on_done(result)
+
+        await asyncio.gather(*[worker() for _ in range(min(self._workers, queue.qsize()))])
+        result.finished = time.monotonic()
+        return result
+
+    async def _send_with_retry(self, send, item) -> Optional[Exception]:
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            try:
+                await send(item)
+                return None
+            except Exception as error:  # pylint: disable=broad-except
+                retry_after = self.throttle_delay(error)
+                if retry_after is None or attempt >= self._max_retries:
+                    return error
+                metrics.FANOUT_THROTTLED.inc()
+                self._bucket.pause(retry_after)
+                attempt += 1
+
+    @classmethod
+    def throttle_delay(cls, error: Exception) -> Optional[float]:
+        """ Seconds to wait if `error` is a 429 from the connector, otherwise None. """
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None) or getattr(response, "status", None)
+        if status != 429:
+            return None
+        headers = getattr(response, "headers", None) or {}
+        try:
+            return float(headers.get("Retry-After", cls.DEFAULT_RETRY_AFTER))
+        except (TypeError, ValueError):
+            return cls.DEFAULT_RETRY_AFTER
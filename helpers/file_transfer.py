@@ -0,0 +1,137 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import random
+from typing import AsyncIterator, Dict, Optional
+
+import aiohttp
+
+
+class TransferResponse:
+    """ Status, headers and body of a completed transfer request. """
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class FileTransferClient:
+    """
+    Shared, non-blocking HTTP client used for file uploads and attachment downloads.
+
+    A single pooled aiohttp session is created lazily on the running event loop and
+    reused for every transfer, with a global and a per-host connection limit.
+    Connection errors, timeouts and retryable status codes are retried with
+    exponential backoff (honouring Retry-After when the server sends one).
+    """
+
+    RETRYABLE_STATUSES = frozenset([408, 429, 500, 502, 503, 504])
+
+    def __init__(
+            self,
+            limit: int = 100,
+            limit_per_host: int = 10,
+            timeout: float = 300,
+            connect_timeout: float = 10,
+            retries: int = 3,
+            backoff: float = 0.5,
+            max_backoff: float = 30,
+    ):
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._limit, limit_per_host=self._limit_per_host
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self._timeout
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def download(self, url: str) -> TransferResponse:
+        return await self.request("GET", url)
+
+    async def iter_chunks(self, url: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """
+        Stream a download as it arrives. Only establishing the response is retried;
+        once the body has started the caller sees any failure.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = await self._get_session().get(url)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= self._retries:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status in self.RETRYABLE_STATUSES and attempt < self._retries:
+                response.release()
+                await asyncio.sleep(self._retry_delay(attempt, response.headers.get("Retry-After")))
+                attempt += 1
+                continue
+            break
+
+        async with response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+
+    async def upload(
+            self, url: str, data, headers: Dict[str, str] = None
+    ) -> TransferResponse:
+        return await self.request("PUT", url, data=data, headers=headers)
+
+    async def request(
+            self, method: str, url: str, data=None, headers: Dict[str, str] = None
+    ) -> TransferResponse:
+        """
+        Send a request and read the full response body, retrying transient failures.
+        `data` must be re-sendable (bytes or a callable returning a fresh payload).
+        """
+        attempt = 0
+        while True:
+            payload = data() if callable(data) else data
+            try:
+                async with self._get_session().request(
+                        method, url, data=payload, headers=headers
+                ) as response:
+                    body = await response.read()
+                    result = TransferResponse(response.status, dict(response.headers), body)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= self._retries:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                attempt += 1
+                continue
+
+            if result.status not in self.RETRYABLE_STATUSES or attempt >= self._retries:
+                return result
+
+            await asyncio.sleep(self._retry_delay(attempt, result.headers.get("Retry-After")))
+            attempt += 1
+
+    def _retry_delay(self, attempt: int, retry_after: str = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self._max_backoff)
+            except ValueError:
+                pass
+        delay = min(self._backoff * (2 ** attempt), self._max_backoff)
+        return delay * (0.5 + random.random() / 2)
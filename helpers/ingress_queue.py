@@ -0,0 +1,161 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IngressQueue:
+    """
+    Bounded queue of accepted turns, run strictly in order per key (the
+    conversation id) and in parallel across keys, at most `max_concurrency` at
+    a time.
+
+    Each key has its own FIFO, and a key holds at most one running item, so two
+    turns of one conversation never interleave. Keys with work waiting take
+    turns: a key goes to the back of the line after each item, so a busy
+    conversation can't starve quiet ones however many items it queues.
+
+    `run` waits for an item's result (for invokes, whose response is needed in
+    the request). `submit` queues an item in the background. Waiting items of
+    both kinds are bounded by `max_pending`: when there is no room, `submit`
+    and `run` wait up to `enqueue_timeout` seconds, then `submit` returns False
+    and `run` raises asyncio.QueueFull, pushing back on the caller.
+
+    Order is kept within this queue, i.e. within one process.
+    """
+
+    def __init__(
+            self,
+            process: Callable[[Any], Awaitable[Any]],
+            max_concurrency: int = 16,
+            max_pending: int = 1000,
+            enqueue_timeout: float = 5,
+    ):
+        self._process = process
+        self._max_concurrency = max(max_concurrency, 1)
+        self._max_pending = max(max_pending, 1)
+        self._enqueue_timeout = enqueue_timeout
+        self._queues: Dict[str, Deque[Tuple[Any, Optional[asyncio.Future]]]] = {}
+        # Keys with queued items and nothing running, in the order they get a slot.
+        self._ready: Deque[str] = deque()
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Future] = set()
+        self._queued = 0
+        self._room: Optional[asyncio.Condition] = None
+        self._idle: Optional[asyncio.Event] = None
+
+    @property
+    def pending(self) -> int:
+        """ Items waiting for their key's earlier items or a free slot. """
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    async def run(self, key: str, item: Any) -> Any:
+        """ Process `item` after earlier items with the same key, and return its result. """
+        if not await self._wait_for_room():
+            raise asyncio.QueueFull()
+        future = asyncio.get_event_loop().create_future()
+        self._enqueue(key, item, future)
+        return await future
+
+    async def submit(self, key: str, item: Any) -> bool:
+        """ Queue `item` behind earlier items with the same key. False if there was no room in time. """
+        if not await self._wait_for_room():
+            return False
+        self._enqueue(key, item, None)
+        return True
+
+    async def close(self, timeout: Optional[float] = None):
+        """ Let queued and running items finish for up to `timeout` seconds, then cancel them. """
+        if timeout and (self._queued or self._tasks):
+            self._idle = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for queue in self._queues.values():
+            for _, future in queue:
+                if future is not None:
+                    future.cancel()
+        self._queues.clear()
+        self._ready.clear()
+        self._queued = 0
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _wait_for_room(self) -> bool:
+        if self._queued < self._max_pending:
+            return True
+        if self._room is None:
+            self._room = asyncio.Condition()
+        try:
+            async with self._room:
+                await asyncio.wait_for(
+                    self._room.wait_for(lambda: self._queued < self._max_pending),
+                    self._enqueue_timeout,
+                )
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _enqueue(self, key: str, item: Any, future: Optional[asyncio.Future]):
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+        if not queue and key not in self._running:
+            self._ready.append(key)
+        queue.append((item, future))
+        self._queued += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._ready and len(self._running) < self._max_concurrency:
+            key = self._ready.popleft()
+            item, future = self._queues[key].popleft()
+            self._queued -= 1
+            self._running.add(key)
+            task = asyncio.ensure_future(self._run_item(key, item, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if self._room is not None and self._queued < self._max_pending:
+            asyncio.ensure_future(self._notify_room())
+
+    async def _run_item(self, key: str, item: Any, future: Optional[asyncio.Future]):
+        try:
+            result = await self._process(item)
+        except asyncio.CancelledError:
+            if future is not None:
+                future.cancel()
+            raise
+        except Exception as error:  # pylint: disable=broad-except
+            if future is None:
+                logger.exception("Unhandled error processing a queued turn, error %r", error)
+            elif not future.done():
+                future.set_exception(error)
+        else:
+            if future is not None and not future.done():
+                future.set_result(result)
+        finally:
+            self._running.discard(key)
+            queue = self._queues.get(key)
+            if queue:
+                # Back of the line, behind every other conversation with work waiting.
+                self._ready.append(key)
+            elif queue is not None:
+                del self._queues[key]
+            self._dispatch()
+            if self._idle is not None and not self._queued and not self._running:
+                self._idle.set()
+
+    async def _notify_room(self):
+        async with self._room:
+            self._room.notify_all()
@@ -0,0 +1,87 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Pattern, Tuple
+
+IntentHandler = Callable[..., Awaitable]
+
+
+class IntentRouter:
+    """
+    Maps message text to a handler.
+
+    Card button postbacks are resolved with a single dictionary lookup on the
+    stripped text. Anything else is scanned once by a precompiled alternation of
+    all the keywords, which reports the first keyword found at every position;
+    the hit registered earliest wins, and patterns registered before it are
+    checked against the whole text, so earlier registrations win just like an
+    if/elif chain.
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, Tuple[str, IntentHandler]] = {}
+        self._rules: List[Tuple[str, bool, str, IntentHandler]] = []
+        self._keyword_rules: List[int] = []
+        self._patterns: List[Tuple[int, Pattern]] = []
+        self._fallback: Optional[Tuple[str, IntentHandler]] = None
+        self._matcher: Optional[Pattern] = None
+
+    def add_exact(self, value: str, handler: IntentHandler, name: str = None):
+        """ Route a card button value (or any fixed text) straight to `handler`. """
+        self._exact[value.strip()] = (name or value, handler)
+
+    def add_keyword(self, keyword: str, handler: IntentHandler, name: str = None):
+        """ Route any text containing `keyword`. """
+        self._add_rule(re.escape(keyword), False, name or keyword, handler)
+
+    def add_pattern(self, pattern: str, handler: IntentHandler, name: str):
+        """ Route text that matches the regular expression `pattern` in full. """
+        self._add_rule(pattern, True, name, handler)
+
+    def set_fallback(self, handler: IntentHandler, name: str = "fallback"):
+        self._fallback = (name, handler)
+
+    def resolve(self, text: str) -> Optional[Tuple[str, IntentHandler]]:
+        """ Return the (intent name, handler) for `text`, or the fallback. """
+        intent = self._exact.get(text.strip())
+        if intent is not None:
+            return intent
+
+        if self._matcher is None:
+            self._compile()
+        best = None
+        for match in self._matcher.finditer(text):
+            index = self._keyword_rules[match.lastindex - 1]
+            if best is None or index < best:
+                best = index
+                if index == self._keyword_rules[0]:
+                    break
+        for index, pattern in self._patterns:
+            if best is not None and index > best:
+                break
+            if pattern.fullmatch(text):
+                best = index
+                break
+        if best is None:
+            return self._fallback
+        _, _, name, handler = self._rules[best]
+        return name, handler
+
+    def _add_rule(self, expression: str, full: bool, name: str, handler: IntentHandler):
+        self._rules.append((expression, full, name, handler))
+        self._matcher = None
+
+    def _compile(self):
+        keywords = []
+        self._keyword_rules = []
+        self._patterns = []
+        for index, (expression, full, _, _) in enumerate(self._rules):
+            if full:
+                self._patterns.append((index, re.compile(expression, re.DOTALL)))
+            else:
+                keywords.append(f"({expression})")
+                self._keyword_rules.append(index)
+        # A lookahead tries every keyword at every position, so keywords that
+        # overlap are all seen; (?!) never matches, for a router without any.
+        self._matcher = re.compile("(?=" + ("|".join(keywords) or "(?!)") + ")", re.DOTALL)
@@ -0,0 +1,246 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds, from a fast in-memory turn to a slow upload or broadcast.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Bytes per second, from a stalled transfer to a fast LAN.
+THROUGHPUT_BUCKETS = (16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError()
+
+
+class Counter(_Metric):
+    """ Monotonically increasing count, optionally split by labels. """
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """ A value read when metrics are collected, e.g. a queue depth. """
+
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, *labels: str):
+        self._functions[labels] = lambda: value
+
+    def set_function(self, function: Callable[[], float], *labels: str):
+        self._functions[labels] = function
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, function in self._functions.items():
+            try:
+                value = function()
+            except Exception:  # pylint: disable=broad-except
+                continue
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observations in fixed buckets. An observation costs one
+    binary search and two additions, so it is cheap enough for every turn.
+    """
+
+    TYPE = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels: Sequence[str] = (),
+            buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self._bounds = tuple(sorted(buckets))
+        # Per label set: [count per bucket (plus +Inf)], sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self._bounds) + 1), [0.0])
+        series[0][bisect.bisect_left(self._bounds, value)] += 1
+        series[1][0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self._bounds + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{series_labels} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """ Holds metrics and renders them in the Prometheus text exposition format. """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labels: Sequence[str] = (),
+            buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            samples = metric.samples()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+# Process-wide registry served by /api/metrics, and the bot's hot-path metrics.
+REGISTRY = MetricsRegistry()
+
+TURN_SECONDS = REGISTRY.histogram(
+    "bot_turn_seconds", "Time to handle a personal-chat message, by intent.", ["intent"]
+)
+TURN_ERRORS = REGISTRY.counter("bot_turn_errors_total", "Turns that ended in an unhandled error.")
+ACTIVITIES = REGISTRY.counter(
+    "bot_activities_total", "Activities received on /api/messages, by type and outcome.", ["type", "outcome"]
+)
+TURN_WAIT_SECONDS = REGISTRY.histogram(
+    "bot_turn_wait_seconds", "Time a turn waited for earlier turns of its conversation and a free slot."
+)
+ROSTER_FETCH_SECONDS = REGISTRY.histogram(
+    "bot_roster_fetch_seconds", "Time to page through a team or chat roster."
+)
+ROSTER_MEMBERS = REGISTRY.counter("bot_roster_members_total", "Members returned by roster fetches.")
+TRANSFER_BYTES = REGISTRY.counter(
+    "bot_transfer_bytes_total", "Bytes moved by file transfers, by direction.", ["direction"]
+)
+TRANSFER_SECONDS = REGISTRY.histogram(
+    "bot_transfer_seconds", "Duration of completed file transfers, by direction.", ["direction"]
+)
+TRANSFER_THROUGHPUT = REGISTRY.histogram(
+    "bot_transfer_throughput_bytes_per_second",
+    "Throughput of completed file transfers, by direction.",
+    ["direction"],
+    buckets=THROUGHPUT_BUCKETS,
+)
+TRANSFER_FAILURES = REGISTRY.counter(
+    "bot_transfer_failures_total", "File transfers that failed, by direction.", ["direction"]
+)
+FANOUT_MESSAGES = REGISTRY.counter(
+    "bot_fanout_messages_total", "Fan-out sends, by result.", ["result"]
+)
+FANOUT_THROTTLED = REGISTRY.counter(
+    "bot_fanout_throttled_total", "Fan-out sends that were throttled (HTTP 429) and retried."
+)
+REPLY_SEND_SECONDS = REGISTRY.histogram(
+    "bot_reply_send_seconds", "Time to send one (possibly merged) turn reply to the connector."
+)
+REPLIES_MERGED = REGISTRY.counter(
+    "bot_replies_merged_total", "Turn replies merged into the reply before them instead of sent alone."
+)
+REPLIES_THROTTLED = REGISTRY.counter(
+    "bot_replies_throttled_total", "Turn replies that were throttled (HTTP 429) and retried."
+)
+QUEUE_DEPTH = REGISTRY.gauge("bot_queue_depth", "Items waiting in internal queues.", ["queue"])
+STARTUP_SECONDS = REGISTRY.gauge(
+    "bot_startup_seconds", "Time taken by each startup phase, from when app.py began importing.", ["phase"]
+)
+
+
+def observe_transfer(direction: str, size: int, seconds: float):
+    TRANSFER_BYTES.inc(direction, amount=size)
+    TRANSFER_SECONDS.observe(seconds, direction)
+    if seconds > 0:
+        TRANSFER_THROUGHPUT.observe(size / seconds, direction)
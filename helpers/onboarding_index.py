@@ -0,0 +1,151 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .sqlite_backend import connect
+
+
+class OnboardingIndex:
+    """
+    Per-tenant set of the members (by AAD object id) who have been onboarded.
+
+    Onboarding a member is claimed first, so concurrent jobs for overlapping
+    rosters never message the same member twice. A claim that is neither
+    completed nor released within `claim_timeout` seconds (its worker died) can
+    be claimed again.
+    """
+
+    def __init__(self, claim_timeout: float = 600):
+        self._claim_timeout = claim_timeout
+        self._onboarded: Dict[str, Set[str]] = {}
+        self._claims: Dict[Tuple[str, str], float] = {}
+
+    def claim(self, tenant_id: str, member_ids: Iterable[str]) -> List[str]:
+        """ Claim the members that are neither onboarded nor being onboarded, and return them. """
+        onboarded = self._onboarded.get(tenant_id, set())
+        now = time.time()
+        claimed = []
+        for member_id in dict.fromkeys(member_ids):
+            if member_id in onboarded:
+                continue
+            claimed_at = self._claims.get((tenant_id, member_id))
+            if claimed_at is not None and now - claimed_at < self._claim_timeout:
+                continue
+            self._claims[(tenant_id, member_id)] = now
+            claimed.append(member_id)
+        return claimed
+
+    def complete(self, tenant_id: str, member_ids: Iterable[str]):
+        """ Record claimed members as onboarded. """
+        onboarded = self._onboarded.setdefault(tenant_id, set())
+        for member_id in member_ids:
+            self._claims.pop((tenant_id, member_id), None)
+            onboarded.add(member_id)
+
+    def release(self, tenant_id: str, member_ids: Iterable[str]):
+        """ Give up claims whose onboarding failed, so a later job retries them. """
+        for member_id in member_ids:
+            self._claims.pop((tenant_id, member_id), None)
+
+    def count(self, tenant_id: str) -> int:
+        return len(self._onboarded.get(tenant_id, ()))
+
+    def close(self):
+        pass
+
+
+class SqliteOnboardingIndex(OnboardingIndex):
+    """
+    Onboarding index persisted in SQLite, so it survives restarts and is shared
+    by worker processes.
+
+    One row per member, clustered by tenant. A roster that is already fully
+    onboarded is diffed with a few indexed reads (CHUNK_SIZE ids each) and no
+    writes; only new members are claimed, each with a conditional upsert.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS onboarded_members (
+            tenant_id TEXT NOT NULL,
+            member_id TEXT NOT NULL,
+            onboarded INTEGER NOT NULL,
+            claimed_at REAL NOT NULL,
+            PRIMARY KEY (tenant_id, member_id)
+        ) WITHOUT ROWID;
+    """
+
+    # Member ids per query, under SQLite's default limit of bound parameters.
+    CHUNK_SIZE = 500
+
+    def __init__(self, path: str, claim_timeout: float = 600):
+        super().__init__(claim_timeout=claim_timeout)
+        self._path = path
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = connect(self._path, self.SCHEMA)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def claim(self, tenant_id: str, member_ids: Iterable[str]) -> List[str]:
+        member_ids = list(dict.fromkeys(member_ids))
+        now = time.time()
+        candidates = []
+        for start in range(0, len(member_ids), self.CHUNK_SIZE):
+            chunk = member_ids[start:start + self.CHUNK_SIZE]
+            taken = {
+                member_id
+                for (member_id,) in self.connection.execute(
+                    "SELECT member_id FROM onboarded_members WHERE tenant_id = ? "
+                    f"AND member_id IN ({','.join('?' * len(chunk))}) "
+                    "AND (onboarded = 1 OR claimed_at >= ?)",
+                    (tenant_id, *chunk, now - self._claim_timeout),
+                )
+            }
+            candidates.extend(member_id for member_id in chunk if member_id not in taken)
+        if not candidates:
+            return []
+
+        claimed = []
+        with self.connection:
+            # INSERT OR IGNORE then UPDATE rather than an upsert, which needs SQLite 3.24.
+            for member_id in candidates:
+                if self.connection.execute(
+                        "INSERT OR IGNORE INTO onboarded_members (tenant_id, member_id, onboarded, claimed_at) "
+                        "VALUES (?, ?, 0, ?)",
+                        (tenant_id, member_id, now),
+                ).rowcount or self.connection.execute(
+                        "UPDATE onboarded_members SET claimed_at = ? "
+                        "WHERE tenant_id = ? AND member_id = ? AND onboarded = 0 AND claimed_at < ?",
+                        (now, tenant_id, member_id, now - self._claim_timeout),
+                ).rowcount:
+                    claimed.append(member_id)
+        return claimed
+
+    def complete(self, tenant_id: str, member_ids: Iterable[str]):
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE onboarded_members SET onboarded = 1 WHERE tenant_id = ? AND member_id = ?",
+                [(tenant_id, member_id) for member_id in member_ids],
+            )
+
+    def release(self, tenant_id: str, member_ids: Iterable[str]):
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM onboarded_members WHERE tenant_id = ? AND member_id = ? AND onboarded = 0",
+                [(tenant_id, member_id) for member_id in member_ids],
+            )
+
+    def count(self, tenant_id: str) -> int:
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM onboarded_members WHERE tenant_id = ? AND onboarded = 1", (tenant_id,)
+        ).fetchone()[0]
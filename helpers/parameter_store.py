@@ -0,0 +1,298 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import csv
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy
+
+NUMBER = "number"
+TEXT = "text"
+
+
+class ParameterError:
+    """ One problem in an uploaded template, at a 1-based row (the header is row 1) and column. """
+
+    def __init__(self, row: int, column: int, heading: str, message: str):
+        self.row = row
+        self.column = column
+        self.heading = heading
+        self.message = message
+
+    def __str__(self) -> str:
+        if self.heading:
+            return f"Row {self.row}, column {self.column} ({self.heading}): {self.message}"
+        return f"Row {self.row}, column {self.column}: {self.message}"
+
+
+class ParameterParseResult:
+    """ Outcome of parsing a template: the stored columns, or the errors that rejected it. """
+
+    def __init__(
+            self,
+            path: Optional[str],
+            header: List[str],
+            rows: int,
+            errors: List[ParameterError],
+            error_count: int,
+    ):
+        self.path = path
+        self.header = header
+        self.rows = rows
+        self.errors = errors
+        self.error_count = error_count
+
+    @property
+    def valid(self) -> bool:
+        return not self.error_count
+
+
+class ParameterTable:
+    """ Parsed template columns, memory-mapped from the store. """
+
+    def __init__(self, path: str, header: List[str], types: List[str], rows: int):
+        self.path = path
+        self.header = header
+        self.types = types
+        self.rows = rows
+        self._columns: Dict[str, "numpy.ndarray"] = {}
+
+    def column(self, heading: str) -> "numpy.ndarray":
+        """ Float64 values (NaN where empty) for number columns, strings for text columns. """
+        array = self._columns.get(heading)
+        if array is None:
+            import numpy as np  # pylint: disable=import-outside-toplevel
+
+            index = self.header.index(heading)
+            array = np.load(os.path.join(self.path, f"{index}.npy"), mmap_mode="r")
+            self._columns[heading] = array
+        return array
+
+
+def load_parameters(path: str) -> ParameterTable:
+    """ Open parameters stored by `parse_parameters`, without reading the columns yet. """
+    with open(os.path.join(path, ParameterStore.MANIFEST), encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    return ParameterTable(path, manifest["header"], manifest["types"], manifest["rows"])
+
+
+def report_schema(path: str, sample_rows: int = 1000) -> Dict[str, str]:
+    """
+    The columns of the report CSV at `path` with their types: a column is a
+    number column when every non-empty value in the first `sample_rows` rows is
+    numeric, and a text column otherwise.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    with open(path, newline="", encoding="utf-8-sig") as report_file:
+        reader = csv.reader(report_file)
+        header = [heading.strip() for heading in next(reader, [])]
+        width = len(header)
+        rows = [(row + [""] * width)[:width] for row in itertools.islice(reader, sample_rows) if row]
+    table = np.array(rows, dtype=str).reshape(len(rows), width)
+    schema = {}
+    for index, heading in enumerate(header):
+        values = _strings(np).strip(table[:, index])
+        values = values[values != ""]
+        schema[heading] = NUMBER if values.size and _parse_numbers(values)[1].all() else TEXT
+    return schema
+
+
+def parse_parameters(
+        source_path: str,
+        output_path: str,
+        schema: Optional[Dict[str, str]] = None,
+        batch_rows: int = 50000,
+        max_errors: int = 20,
+) -> ParameterParseResult:
+    """
+    Validate the template at `source_path` and, when it has no errors, store it
+    column by column under `output_path` (one .npy file per column, which report
+    runs memory-map).
+
+    Rows are read and checked in batches of `batch_rows`, a column at a time:
+    every row must have one value per heading, and every non-empty value under a
+    heading that `schema` marks as a number must be numeric. Headings must be
+    unique and, with a schema, name report columns. All errors are counted, and
+    the `max_errors` earliest in the file are kept with their positions.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    # The kept errors, as a heap whose top is the latest position, since a batch
+    # reports its errors column by column rather than in file order.
+    kept: List[Tuple[Tuple[int, int], int, ParameterError]] = []
+    error_count = 0
+
+    def add_error(row: int, column: int, heading: str, message: str):
+        nonlocal error_count
+        error_count += 1
+        position = (-row, -column)
+        if len(kept) < max_errors:
+            heapq.heappush(kept, (position, error_count, ParameterError(row, column, heading, message)))
+        elif kept and position > kept[0][0]:
+            heapq.heapreplace(kept, (position, error_count, ParameterError(row, column, heading, message)))
+
+    with open(source_path, newline="", encoding="utf-8-sig") as source:
+        reader = csv.reader(source)
+        header = [heading.strip() for heading in next(reader, [])]
+        width = len(header)
+        seen = set()
+        for index, heading in enumerate(header, start=1):
+            if not heading:
+                add_error(1, index, "", "the heading is empty")
+            elif heading in seen:
+                add_error(1, index, heading, "the heading is repeated")
+            elif schema is not None and heading not in schema:
+                add_error(1, index, heading, f"not a report column (expected one of {', '.join(schema)})")
+            seen.add(heading)
+        types = [(schema or {}).get(heading, TEXT) for heading in header]
+
+        batches: List[List["numpy.ndarray"]] = [[] for _ in header]
+        rows = 0
+        # csv.reader counts physical lines, so positions stay right with quoted newlines.
+        while True:
+            batch = []
+            lines = []
+            for row in itertools.islice(reader, batch_rows):
+                if row:
+                    batch.append(row)
+                    lines.append(reader.line_num)
+            if not batch:
+                break
+            rows += len(batch)
+
+            lengths = np.fromiter((len(row) for row in batch), dtype=np.int64, count=len(batch))
+            for position in np.flatnonzero(lengths != width):
+                add_error(
+                    lines[position], min(int(lengths[position]), width) + 1, "",
+                    f"has {lengths[position]} values for {width} headings",
+                )
+            if error_count:
+                batch = [(row + [""] * width)[:width] for row in batch]
+            table = np.array(batch, dtype=str).reshape(len(batch), width)
+            lines = np.array(lines)
+
+            for index, (heading, column_type) in enumerate(zip(header, types)):
+                values = _strings(np).strip(table[:, index])
+                if column_type == NUMBER:
+                    numbers, numeric = _parse_numbers(np.where(values == "", "nan", values))
+                    for position in np.flatnonzero(~numeric):
+                        add_error(
+                            int(lines[position]), index + 1, heading, f"'{values[position]}' is not a number"
+                        )
+                    if not error_count:
+                        batches[index].append(numbers)
+                elif not error_count:
+                    batches[index].append(values)
+
+    if error_count:
+        errors = sorted((error for _, _, error in kept), key=lambda error: (error.row, error.column))
+        return ParameterParseResult(None, header, rows, errors, error_count)
+
+    root = os.path.dirname(output_path) or "."
+    os.makedirs(root, exist_ok=True)
+    partial_path = tempfile.mkdtemp(dir=root, suffix=".part")
+    try:
+        for index, column_type in enumerate(types):
+            if batches[index]:
+                array = np.concatenate(batches[index])
+            else:
+                array = np.empty(0, dtype=np.float64 if column_type == NUMBER else str)
+            np.save(os.path.join(partial_path, f"{index}.npy"), array)
+        with open(os.path.join(partial_path, ParameterStore.MANIFEST), "w", encoding="utf-8") as manifest_file:
+            json.dump({"header": header, "types": types, "rows": rows}, manifest_file)
+        os.rename(partial_path, output_path)
+    except FileExistsError:
+        # Parsed concurrently (the same content); keep the first copy.
+        shutil.rmtree(partial_path, ignore_errors=True)
+    except OSError as error:
+        shutil.rmtree(partial_path, ignore_errors=True)
+        if not os.path.isdir(output_path):
+            raise error
+    return ParameterParseResult(output_path, header, rows, [], 0)
+
+
+def _strings(np):
+    """ numpy.strings (NumPy 2) runs string ufuncs in C; numpy.char loops in Python. """
+    return getattr(np, "strings", np.char)
+
+
+def _parse_numbers(values: "numpy.ndarray") -> Tuple["numpy.ndarray", "numpy.ndarray"]:
+    """
+    Convert strings to float64 in one pass, falling back to one value at a time
+    only when that fails. Returns the numbers (NaN where not numeric) and which
+    values were numeric.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    try:
+        return values.astype(np.float64), np.ones(values.shape, dtype=bool)
+    except ValueError:
+        pass
+    numbers = np.full(values.shape, np.nan)
+    numeric = np.zeros(values.shape, dtype=bool)
+    for position, value in enumerate(values.tolist()):
+        try:
+            numbers[position] = float(value)
+            numeric[position] = True
+        except ValueError:
+            pass
+    return numbers, numeric
+
+
+class ParameterStore:
+    """
+    Parsed parameter templates, stored in columnar form by content hash.
+
+    An uploaded template is validated against the columns of the report it
+    parameterises and, when valid, stored as one .npy file per column, so report
+    runs memory-map the values instead of re-parsing CSV. Templates with the
+    same content share one stored copy. Report column types are inferred once
+    per report content.
+    """
+
+    MANIFEST = "columns.json"
+
+    def __init__(self, directory: str, batch_rows: int = 50000, max_errors: int = 20):
+        self._directory = directory
+        self._batch_rows = batch_rows
+        self._max_errors = max_errors
+        self._schemas: Dict[str, Dict[str, str]] = {}
+
+    def path_for(self, sha256: str, schema: Optional[Dict[str, str]] = None) -> str:
+        """ Where the template with content hash `sha256`, parsed against `schema`, is stored. """
+        digest = hashlib.sha256(sha256.encode("utf-8"))
+        digest.update(json.dumps(schema, sort_keys=True).encode("utf-8"))
+        return os.path.join(self._directory, digest.hexdigest())
+
+    async def parse(
+            self, source_path: str, sha256: str, report_path: Optional[str] = None, report_key: Optional[str] = None
+    ) -> ParameterParseResult:
+        """
+        Validate the template at `source_path` (content hash `sha256`) against the
+        report at `report_path` (content hash `report_key`) and store it.
+        """
+        loop = asyncio.get_event_loop()
+        schema = None
+        if report_path is not None:
+            schema = self._schemas.get(report_key)
+            if schema is None:
+                schema = await loop.run_in_executor(None, report_schema, report_path)
+                self._schemas[report_key] = schema
+        output_path = self.path_for(sha256, schema)
+        if os.path.isdir(output_path):
+            # This content was stored before, so it passed the same checks.
+            table = await loop.run_in_executor(None, load_parameters, output_path)
+            return ParameterParseResult(output_path, table.header, table.rows, [], 0)
+        return await loop.run_in_executor(
+            None, parse_parameters, source_path, output_path, schema, self._batch_rows, self._max_errors
+        )
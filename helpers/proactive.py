@@ -0,0 +1,35 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+from typing import Any, Awaitable, Callable, List
+
+from botbuilder.core import TurnContext
+
+from .reply_batcher import flush_replies
+
+TurnCallback = Callable[[TurnContext], Awaitable[Any]]
+
+
+async def run_proactive_turn(start: Callable[[TurnCallback], Awaitable[Any]], callback: TurnCallback):
+    """
+    Run `callback` in a turn started by `start` (a bound continue_conversation or
+    create_conversation call), and raise what it raised once the turn is over.
+
+    The adapter hands errors inside a turn to its on_turn_error handler, which
+    logs them and messages the user. For proactive sends that hides a failed or
+    throttled send from the caller that should retry or count it, so the
+    callback's error is kept out of the pipeline and re-raised here instead.
+    Buffered replies are flushed inside the callback, so send errors count too.
+    """
+    errors: List[Exception] = []
+
+    async def run(turn_context: TurnContext):
+        try:
+            await callback(turn_context)
+            await flush_replies(turn_context)
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(error)
+
+    await start(run)
+    if errors:
+        raise errors[0]
@@ -0,0 +1,340 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from botbuilder.schema import ChannelAccount, ConversationAccount, ConversationReference
+
+from .sqlite_backend import connect
+
+logger = logging.getLogger(__name__)
+
+
+def _reference_fields(reference: ConversationReference) -> tuple:
+    user = reference.user or ChannelAccount()
+    bot = reference.bot or ChannelAccount()
+    conversation = reference.conversation or ConversationAccount()
+    return (
+        reference.channel_id,
+        reference.service_url,
+        conversation.id,
+        conversation.conversation_type,
+        conversation.tenant_id,
+        user.id,
+        user.name,
+        getattr(user, "aad_object_id", None),
+        bot.id,
+        bot.name,
+        reference.locale,
+    )
+
+
+def serialize_reference(reference: ConversationReference) -> str:
+    """
+    Compact form of a conversation reference, keeping only the fields
+    continue_conversation and the proactive card need.
+    """
+    return json.dumps(_reference_fields(reference), separators=(",", ":"))
+
+
+def reference_fingerprint(reference: ConversationReference) -> int:
+    """ Cheap change-detection key over the same fields that get persisted. """
+    return hash(_reference_fields(reference))
+
+
+def deserialize_reference(data: str) -> ConversationReference:
+    (
+        channel_id,
+        service_url,
+        conversation_id,
+        conversation_type,
+        tenant_id,
+        user_id,
+        user_name,
+        user_aad_object_id,
+        bot_id,
+        bot_name,
+        locale,
+    ) = json.loads(data)
+    return ConversationReference(
+        channel_id=channel_id,
+        service_url=service_url,
+        conversation=ConversationAccount(
+            id=conversation_id,
+            conversation_type=conversation_type,
+            tenant_id=tenant_id,
+        ),
+        user=ChannelAccount(id=user_id, name=user_name, aad_object_id=user_aad_object_id),
+        bot=ChannelAccount(id=bot_id, name=bot_name),
+        locale=locale,
+    )
+
+
+class ConversationReferenceStore(MutableMapping):
+    """
+    Conversation references keyed by user id. Behaves like the dict the bot used
+    to share with app.py, so lookups, `in` and `values()` work unchanged.
+    """
+
+    def update_many(self, items: Iterable[Tuple[str, ConversationReference]]):
+        for user_id, reference in items:
+            self[user_id] = reference
+
+    def close(self):
+        pass
+
+
+class MemoryReferenceStore(ConversationReferenceStore):
+    """ In-process store holding the compact serialized form of each reference. """
+
+    def __init__(self):
+        self._references: Dict[str, str] = {}
+
+    def __getitem__(self, user_id: str) -> ConversationReference:
+        return deserialize_reference(self._references[user_id])
+
+    def __setitem__(self, user_id: str, reference: ConversationReference):
+        self._references[user_id] = serialize_reference(reference)
+
+    def __delitem__(self, user_id: str):
+        del self._references[user_id]
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._references
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._references))
+
+    def __len__(self) -> int:
+        return len(self._references)
+
+
+class SqliteReferenceStore(ConversationReferenceStore):
+    """
+    SQLite-backed store that survives restarts and can be shared by several
+    worker processes. The database is opened on first use, and only recently
+    used references are kept deserialized in an in-memory LRU. When other
+    processes write to the same database, `cache_ttl` bounds how long a cached
+    reference is used before it is read again.
+    """
+
+    def __init__(self, path: str, cache_size: int = 10000, cache_ttl: Optional[float] = None):
+        self._path = path
+        self._cache_size = cache_size
+        self._cache_ttl = cache_ttl
+        self._cache: Dict[str, Tuple[ConversationReference, float]] = OrderedDict()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = connect(
+                self._path,
+                "CREATE TABLE IF NOT EXISTS conversation_references "
+                "(user_id TEXT PRIMARY KEY, data TEXT NOT NULL);",
+            )
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __getitem__(self, user_id: str) -> ConversationReference:
+        reference = self._cached(user_id)
+        if reference is not None:
+            return reference
+
+        row = self.connection.execute(
+            "SELECT data FROM conversation_references WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(user_id)
+        reference = deserialize_reference(row[0])
+        self._remember(user_id, reference)
+        return reference
+
+    def __setitem__(self, user_id: str, reference: ConversationReference):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO conversation_references (user_id, data) VALUES (?, ?)",
+                (user_id, serialize_reference(reference)),
+            )
+        self._remember(user_id, reference)
+
+    def update_many(self, items: Iterable[Tuple[str, ConversationReference]]):
+        items = list(items)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO conversation_references (user_id, data) VALUES (?, ?)",
+                [(user_id, serialize_reference(reference)) for user_id, reference in items],
+            )
+        for user_id, reference in items:
+            self._remember(user_id, reference)
+
+    def __delitem__(self, user_id: str):
+        with self.connection:
+            deleted = self.connection.execute(
+                "DELETE FROM conversation_references WHERE user_id = ?", (user_id,)
+            ).rowcount
+        self._cache.pop(user_id, None)
+        if not deleted:
+            raise KeyError(user_id)
+
+    def __contains__(self, user_id) -> bool:
+        if self._cached(user_id) is not None:
+            return True
+        return self.connection.execute(
+            "SELECT 1 FROM conversation_references WHERE user_id = ?", (user_id,)
+        ).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for (user_id,) in self.connection.execute("SELECT user_id FROM conversation_references"):
+            yield user_id
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM conversation_references").fetchone()[0]
+
+    def values(self):
+        """ Stream every reference without pulling them all into the LRU. """
+        cursor = self.connection.execute("SELECT data FROM conversation_references")
+        while True:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                return
+            for (data,) in rows:
+                yield deserialize_reference(data)
+
+    def _cached(self, user_id: str) -> Optional[ConversationReference]:
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        reference, cached_at = entry
+        if self._cache_ttl is not None and time.monotonic() - cached_at > self._cache_ttl:
+            # Another process may have changed or deleted it since.
+            del self._cache[user_id]
+            return None
+        self._cache.move_to_end(user_id)
+        return reference
+
+    def _remember(self, user_id: str, reference: ConversationReference):
+        self._cache[user_id] = (reference, time.monotonic())
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+
+class CoalescingReferenceStore(ConversationReferenceStore):
+    """
+    Write-coalescing front for another store.
+
+    Each update is compared with a fingerprint of the last known reference for
+    that user and dropped when nothing changed, so steady chat traffic costs no
+    writes. Real changes are buffered and written to the backing store in one
+    batch, either when `max_batch` are pending or when the periodic flusher runs.
+    Fingerprints are kept for the `cache_size` most recently updated users; a
+    user that falls out is compared with the backing store on the next update.
+    """
+
+    def __init__(self, store: ConversationReferenceStore, max_batch: int = 500, cache_size: int = 10000):
+        self._store = store
+        self._max_batch = max_batch
+        self._cache_size = cache_size
+        self._fingerprints: Dict[str, int] = OrderedDict()
+        self._pending: Dict[str, ConversationReference] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def __getitem__(self, user_id: str) -> ConversationReference:
+        reference = self._pending.get(user_id)
+        if reference is not None:
+            return reference
+        return self._store[user_id]
+
+    def __setitem__(self, user_id: str, reference: ConversationReference):
+        fingerprint = reference_fingerprint(reference)
+        known = self._fingerprints.get(user_id)
+        if known is None and user_id in self._store:
+            known = reference_fingerprint(self._store[user_id])
+        self._fingerprints[user_id] = fingerprint
+        self._fingerprints.move_to_end(user_id)
+        while len(self._fingerprints) > self._cache_size:
+            self._fingerprints.popitem(last=False)
+        if known == fingerprint:
+            return
+
+        self._pending[user_id] = reference
+        if len(self._pending) >= self._max_batch:
+            self.flush()
+
+    def __delitem__(self, user_id: str):
+        self._fingerprints.pop(user_id, None)
+        pending = self._pending.pop(user_id, None)
+        try:
+            del self._store[user_id]
+        except KeyError:
+            if pending is None:
+                raise
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._pending or user_id in self._store
+
+    def __iter__(self) -> Iterator[str]:
+        self.flush()
+        return iter(self._store)
+
+    def __len__(self) -> int:
+        self.flush()
+        return len(self._store)
+
+    def values(self):
+        self.flush()
+        return self._store.values()
+
+    def update_many(self, items: Iterable[Tuple[str, ConversationReference]]):
+        for user_id, reference in items:
+            self[user_id] = reference
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            self._store.update_many(pending.items())
+        except Exception:
+            # Keep the batch for the next flush, behind anything newer for the same users.
+            pending.update(self._pending)
+            self._pending = pending
+            raise
+
+    async def run_flusher(self, interval: float):
+        """ Flush pending changes every `interval` seconds until cancelled. """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.flush()
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("Failed to flush conversation references, error %r", error)
+
+    def close(self):
+        self.flush()
+        self._store.close()
+
+
+def create_reference_store(
+        kind: str, path: str = None, cache_size: int = 10000, cache_ttl: Optional[float] = None
+) -> ConversationReferenceStore:
+    if kind == "sqlite":
+        return SqliteReferenceStore(path, cache_size=cache_size, cache_ttl=cache_ttl)
+    if kind == "memory":
+        return MemoryReferenceStore()
+    raise ValueError(f"Unknown conversation reference store '{kind}'")
@@ -0,0 +1,150 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import logging
+import time
+from copy import copy
+from functools import partial
+from typing import Awaitable, Callable, List
+
+from botbuilder.core import Middleware, TurnContext
+from botbuilder.schema import Activity, ActivityTypes, DeliveryModes, ResourceResponse
+
+from . import metrics
+from .fan_out import FanOutScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class ReplyBatchingMiddleware(Middleware):
+    """
+    Collects the replies a turn sends and sends them in order with one
+    `send_activities` call when the turn ends, so that the connector session is
+    used once per turn rather than once per `send_activity`.
+
+    Runs of plain-text messages (no attachments or other content) are joined
+    into one message; anything else is kept as it was sent, so replies arrive
+    in the order the turn made them. Invoke responses, trace and delay
+    activities are never held back: buffered replies are sent first and the
+    activity passes straight through. Code that needs a reply delivered before
+    the turn ends (upload progress) calls `flush_replies`.
+
+    Buffered sends return no ResourceResponse. Sends that the connector
+    throttles (HTTP 429) are retried after its Retry-After, and the pause applies
+    to every turn in the process, so a throttled bot backs off as a whole. The
+    connector posts a batch one activity at a time, so a batch throttled part
+    way through is sent again from its first reply.
+    """
+
+    BATCH_KEY = "ReplyBatchingMiddleware.batch"
+    PASS_THROUGH_TYPES = (ActivityTypes.invoke_response, ActivityTypes.trace, "delay")
+
+    def __init__(self, max_retries: int = 3):
+        self._max_retries = max_retries
+        self._paused_until = 0.0
+
+    async def on_turn(self, context: TurnContext, logic: Callable[[], Awaitable]):
+        if context.activity.delivery_mode == DeliveryModes.expect_replies:
+            # The adapter already collects these replies into the response body.
+            await logic()
+            return
+        batch = _ReplyBatch(self, context)
+        context.turn_state[self.BATCH_KEY] = batch
+        # Sends made during the turn go to the batch instead of the adapter.
+        context.send_activities = batch.send_activities
+        try:
+            await logic()
+        except Exception:
+            try:
+                await batch.close()
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("Failed to send replies of a failed turn, error %r", error)
+            raise
+        await batch.close()
+
+    async def send(self, activities: List[Activity], send: Callable[[List[Activity]], Awaitable]):
+        """ Send `activities` with one call to `send`, waiting out and retrying throttling. """
+        attempt = 0
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            started = time.perf_counter()
+            try:
+                responses = await send(activities)
+            except Exception as error:  # pylint: disable=broad-except
+                retry_after = FanOutScheduler.throttle_delay(error)
+                if retry_after is None or attempt >= self._max_retries:
+                    raise
+                metrics.REPLIES_THROTTLED.inc()
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                attempt += 1
+                continue
+            metrics.REPLY_SEND_SECONDS.observe(time.perf_counter() - started)
+            return responses
+
+
+async def flush_replies(turn_context: TurnContext):
+    """ Send the replies the turn has buffered so far, if reply batching is on. """
+    batch = turn_context.turn_state.get(ReplyBatchingMiddleware.BATCH_KEY)
+    if batch is not None:
+        await batch.flush()
+
+
+class _ReplyBatch:
+    """ The replies one turn has sent but not yet delivered. """
+
+    def __init__(self, middleware: ReplyBatchingMiddleware, context: TurnContext):
+        self._middleware = middleware
+        self._context = context
+        self._pending: List[Activity] = []
+        self._lock = asyncio.Lock()
+
+    async def send_activities(self, activities: List[Activity]) -> List[ResourceResponse]:
+        """ Stands in for the turn's `TurnContext.send_activities` until the batch is closed. """
+        if any(activity.type in ReplyBatchingMiddleware.PASS_THROUGH_TYPES for activity in activities):
+            async with self._lock:
+                await self._send()
+                return await TurnContext.send_activities(self._context, activities)
+        for activity in activities:
+            if self._pending and _join_text(self._pending[-1], activity):
+                metrics.REPLIES_MERGED.inc()
+            else:
+                self._pending.append(copy(activity))
+        return []
+
+    async def flush(self):
+        async with self._lock:
+            await self._send()
+
+    async def close(self):
+        """ Send what is buffered and let later sends go straight to the adapter. """
+        try:
+            await self.flush()
+        finally:
+            self._context.__dict__.pop("send_activities", None)
+
+    async def _send(self):
+        if not self._pending:
+            return
+        activities, self._pending = self._pending, []
+        await self._middleware.send(activities, partial(TurnContext.send_activities, self._context))
+
+
+# Fields that must be unset on both messages for their texts to be joined.
+_CONTENT_FIELDS = ("attachments", "suggested_actions", "speak", "value", "channel_data", "entities", "summary")
+
+
+def _join_text(previous: Activity, activity: Activity) -> bool:
+    """ Append the text of `activity` to `previous` if both are plain-text messages; True if it was. """
+    for message in (previous, activity):
+        if message.type not in (None, ActivityTypes.message) or not message.text:
+            return False
+        if any(getattr(message, field, None) for field in _CONTENT_FIELDS):
+            return False
+    if previous.text_format != activity.text_format or previous.reply_to_id != activity.reply_to_id:
+        return False
+    separator = "<br>" if previous.text_format == "xml" else "\n\n"
+    previous.text = f"{previous.text}{separator}{activity.text}"
+    return True
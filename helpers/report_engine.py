@@ -0,0 +1,258 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import csv
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .report_registry import ReportRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def generate_report(
+        base_path: str, parameters_path: Optional[str], threshold: Optional[float], output_path: str
+) -> int:
+    """
+    Build a report from the base CSV: keep the columns named in the parameter
+    template's header (all columns without a template) and the rows whose numeric
+    values in those columns are all at least `threshold`. `parameters_path` is a
+    template stored by ParameterStore, or a template CSV. Runs in a worker
+    process, so numpy is only imported there.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    from .parameter_store import load_parameters  # pylint: disable=import-outside-toplevel
+
+    with open(base_path, newline="", encoding="utf-8-sig") as base_file:
+        rows = list(csv.reader(base_file))
+    header = rows[0] if rows else []
+    width = len(header)
+    table = np.array(
+        [(row + [""] * width)[:width] for row in rows[1:]], dtype=str
+    ).reshape(len(rows) - 1 if rows else 0, width)
+
+    selected = list(range(width))
+    if parameters_path:
+        if os.path.isdir(parameters_path):
+            wanted = set(load_parameters(parameters_path).header)
+        else:
+            with open(parameters_path, newline="", encoding="utf-8-sig") as parameters_file:
+                wanted = {column.strip() for column in next(csv.reader(parameters_file), [])}
+        selected = [index for index, column in enumerate(header) if column.strip() in wanted] or selected
+
+    mask = np.ones(table.shape[0], dtype=bool)
+    if threshold is not None:
+        for index in selected:
+            try:
+                values = table[:, index].astype(np.float64)
+            except ValueError:
+                continue
+            mask &= values >= threshold
+
+    result = table[mask][:, selected]
+    # Named per process: workers sharing the cache may build the same report at once.
+    partial_path = f"{output_path}.{os.getpid()}.part"
+    with open(partial_path, "w", newline="", encoding="utf-8") as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow([header[index] for index in selected])
+        writer.writerows(result.tolist())
+    os.replace(partial_path, output_path)
+    return int(result.shape[0])
+
+
+class ReportArtifact:
+    """ A generated report file in the engine's cache. """
+
+    def __init__(self, key: str, path: str, size: int):
+        self.key = key
+        self.path = path
+        self.size = size
+
+    @property
+    def content_key(self) -> str:
+        # Generation is deterministic, so the key of its inputs identifies the content.
+        return self.key
+
+
+class ReportEngine:
+    """
+    Generates per-user reports in a process pool and caches the results.
+
+    Results are keyed by a hash of the base report content, the parameter
+    template content and the threshold, so identical requests share one file and
+    concurrent requests for the same key share one generation. Because the key
+    names the content, cached files outlive restarts and are shared by every
+    worker using `cache_directory`: `load` indexes what is already there, and a
+    report another worker built is picked up instead of rebuilt. Each worker
+    bounds the bytes it has indexed, evicting the least recently used reports.
+    """
+
+    def __init__(
+            self,
+            reports: ReportRegistry,
+            cache_directory: str,
+            max_cache_bytes: int = 512 * 1024 * 1024,
+            workers: int = None,
+    ):
+        self._reports = reports
+        self._cache_directory = cache_directory
+        self._max_cache_bytes = max_cache_bytes
+        self._workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._artifacts: Dict[str, ReportArtifact] = OrderedDict()
+        self._cache_bytes = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @property
+    def pending(self) -> int:
+        """ Reports being generated. """
+        return len(self._pending)
+
+    @staticmethod
+    def key_for(base_sha256: str, parameters_sha256: Optional[str], threshold: Optional[float]) -> str:
+        digest = hashlib.sha256()
+        for part in (base_sha256, parameters_sha256 or "", "" if threshold is None else repr(float(threshold))):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[ReportArtifact]:
+        artifact = self._artifacts.get(key)
+        if artifact is None:
+            return None
+        if not os.path.exists(artifact.path):
+            # Evicted by another worker sharing the directory.
+            del self._artifacts[key]
+            self._cache_bytes -= artifact.size
+            return None
+        self._artifacts.move_to_end(key)
+        return artifact
+
+    def submit(
+            self,
+            base_name: str,
+            parameters_path: Optional[str] = None,
+            parameters_sha256: Optional[str] = None,
+            threshold: Optional[float] = None,
+    ) -> "asyncio.Future[ReportArtifact]":
+        """
+        Return a future for the report, completed at once when it is cached.
+        Raises KeyError when the base report isn't known.
+        """
+        base = self._reports.get(base_name)
+        if base is None:
+            raise KeyError(base_name)
+
+        key = self.key_for(base.sha256, parameters_sha256, threshold)
+        loop = asyncio.get_event_loop()
+        artifact = self.get(key)
+        if artifact is not None:
+            future = loop.create_future()
+            future.set_result(artifact)
+            return future
+
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._generate(key, base.path, parameters_path, threshold))
+            self._pending[key] = future
+        return future
+
+    async def load(self):
+        """ Index the reports already in the cache directory, oldest first. """
+        try:
+            cached = await asyncio.get_event_loop().run_in_executor(None, self._scan_cache_directory)
+        except OSError as error:
+            logger.warning("Failed to index cached reports in %s, error %r", self._cache_directory, error)
+            return
+        for key, path, size in cached:
+            if key not in self._artifacts:
+                self._remember(ReportArtifact(key, path, size))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def _generate(
+            self, key: str, base_path: str, parameters_path: Optional[str], threshold: Optional[float]
+    ) -> ReportArtifact:
+        loop = asyncio.get_event_loop()
+        output_path = os.path.join(self._cache_directory, f"{key}.csv")
+        try:
+            size = await loop.run_in_executor(None, self._cached_size, output_path)
+            if size is None:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self._workers)
+                await loop.run_in_executor(
+                    self._executor, generate_report, base_path, parameters_path, threshold, output_path
+                )
+                size = os.path.getsize(output_path)
+            artifact = ReportArtifact(key, output_path, size)
+            self._remember(artifact)
+            return artifact
+        finally:
+            del self._pending[key]
+
+    def _cached_size(self, path: str) -> Optional[int]:
+        """ Size of a report already in the cache (built by another worker), or None. """
+        os.makedirs(self._cache_directory, exist_ok=True)
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return None
+
+    def _scan_cache_directory(self) -> List[Tuple[str, str, int]]:
+        """
+        List the cached reports as (key, path, size), least recently written
+        first, removing partial files left by processes that no longer exist.
+        """
+        os.makedirs(self._cache_directory, exist_ok=True)
+        cached = []
+        for entry in os.scandir(self._cache_directory):
+            if entry.is_dir():
+                continue
+            parts = entry.name.split(".")
+            if parts[-1] == "part":
+                if len(parts) != 4 or not parts[2].isdigit() or not self._process_exists(int(parts[2])):
+                    self._remove(entry.path)
+            elif len(parts) == 2 and parts[1] == "csv":
+                stat = entry.stat()
+                cached.append((stat.st_mtime, parts[0], entry.path, stat.st_size))
+        cached.sort()
+        return [(key, path, size) for _, key, path, size in cached]
+
+    @staticmethod
+    def _process_exists(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+        return True
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _remember(self, artifact: ReportArtifact):
+        known = self._artifacts.pop(artifact.key, None)
+        if known is not None:
+            self._cache_bytes -= known.size
+        self._artifacts[artifact.key] = artifact
+        self._cache_bytes += artifact.size
+        evicted: List[ReportArtifact] = []
+        while self._cache_bytes > self._max_cache_bytes and len(self._artifacts) > 1:
+            _, oldest = self._artifacts.popitem(last=False)
+            self._cache_bytes -= oldest.size
+            evicted.append(oldest)
+        for oldest in evicted:
+            self._remove(oldest.path)
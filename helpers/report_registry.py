@@ -0,0 +1,106 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ReportInfo:
+    """ Metadata of one report file. """
+
+    def __init__(self, name: str, path: str, size: int, mtime: float, content_type: str, sha256: str):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.content_type = content_type
+        self.sha256 = sha256
+
+    @property
+    def content_key(self) -> str:
+        return self.sha256
+
+
+class ReportRegistry:
+    """
+    In-memory index of the report files in a directory.
+
+    Turns read size, content type and content hash from the index instead of the
+    filesystem. The index is built and kept current only by the background
+    watcher, off the event loop: it re-stats the directory periodically and only
+    rehashes files whose size or mtime changed. Turns wait for its first pass
+    with `wait_indexed`.
+    """
+
+    HASH_BLOCK_SIZE = 1024 * 1024
+    IGNORED_SUFFIXES = (".part",)
+
+    def __init__(self, directory: str = "files"):
+        self._directory = directory
+        self._reports: Dict[str, ReportInfo] = {}
+        self._indexed: Optional[asyncio.Event] = None
+
+    def get(self, name: str) -> Optional[ReportInfo]:
+        return self._reports.get(name)
+
+    def __iter__(self) -> Iterator[ReportInfo]:
+        return iter(list(self._reports.values()))
+
+    async def wait_indexed(self):
+        """ Wait until the watcher has indexed the directory once. """
+        await self._indexed_event().wait()
+
+    def refresh(self):
+        reports: Dict[str, ReportInfo] = {}
+        with os.scandir(self._directory) as entries:
+            for entry in entries:
+                if (
+                        entry.name.startswith(".")
+                        or entry.name.endswith(self.IGNORED_SUFFIXES)
+                        or not entry.is_file()
+                ):
+                    continue
+                stat = entry.stat()
+                known = self._reports.get(entry.name)
+                if known is not None and known.size == stat.st_size and known.mtime == stat.st_mtime:
+                    reports[entry.name] = known
+                    continue
+                reports[entry.name] = ReportInfo(
+                    entry.name,
+                    entry.path,
+                    stat.st_size,
+                    stat.st_mtime,
+                    mimetypes.guess_type(entry.name)[0] or "application/octet-stream",
+                    self._hash_file(entry.path),
+                )
+        self._reports = reports
+
+    async def run_watcher(self, interval: float):
+        """ Re-index the directory every `interval` seconds until cancelled. """
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.refresh)
+            except OSError as error:
+                logger.warning("Failed to index reports in %s, error %r", self._directory, error)
+            self._indexed_event().set()
+            await asyncio.sleep(interval)
+
+    def _indexed_event(self) -> asyncio.Event:
+        # Created on first use, inside the running loop.
+        if self._indexed is None:
+            self._indexed = asyncio.Event()
+        return self._indexed
+
+    def _hash_file(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as report_file:
+            for block in iter(lambda: report_file.read(self.HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
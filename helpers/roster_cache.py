@@ -0,0 +1,258 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import itertools
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional
+
+from botbuilder.schema.teams import TeamsChannelAccount
+
+from .sqlite_backend import connect
+
+
+class _RosterEntry:
+    def __init__(self, members: Iterable[TeamsChannelAccount], fetched_at: float = None, version: int = 0):
+        self.members: Dict[str, TeamsChannelAccount] = OrderedDict(
+            (member.id, member) for member in members
+        )
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.version = version
+
+
+class RosterCache:
+    """
+    Per-team (or per-group-chat) member roster cache.
+
+    Entries expire after `ttl` seconds but are still served while stale so the
+    caller can refresh them in the background. The least recently used roster is
+    evicted once more than `max_rosters` are held. Every change gives the roster
+    a new `version`, so callers can tell whether it changed since they last
+    looked.
+    """
+
+    def __init__(self, ttl: float = 3600, max_rosters: int = 1000):
+        self._ttl = ttl
+        self._max_rosters = max_rosters
+        self._rosters: Dict[str, _RosterEntry] = OrderedDict()
+        self._versions = itertools.count(1)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rosters
+
+    def __len__(self) -> int:
+        return len(self._rosters)
+
+    def get(self, key: str) -> Optional[List[TeamsChannelAccount]]:
+        entry = self._rosters.get(key)
+        if entry is None:
+            return None
+        self._rosters.move_to_end(key)
+        return list(entry.members.values())
+
+    def is_stale(self, key: str) -> bool:
+        entry = self._rosters.get(key)
+        return entry is None or time.time() - entry.fetched_at > self._ttl
+
+    def version(self, key: str) -> Optional[Hashable]:
+        """ A value that changes whenever the roster does, or None if it isn't cached. """
+        entry = self._rosters.get(key)
+        return None if entry is None else entry.version
+
+    def set(self, key: str, members: Iterable[TeamsChannelAccount]):
+        self._rosters[key] = _RosterEntry(members, version=next(self._versions))
+        self._rosters.move_to_end(key)
+        while len(self._rosters) > self._max_rosters:
+            self._rosters.popitem(last=False)
+
+    def add_members(self, key: str, members: Iterable[TeamsChannelAccount]):
+        """ Apply a members-added event. Unknown rosters are left for a full sync. """
+        entry = self._rosters.get(key)
+        if entry is not None:
+            for member in members:
+                entry.members[member.id] = member
+            self._changed(entry)
+
+    def remove_members(self, key: str, member_ids: Iterable[str]):
+        entry = self._rosters.get(key)
+        if entry is not None:
+            for member_id in member_ids:
+                entry.members.pop(member_id, None)
+            self._changed(entry)
+
+    def invalidate(self, key: str):
+        self._rosters.pop(key, None)
+
+    def _changed(self, entry: _RosterEntry):
+        entry.version = next(self._versions)
+
+
+class SqliteRosterCache(RosterCache):
+    """
+    Roster cache shared by several worker processes through SQLite.
+
+    Every roster carries a version that is bumped on each change. A worker keeps
+    its own deserialized copy and reloads it only when the shared version moves,
+    so a cache hit costs one indexed lookup rather than a members API call.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rosters (
+            roster_key TEXT PRIMARY KEY,
+            fetched_at REAL NOT NULL,
+            version INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS roster_members (
+            roster_key TEXT NOT NULL,
+            member_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (roster_key, member_id)
+        );
+    """
+
+    def __init__(self, path: str, ttl: float = 3600, max_rosters: int = 1000):
+        super().__init__(ttl=ttl, max_rosters=max_rosters)
+        self._path = path
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = connect(self._path, self.SCHEMA)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __contains__(self, key: str) -> bool:
+        return self._shared_state(key) is not None
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM rosters").fetchone()[0]
+
+    def get(self, key: str) -> Optional[List[TeamsChannelAccount]]:
+        if not self._sync(key):
+            return None
+        return super().get(key)
+
+    def is_stale(self, key: str) -> bool:
+        if not self._sync(key):
+            return True
+        return super().is_stale(key)
+
+    def version(self, key: str) -> Optional[Hashable]:
+        # Versions restart when a roster is dropped and fetched again; fetched_at tells those apart.
+        state = self._shared_state(key)
+        return None if state is None else tuple(state)
+
+    def set(self, key: str, members: Iterable[TeamsChannelAccount]):
+        members = list(members)
+        fetched_at = time.time()
+        with self.connection:
+            self.connection.execute("DELETE FROM roster_members WHERE roster_key = ?", (key,))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO roster_members (roster_key, member_id, data) VALUES (?, ?, ?)",
+                [(key, member.id, json.dumps(member.serialize())) for member in members],
+            )
+            version = self._bump(key, fetched_at)
+            self.connection.execute(
+                "DELETE FROM roster_members WHERE roster_key IN "
+                "(SELECT roster_key FROM rosters ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                (self._max_rosters,),
+            )
+            self.connection.execute(
+                "DELETE FROM rosters WHERE roster_key IN "
+                "(SELECT roster_key FROM rosters ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                (self._max_rosters,),
+            )
+        super().set(key, members)
+        self._rosters[key].fetched_at = fetched_at
+        self._rosters[key].version = version
+
+    def add_members(self, key: str, members: Iterable[TeamsChannelAccount]):
+        members = list(members)
+        self._apply(
+            key,
+            "INSERT OR REPLACE INTO roster_members (roster_key, member_id, data) VALUES (?, ?, ?)",
+            [(key, member.id, json.dumps(member.serialize())) for member in members],
+        )
+        super().add_members(key, members)
+
+    def remove_members(self, key: str, member_ids: Iterable[str]):
+        member_ids = list(member_ids)
+        self._apply(
+            key,
+            "DELETE FROM roster_members WHERE roster_key = ? AND member_id = ?",
+            [(key, member_id) for member_id in member_ids],
+        )
+        super().remove_members(key, member_ids)
+
+    def invalidate(self, key: str):
+        with self.connection:
+            self.connection.execute("DELETE FROM roster_members WHERE roster_key = ?", (key,))
+            self.connection.execute("DELETE FROM rosters WHERE roster_key = ?", (key,))
+        super().invalidate(key)
+
+    def _changed(self, entry: _RosterEntry):
+        # Versions come from the shared table; _apply sets them.
+        pass
+
+    def _apply(self, key: str, statement: str, rows: list):
+        """ Apply an incremental change to a known roster and keep the local copy in step. """
+        in_sync = self._sync(key)
+        with self.connection:
+            state = self._shared_state(key)
+            if state is None:
+                return
+            self.connection.executemany(statement, rows)
+            version = self._bump(key, state[0])
+        if in_sync and key in self._rosters:
+            self._rosters[key].version = version
+        else:
+            super().invalidate(key)
+
+    def _bump(self, key: str, fetched_at: float) -> int:
+        # INSERT OR IGNORE then UPDATE rather than an upsert, which needs SQLite 3.24.
+        self.connection.execute(
+            "INSERT OR IGNORE INTO rosters (roster_key, fetched_at, version) VALUES (?, ?, 0)",
+            (key, fetched_at),
+        )
+        self.connection.execute(
+            "UPDATE rosters SET fetched_at = ?, version = version + 1 WHERE roster_key = ?",
+            (fetched_at, key),
+        )
+        return self.connection.execute(
+            "SELECT version FROM rosters WHERE roster_key = ?", (key,)
+        ).fetchone()[0]
+
+    def _shared_state(self, key: str):
+        return self.connection.execute(
+            "SELECT fetched_at, version FROM rosters WHERE roster_key = ?", (key,)
+        ).fetchone()
+
+    def _sync(self, key: str) -> bool:
+        """ Bring the local copy of a roster up to the shared version. False if unknown. """
+        state = self._shared_state(key)
+        if state is None:
+            super().invalidate(key)
+            return False
+
+        fetched_at, version = state
+        entry = self._rosters.get(key)
+        if entry is not None and entry.version == version:
+            return True
+
+        members = [
+            TeamsChannelAccount().deserialize(json.loads(data))
+            for (data,) in self.connection.execute(
+                "SELECT data FROM roster_members WHERE roster_key = ?", (key,)
+            )
+        ]
+        super().set(key, members)
+        self._rosters[key].fetched_at = fetched_at
+        self._rosters[key].version = version
+        return True
@@ -0,0 +1,24 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import os
+import sqlite3
+
+# Seconds a statement waits for another process's write lock. Callers run on the
+# event loop and every write is a short transaction, so a stuck lock fails the
+# call quickly instead of stalling every turn in the process.
+BUSY_TIMEOUT = 1.0
+
+
+def connect(path: str, schema: str) -> sqlite3.Connection:
+    """
+    Open a SQLite database that several worker processes can share, creating
+    its directory and applying `schema` (idempotent DDL) on first use.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(schema)
+    return connection
@@ -0,0 +1,83 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+
+class UserSettingsStore:
+    """
+    Per-user report settings (threshold, parameter template) with a read-through
+    in-memory cache over one JSON file per user.
+
+    Every user gets a private directory named after a hash of their user id, so
+    files from different users never share a path. Settings files are replaced
+    atomically, so a crash never leaves a half-written file behind. With `shared`
+    set, several worker processes may use the same directory: cached settings
+    are checked against the file's modification time before being served.
+    """
+
+    SETTINGS_FILE = "settings.json"
+    UPLOADS_DIRECTORY = "uploads"
+
+    def __init__(self, directory: str, shared: bool = False):
+        self._directory = directory
+        self._shared = shared
+        self._cache: Dict[str, Tuple[Optional[int], Dict[str, Any]]] = {}
+
+    def user_directory(self, user_id: str) -> str:
+        name = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self._directory, name)
+
+    def uploads_directory(self, user_id: str) -> str:
+        """ Where the user's uploaded files go; created on demand. """
+        path = os.path.join(self.user_directory(user_id), self.UPLOADS_DIRECTORY)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def get(self, user_id: str) -> Dict[str, Any]:
+        """ The user's settings. The returned dict is shared; use `update` to change it. """
+        cached = self._cache.get(user_id)
+        if cached is not None and (not self._shared or cached[0] == self._modified(user_id)):
+            return cached[1]
+        settings = self._load(user_id)
+        self._cache[user_id] = settings
+        return settings[1]
+
+    def update(self, user_id: str, **values) -> Dict[str, Any]:
+        settings = dict(self.get(user_id))
+        settings.update(values)
+        self._save(user_id, settings)
+        self._cache[user_id] = (self._modified(user_id), settings)
+        return settings
+
+    def _settings_path(self, user_id: str) -> str:
+        return os.path.join(self.user_directory(user_id), self.SETTINGS_FILE)
+
+    def _modified(self, user_id: str) -> Optional[int]:
+        try:
+            return os.stat(self._settings_path(user_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self, user_id: str) -> Tuple[Optional[int], Dict[str, Any]]:
+        try:
+            with open(self._settings_path(user_id), encoding="utf-8") as settings_file:
+                return os.fstat(settings_file.fileno()).st_mtime_ns, json.load(settings_file)
+        except FileNotFoundError:
+            return None, {}
+
+    def _save(self, user_id: str, settings: Dict[str, Any]):
+        directory = self.user_directory(user_id)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, partial_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as settings_file:
+                json.dump(settings, settings_file)
+            os.replace(partial_path, self._settings_path(user_id))
+        except BaseException:
+            os.remove(partial_path)
+            raise
@@ -0,0 +1,113 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import socket
+
+import pytest
+from botbuilder.core import BotFrameworkAdapterSettings
+from botbuilder.schema import ChannelAccount, ConversationAccount, ConversationReference
+from botframework.connector.auth import MicrosoftAppCredentials
+
+from benchmarks.fake_connector import FakeConnector
+from bots import TeamsFileUploadBot
+from helpers import (
+    FanOutScheduler,
+    MemoryReferenceStore,
+    PooledBotFrameworkAdapter,
+    ReportRegistry,
+    UserSettingsStore,
+)
+
+BOT_ID = "28:bot"
+
+
+class OfflineAppCredentials(MicrosoftAppCredentials):
+    """ App credentials with a fixed token, so proactive turns don't call AAD. """
+
+    def get_access_token(self, force_refresh: bool = False) -> str:
+        return "token"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class RunningConnector:
+    """ Serves a FakeConnector on a free port for the length of an `async with` block. """
+
+    def __init__(self, connector: FakeConnector):
+        self.connector = connector
+
+    async def __aenter__(self) -> FakeConnector:
+        await self.connector.start(port=free_port())
+        return self.connector
+
+    async def __aexit__(self, *exc_info):
+        await self.connector.stop()
+
+
+class ConnectorBot:
+    """
+    A FakeConnector with an adapter and bot that talk to it. Used as an async
+    context manager inside the test's event loop; errors that reach the
+    adapter's on_turn_error are collected in `turn_errors`.
+    """
+
+    def __init__(self, directory: str, connector: FakeConnector, max_retries: int = 0):
+        self.connector = connector
+        self.turn_errors = []
+        self.adapter = PooledBotFrameworkAdapter(
+            BotFrameworkAdapterSettings(BOT_ID, "", app_credentials=OfflineAppCredentials(BOT_ID, ""))
+        )
+        self.adapter.on_turn_error = self._on_error
+        self.bot = TeamsFileUploadBot(
+            BOT_ID,
+            "",
+            MemoryReferenceStore(),
+            fan_out=FanOutScheduler(rate=1000, burst=1000, max_retries=max_retries),
+            reports=ReportRegistry(directory),
+            settings=UserSettingsStore(directory),
+        )
+
+    def reference(self, conversation_id: str, conversation_type: str = "personal") -> ConversationReference:
+        return ConversationReference(
+            channel_id="msteams",
+            service_url=self.connector.base_url,
+            bot=ChannelAccount(id=BOT_ID, name="File Bot"),
+            user=ChannelAccount(id="29:user", name="User"),
+            conversation=ConversationAccount(
+                id=conversation_id, conversation_type=conversation_type, tenant_id="tenant"
+            ),
+        )
+
+    async def continue_conversation(self, reference: ConversationReference, callback):
+        await self.adapter.continue_conversation(reference, callback, BOT_ID)
+
+    async def __aenter__(self) -> "ConnectorBot":
+        await self.connector.start(port=free_port())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.adapter.close()
+        await self.connector.stop()
+
+    async def _on_error(self, context, error):  # pylint: disable=unused-argument
+        self.turn_errors.append(error)
+
+
+@pytest.fixture
+def connector_bot(tmp_path):
+    """ Builds a ConnectorBot around a given FakeConnector, storing files under tmp_path. """
+
+    def build(connector: FakeConnector, max_retries: int = 0) -> ConnectorBot:
+        return ConnectorBot(str(tmp_path), connector, max_retries=max_retries)
+
+    return build
+
+
+@pytest.fixture
+def running_connector():
+    """ Wraps a FakeConnector in a RunningConnector, to be entered inside the test's event loop. """
+    return RunningConnector
@@ -0,0 +1,63 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import os
+import tempfile
+import time
+
+from botbuilder.schema import Activity, ConversationAccount
+
+from helpers import ActivityDeduplicator, SqliteActivityDeduplicator
+
+
+def activity(activity_id: str, conversation_id: str = "a:one") -> Activity:
+    return Activity(id=activity_id, channel_id="msteams", conversation=ConversationAccount(id=conversation_id))
+
+
+def test_redelivered_activities_are_dropped():
+    seen = ActivityDeduplicator()
+
+    assert seen.claim(activity("1"))
+    assert not seen.claim(activity("1"))
+    # Ids are only unique within a conversation.
+    assert seen.claim(activity("1", "a:two"))
+    # Activities without an id can't be told apart, so they always go through.
+    assert seen.claim(activity(None))
+    assert seen.claim(activity(None))
+
+
+def test_forgotten_activities_are_accepted_again():
+    seen = ActivityDeduplicator()
+
+    assert seen.claim(activity("1"))
+    seen.forget(activity("1"))
+    assert seen.claim(activity("1"))
+
+
+def test_seen_ids_expire_and_are_bounded():
+    seen = ActivityDeduplicator(ttl=0.05, max_entries=3)
+
+    assert seen.claim(activity("1"))
+    time.sleep(0.1)
+    assert seen.claim(activity("1"))
+
+    for activity_id in ("2", "3", "4"):
+        assert seen.claim(activity(activity_id))
+    # "1" was the oldest of four ids and has been dropped.
+    assert seen.claim(activity("1"))
+    assert not seen.claim(activity("4"))
+
+
+def test_redeliveries_are_dropped_across_workers():
+    path = os.path.join(tempfile.mkdtemp(), "shared.db")
+    first, second = SqliteActivityDeduplicator(path, ttl=0.05), SqliteActivityDeduplicator(path, ttl=0.05)
+    try:
+        assert first.claim(activity("1"))
+        assert not second.claim(activity("1"))
+        second.forget(activity("1"))
+        assert first.claim(activity("1"))
+        time.sleep(0.1)
+        assert second.claim(activity("1"))
+    finally:
+        first.close()
+        second.close()
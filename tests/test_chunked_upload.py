@@ -0,0 +1,106 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import os
+
+import aiohttp
+import pytest
+
+from benchmarks.fake_connector import FakeConnector
+from helpers import ChunkedUploader, FileTransferClient
+
+CHUNK_SIZE = ChunkedUploader.CHUNK_ALIGNMENT
+CHUNKS = 4
+
+
+class DroppingTransferClient(FileTransferClient):
+    """
+    Fails the uploads numbered in `drop` (from 1) with a dropped connection,
+    after sending the range unless `send_dropped` is False.
+    """
+
+    def __init__(self, drop=(), send_dropped: bool = True):
+        super().__init__(retries=0)
+        self.uploads = 0
+        self._drop = set(drop)
+        self._send_dropped = send_dropped
+
+    async def upload(self, url: str, data, headers=None):
+        self.uploads += 1
+        dropped = self.uploads in self._drop
+        if not dropped or self._send_dropped:
+            response = await super().upload(url, data, headers=headers)
+            if not dropped:
+                return response
+        raise aiohttp.ServerDisconnectedError()
+
+
+@pytest.fixture
+def report(tmp_path):
+    path = str(tmp_path / "report.csv")
+    with open(path, "wb") as file:
+        file.write(os.urandom(CHUNK_SIZE * (CHUNKS - 1) + 1000))
+    return path
+
+
+def upload(running_connector, report: str, transfer: FileTransferClient, progress=None, max_resumes: int = 3):
+    """ Upload `report` to a fresh fake upload session; returns the response or error and the session. """
+    connector = FakeConnector()
+
+    async def run():
+        async with running_connector(connector):
+            upload_url = connector.upload_url()
+            session = connector.uploads[upload_url.rsplit("/", 1)[-1]]
+            uploader = ChunkedUploader(transfer, chunk_size=CHUNK_SIZE, max_resumes=max_resumes)
+            try:
+                response = await uploader.upload_file(
+                    upload_url, report, progress=progress(session) if progress else None
+                )
+                return response, session
+            except aiohttp.ClientError as error:
+                return error, session
+            finally:
+                await transfer.close()
+
+    return asyncio.run(run())
+
+
+def test_upload_resumes_from_the_range_the_session_expects(running_connector, report):
+    rewound = []
+
+    def rewind_once(session):
+        # The session loses the first range after acknowledging it, so the next one gets a 416.
+        def progress(uploaded: int, total: int):  # pylint: disable=unused-argument
+            if not rewound:
+                rewound.append(uploaded)
+                session["received"] = 0
+        return progress
+
+    transfer = DroppingTransferClient()
+    response, session = upload(running_connector, report, transfer, progress=rewind_once)
+
+    assert response.status == 201
+    assert session["received"] == session["total"] == os.path.getsize(report)
+    assert rewound == [CHUNK_SIZE]
+    # The first two ranges go twice: the second is refused, and the upload restarts from the first.
+    assert transfer.uploads == CHUNKS + 2
+
+
+def test_upload_resumes_after_a_dropped_range(running_connector, report):
+    transfer = DroppingTransferClient(drop={2})
+    response, session = upload(running_connector, report, transfer)
+
+    assert response.status == 201
+    assert session["received"] == os.path.getsize(report)
+    # The dropped range had arrived, so the session's next expected range skips it.
+    assert transfer.uploads == CHUNKS
+
+
+def test_upload_gives_up_after_max_resumes(running_connector, report):
+    transfer = DroppingTransferClient(drop=range(1, 10), send_dropped=False)
+    error, session = upload(running_connector, report, transfer, max_resumes=2)
+
+    assert isinstance(error, aiohttp.ServerDisconnectedError)
+    assert transfer.uploads == 3
+    assert session["received"] == 0
@@ -0,0 +1,69 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from helpers import CsvIngest
+
+
+def ingest(chunks, destination: str, csv_ingest: CsvIngest = None):
+    """ Ingest `chunks`; returns the result and how many chunks had been read when the header arrived. """
+    read = []
+    headers = []
+
+    async def source():
+        for chunk in chunks:
+            read.append(chunk)
+            yield chunk
+
+    async def on_header(header):
+        headers.append((header, len(read)))
+
+    result = asyncio.run((csv_ingest or CsvIngest()).ingest(source(), destination, on_header))
+    return result, headers
+
+
+def test_header_is_reported_as_soon_as_its_row_has_arrived(tmp_path):
+    chunks = [b"\xef\xbb\xbfRegion,\"Revenue, ", b"net\",Quarter\r\nNorth,1", b"0,Q1\n", b"South,7,Q2\n"]
+
+    result, headers = ingest(chunks, str(tmp_path / "template.csv"))
+
+    # The byte-order mark is dropped and a quoted heading keeps its comma.
+    assert headers == [(["Region", "Revenue, net", "Quarter"], 2)]
+    assert result.header == ["Region", "Revenue, net", "Quarter"]
+
+
+def test_rows_are_stored_as_sent_without_being_parsed(tmp_path):
+    # Rows are validated later by ParameterStore, so malformed ones don't fail the ingest.
+    data = b'Region,Revenue\nNorth,10,extra\n"unterminated,7\n' + b"x" * 200000
+    chunks = [data[start:start + 4096] for start in range(0, len(data), 4096)]
+    destination = str(tmp_path / "template.csv")
+
+    result, headers = ingest(chunks, destination)
+
+    assert headers == [(["Region", "Revenue"], 1)]
+    with open(destination, "rb") as stored:
+        assert stored.read() == data
+    assert (result.path, result.size) == (destination, len(data))
+    assert result.sha256 == hashlib.sha256(data).hexdigest()
+    assert os.listdir(str(tmp_path)) == ["template.csv"]
+
+
+def test_header_without_a_line_break_is_read_at_the_end(tmp_path):
+    result, headers = ingest([b"Region,", b"Revenue"], str(tmp_path / "template.csv"))
+
+    assert headers == [(["Region", "Revenue"], 2)]
+    assert result.header == ["Region", "Revenue"]
+
+
+def test_overlong_header_is_rejected_and_nothing_is_kept(tmp_path):
+    chunks = [b"a" * 1024 for _ in range(4)]
+
+    with pytest.raises(ValueError):
+        ingest(chunks, str(tmp_path / "template.csv"), CsvIngest(max_header_bytes=2048))
+
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,148 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import random
+
+import pytest
+
+from helpers import IngressQueue
+
+
+class Recorder:
+    """ Processes (key, index) items after a short random sleep, recording what ran when. """
+
+    def __init__(self, fail: set = frozenset()):
+        self.started = []
+        self.finished = []
+        self.active = set()
+        self.max_active = 0
+        self.overlapped = False
+        self._fail = fail
+
+    async def __call__(self, item):
+        key, _ = item
+        self.overlapped = self.overlapped or any(active_key == key for active_key, _ in self.active)
+        self.active.add(item)
+        self.max_active = max(self.max_active, len(self.active))
+        self.started.append(item)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.005))
+            if item in self._fail:
+                raise ValueError(item)
+            return item
+        finally:
+            self.active.discard(item)
+            self.finished.append(item)
+
+
+async def drain(queue: IngressQueue):
+    while queue.pending or queue.running:
+        await asyncio.sleep(0.001)
+
+
+def test_items_run_in_order_per_key_and_in_parallel_across_keys():
+    random.seed(3)
+    recorder = Recorder()
+
+    async def run():
+        queue = IngressQueue(recorder, max_concurrency=4)
+        items = [(f"conversation-{index % 6}", index) for index in range(60)]
+        for key, index in items:
+            assert await queue.submit(key, (key, index))
+        await drain(queue)
+
+    asyncio.run(run())
+
+    assert len(recorder.finished) == 60
+    for key in {key for key, _ in recorder.started}:
+        assert [item for item in recorder.started if item[0] == key] == sorted(
+            item for item in recorder.started if item[0] == key
+        )
+    assert not recorder.overlapped
+    assert 1 < recorder.max_active <= 4
+
+
+def test_busy_key_does_not_starve_quiet_keys():
+    recorder = Recorder()
+
+    async def run():
+        queue = IngressQueue(recorder, max_concurrency=1)
+        for index in range(10):
+            await queue.submit("busy", ("busy", index))
+        await queue.submit("quiet", ("quiet", 0))
+        await drain(queue)
+
+    asyncio.run(run())
+
+    # The quiet conversation waits for the running turn only, not for the busy backlog.
+    assert recorder.started[:3] == [("busy", 0), ("quiet", 0), ("busy", 1)]
+
+
+def test_errors_reach_the_caller_and_later_items_still_run():
+    recorder = Recorder(fail={("a", 0), ("b", 0)})
+
+    async def run():
+        queue = IngressQueue(recorder)
+        # A background item's error is logged; the key's next item still runs.
+        await queue.submit("b", ("b", 0))
+        with pytest.raises(ValueError):
+            await queue.run("a", ("a", 0))
+        second = await queue.run("a", ("a", 1))
+        third = await queue.run("b", ("b", 1))
+        return second, third
+
+    assert asyncio.run(run()) == (("a", 1), ("b", 1))
+
+
+def test_submit_gives_up_when_the_queue_is_full():
+    async def process(item):  # pylint: disable=unused-argument
+        await asyncio.sleep(1)
+
+    async def run():
+        queue = IngressQueue(process, max_concurrency=1, max_pending=1, enqueue_timeout=0.05)
+        accepted = [await queue.submit("a", index) for index in range(3)]
+        # Turns the caller waits for count against the same bound.
+        with pytest.raises(asyncio.QueueFull):
+            await queue.run("b", 0)
+        await queue.close()
+        return accepted
+
+    # One item runs, one waits, and the third finds no room.
+    assert asyncio.run(run()) == [True, True, False]
+
+
+def test_close_cancels_running_and_queued_items():
+    async def run():
+        running = asyncio.Event()
+
+        async def process(item):  # pylint: disable=unused-argument
+            running.set()
+            await asyncio.sleep(10)
+
+        queue = IngressQueue(process, max_concurrency=1)
+        first = asyncio.ensure_future(queue.run("a", 0))
+        queued = asyncio.ensure_future(queue.run("a", 1))
+        await running.wait()
+        await queue.close(timeout=0.01)
+        results = await asyncio.gather(first, queued, return_exceptions=True)
+        return results, queue.pending, queue.running
+
+    results, pending, running = asyncio.run(run())
+
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert (pending, running) == (0, 0)
+
+
+def test_close_lets_queued_items_finish_within_the_timeout():
+    recorder = Recorder()
+
+    async def run():
+        queue = IngressQueue(recorder, max_concurrency=2)
+        for index in range(10):
+            await queue.submit(f"conversation-{index % 3}", (f"conversation-{index % 3}", index))
+        await queue.close(timeout=5)
+
+    asyncio.run(run())
+
+    assert len(recorder.finished) == 10
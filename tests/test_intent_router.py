@@ -0,0 +1,68 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+from helpers import IntentRouter
+
+
+async def handler():
+    pass
+
+
+def router(*keywords: str) -> IntentRouter:
+    intents = IntentRouter()
+    for keyword in keywords:
+        intents.add_keyword(keyword, handler)
+    intents.set_fallback(handler)
+    return intents
+
+
+def intent(intents: IntentRouter, text: str) -> str:
+    return intents.resolve(text)[0]
+
+
+def test_first_registered_keyword_wins():
+    intents = router("hello", "report", "settings")
+
+    assert intent(intents, "show the settings of my report") == "report"
+    assert intent(intents, "report settings, hello") == "hello"
+    assert intent(intents, "settings") == "settings"
+    assert intent(intents, "nothing to see here") == "fallback"
+
+
+def test_overlapping_keywords_are_all_found():
+    intents = router("port", "report", "Yes, I want to see the Report.")
+
+    # "port" starts inside "report", and still wins as the earlier registration.
+    assert intent(intents, "report") == "port"
+    assert intent(router("Yes, I want to see the Report.", "Report"), "Yes, I want to see the Report.") == (
+        "Yes, I want to see the Report."
+    )
+    assert intent(router("reports", "report"), "my reports") == "reports"
+    assert intent(router("report", "reports"), "my reports") == "report"
+
+
+def test_keywords_are_case_sensitive_and_literal():
+    intents = router("MessageAllMembers", "a.b")
+
+    assert intent(intents, "MessageAllMembers") == "MessageAllMembers"
+    assert intent(intents, "messageallmembers") == "fallback"
+    assert intent(intents, "axb") == "fallback"
+    assert intent(intents, "a.b") == "a.b"
+
+
+def test_patterns_match_the_whole_text_in_registration_order():
+    intents = router("hello")
+    intents.add_pattern("-*[0-9]*", handler, "threshold")
+    intents.add_keyword("5", handler, "five")
+
+    assert intent(intents, "-5") == "threshold"
+    assert intent(intents, "hello 5") == "hello"
+    assert intent(intents, "a 5") == "five"
+
+
+def test_exact_values_are_matched_before_keywords():
+    intents = router("report")
+    intents.add_exact("No, I don't want to see the Report.", handler, "decline_report")
+
+    assert intent(intents, "  No, I don't want to see the Report.\n") == "decline_report"
+    assert intent(intents, "No, I don't want to see the report.") == "report"
@@ -0,0 +1,64 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import random
+
+from botbuilder.schema.teams import TeamsChannelAccount
+
+from benchmarks.fake_connector import FakeConnector
+
+ROSTER_SIZE = 20
+
+
+def message_members(connector_bot, throttle_rate: float, max_retries: int):
+    """
+    Message a roster through `_create_member_conversation` against a fake
+    connector that throttles `throttle_rate` of the calls. Returns the connector,
+    the fan-out result and the errors that reached the adapter's on_turn_error.
+    """
+    random.seed(7)
+    connector = FakeConnector(throttle_rate=throttle_rate, retry_after=0.01, roster_size=ROSTER_SIZE)
+    harness = connector_bot(connector, max_retries=max_retries)
+
+    async def run():
+        async with harness:
+            bot = harness.bot
+            reference = harness.reference("a:personal")
+            members = [TeamsChannelAccount().deserialize(connector.member(index)) for index in range(ROSTER_SIZE)]
+            results = []
+
+            async def fan_out(turn_context):
+                results.append(
+                    await bot._fan_out.run(  # pylint: disable=protected-access
+                        members,
+                        lambda member: bot._create_member_conversation(  # pylint: disable=protected-access
+                            turn_context, reference, member, store_reference=False
+                        ),
+                    )
+                )
+
+            await harness.continue_conversation(reference, fan_out)
+            return results[0]
+
+    result = asyncio.run(run())
+    return connector, result, harness.turn_errors
+
+
+def test_throttled_member_sends_are_retried(connector_bot):
+    connector, result, turn_errors = message_members(connector_bot, throttle_rate=0.5, max_retries=50)
+
+    assert connector.throttled > 0
+    assert not result.failed
+    assert len(result.delivered) == ROSTER_SIZE
+    assert connector.member_messages == ROSTER_SIZE
+    assert not turn_errors
+
+
+def test_failed_member_sends_are_counted_as_failed(connector_bot):
+    connector, result, turn_errors = message_members(connector_bot, throttle_rate=0.5, max_retries=0)
+
+    assert result.failed
+    assert len(result.delivered) == connector.member_messages
+    assert len(result.delivered) + len(result.failed) == ROSTER_SIZE
+    assert not turn_errors
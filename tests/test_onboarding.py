@@ -0,0 +1,75 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+
+from botbuilder.schema.teams import TeamsChannelAccount
+
+from benchmarks.fake_connector import FakeConnector
+
+ROSTER_SIZE = 20
+GROUP_ID = "19:group@thread.v2"
+
+
+async def schedule_onboarding(harness) -> bool:
+    """ Schedule onboarding from a group turn and wait for the job; False if none was started. """
+    bot = harness.bot
+
+    async def schedule(turn_context):
+        bot._schedule_onboarding(turn_context)  # pylint: disable=protected-access
+
+    await harness.continue_conversation(harness.reference(GROUP_ID, "groupChat"), schedule)
+    if GROUP_ID not in bot._onboarding_jobs:  # pylint: disable=protected-access
+        return False
+    while GROUP_ID in bot._onboarding_jobs:  # pylint: disable=protected-access
+        await asyncio.sleep(0.01)
+    return True
+
+
+def test_unchanged_roster_is_not_onboarded_again(connector_bot):
+    connector = FakeConnector(roster_size=ROSTER_SIZE)
+    harness = connector_bot(connector)
+
+    async def run():
+        async with harness:
+            first = await schedule_onboarding(harness)
+            paged = connector.requests["paged_members"]
+            second = await schedule_onboarding(harness)
+            harness.bot._roster_cache.add_members(  # pylint: disable=protected-access
+                GROUP_ID, [TeamsChannelAccount().deserialize(connector.member(ROSTER_SIZE))]
+            )
+            after_change = await schedule_onboarding(harness)
+            return first, second, after_change, paged
+
+    first, second, after_change, paged = asyncio.run(run())
+
+    assert (first, second, after_change) == (True, False, True)
+    assert connector.requests["paged_members"] == paged
+    assert connector.member_messages == ROSTER_SIZE + 1
+    assert not harness.turn_errors
+
+
+def test_failed_welcome_is_not_recorded_as_onboarded(connector_bot):
+    connector = FakeConnector(roster_size=ROSTER_SIZE)
+    harness = connector_bot(connector)
+
+    async def run():
+        async with harness:
+            bot = harness.bot
+            bot._roster_cache.set(  # pylint: disable=protected-access
+                GROUP_ID, [TeamsChannelAccount().deserialize(connector.member(index)) for index in range(ROSTER_SIZE)]
+            )
+            connector.throttle_rate = 1.0
+            failed = await schedule_onboarding(harness)
+            onboarded = bot._onboarding.count("tenant")  # pylint: disable=protected-access
+            connector.throttle_rate = 0.0
+            retried = await schedule_onboarding(harness)
+            return failed, onboarded, retried, bot._onboarding.count("tenant")  # pylint: disable=protected-access
+
+    failed, onboarded, retried, onboarded_after_retry = asyncio.run(run())
+
+    assert failed and onboarded == 0
+    assert retried and onboarded_after_retry == ROSTER_SIZE
+    assert connector.member_messages == ROSTER_SIZE
+    # The failures were handled by the job, not reported to the group by on_turn_error.
+    assert not harness.turn_errors
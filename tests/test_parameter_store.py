@@ -0,0 +1,89 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import hashlib
+import os
+
+import numpy as np
+
+from helpers import ParameterStore, load_parameters
+
+REPORT = "Region,Quarter,Revenue\nNorth,Q1,10.5\nSouth,Q2,7\n"
+TEMPLATE = 'Region,Revenue\nNorth,12\n"South, East",\nWest,-3.25e2\n'
+
+
+def write(path, text: str) -> str:
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def sha256(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def test_valid_template_round_trips_through_column_files(tmp_path):
+    report = write(tmp_path / "report.csv", REPORT)
+    template = write(tmp_path / "template.csv", TEMPLATE)
+    store = ParameterStore(str(tmp_path / "store"), batch_rows=2)
+
+    result = asyncio.run(store.parse(template, sha256(template), report, sha256(report)))
+
+    assert result.valid
+    assert (result.header, result.rows) == (["Region", "Revenue"], 3)
+    table = load_parameters(result.path)
+    assert table.types == ["text", "number"]
+    assert sorted(os.listdir(result.path)) == ["0.npy", "1.npy", ParameterStore.MANIFEST]
+    assert table.column("Region").tolist() == ["North", "South, East", "West"]
+    revenue = table.column("Revenue")
+    assert revenue.dtype == np.float64
+    assert revenue[0] == 12 and np.isnan(revenue[1]) and revenue[2] == -325
+
+
+def test_templates_with_the_same_content_are_stored_once(tmp_path):
+    report = write(tmp_path / "report.csv", REPORT)
+    first = write(tmp_path / "first.csv", TEMPLATE)
+    second = write(tmp_path / "second.csv", TEMPLATE)
+    store = ParameterStore(str(tmp_path / "store"))
+
+    async def run():
+        stored = await store.parse(first, sha256(first), report, sha256(report))
+        # The stored copy is found by content hash, without reading the second upload.
+        os.remove(second)
+        again = await store.parse(second, sha256(first), report, sha256(report))
+        return stored, again
+
+    stored, again = asyncio.run(run())
+
+    assert again.valid and again.path == stored.path
+    assert (again.header, again.rows) == (stored.header, stored.rows)
+    assert os.listdir(str(tmp_path / "store")) == [os.path.basename(stored.path)]
+
+
+def test_headings_are_checked_against_the_report(tmp_path):
+    report = write(tmp_path / "report.csv", REPORT)
+    template = write(tmp_path / "template.csv", "Region,,Region,Profit\nNorth,1,North,2\n")
+    store = ParameterStore(str(tmp_path / "store"))
+
+    result = asyncio.run(store.parse(template, sha256(template), report, sha256(report)))
+
+    assert not result.valid and result.path is None
+    assert [(error.row, error.column, error.heading) for error in result.errors] == [
+        (1, 2, ""), (1, 3, "Region"), (1, 4, "Profit"),
+    ]
+    assert "not a report column" in str(result.errors[2])
+    assert not os.path.exists(str(tmp_path / "store"))
+
+
+def test_errors_are_all_counted_and_the_first_are_kept_in_order(tmp_path):
+    report = write(tmp_path / "report.csv", REPORT)
+    rows = "".join(f"North,n/a{index}\n" if index % 2 else "South,1,extra\n" for index in range(30))
+    template = write(tmp_path / "template.csv", "Region,Revenue\n" + rows)
+    store = ParameterStore(str(tmp_path / "store"), batch_rows=7, max_errors=5)
+
+    result = asyncio.run(store.parse(template, sha256(template), report, sha256(report)))
+
+    assert result.error_count == 30 and result.rows == 30
+    assert [(error.row, error.column) for error in result.errors] == [(2, 3), (3, 2), (4, 3), (5, 2), (6, 3)]
+    assert str(result.errors[1]) == "Row 3, column 2 (Revenue): 'n/a1' is not a number"
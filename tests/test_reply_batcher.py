@@ -0,0 +1,64 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import random
+
+from botbuilder.core import CardFactory, MessageFactory
+from botbuilder.schema import HeroCard
+
+from benchmarks.fake_connector import FakeConnector
+from helpers import ReplyBatchingMiddleware
+
+
+def run_turn(connector_bot, connector: FakeConnector, callback, max_retries: int = 3):
+    """ Run `callback` in a proactive turn of a batching adapter; returns what the connector had mid-turn. """
+    harness = connector_bot(connector)
+    harness.adapter.use(ReplyBatchingMiddleware(max_retries=max_retries))
+    during_turn = []
+
+    async def turn(turn_context):
+        await callback(turn_context)
+        during_turn.extend(connector.activities)
+
+    async def run():
+        async with harness:
+            await harness.continue_conversation(harness.reference("a:personal"), turn)
+
+    asyncio.run(run())
+    assert not harness.turn_errors
+    return during_turn
+
+
+def test_replies_are_sent_in_order_when_the_turn_ends(connector_bot):
+    connector = FakeConnector()
+
+    async def replies(turn_context):
+        await turn_context.send_activity("Here is your report.")
+        await turn_context.send_activity("It covers the last quarter.")
+        await turn_context.send_activity(MessageFactory.attachment(CardFactory.hero_card(HeroCard(title="Report"))))
+        await turn_context.send_activity("Please type 'settings' to change it.")
+
+    during_turn = run_turn(connector_bot, connector, replies)
+
+    assert not during_turn
+    received = [(activity.get("text"), len(activity.get("attachments") or [])) for activity in connector.activities]
+    # Only the two adjacent texts are joined; the text after the card stays after it.
+    assert received == [
+        ("Here is your report.\n\nIt covers the last quarter.", 0),
+        (None, 1),
+        ("Please type 'settings' to change it.", 0),
+    ]
+
+
+def test_throttled_replies_are_retried(connector_bot):
+    random.seed(1)
+    connector = FakeConnector(throttle_rate=0.5, retry_after=0.01)
+
+    async def reply(turn_context):
+        await turn_context.send_activity("Your report is ready.")
+
+    run_turn(connector_bot, connector, reply, max_retries=50)
+
+    assert connector.throttled > 0
+    assert [activity["text"] for activity in connector.activities] == ["Your report is ready."]
@@ -0,0 +1,164 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+
+import pytest
+from botbuilder.schema import ChannelAccount, ConversationAccount, ConversationReference
+
+from helpers import FanOutScheduler, SqliteBroadcastJobManager, SqliteReferenceStore
+
+ITEMS = [f"29:member-{index}" for index in range(50)]
+
+
+def broadcast_manager(path: str, sent: Counter, lease: float = 30) -> SqliteBroadcastJobManager:
+    async def send(item: str):
+        await asyncio.sleep(0)
+        sent[item] += 1
+
+    return SqliteBroadcastJobManager(
+        path,
+        FanOutScheduler(rate=1000, burst=1000),
+        send,
+        load=lambda item_key: item_key,
+        shard_size=10,
+        lease=lease,
+    )
+
+
+async def wait_for(job_id: str, manager: SqliteBroadcastJobManager, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while manager.get(job_id).status != "completed":
+        assert time.monotonic() < deadline, manager.get(job_id).to_dict()
+        await asyncio.sleep(0.01)
+    return manager.get(job_id)
+
+
+def test_broadcast_shards_are_sent_once_across_workers():
+    path = os.path.join(tempfile.mkdtemp(), "shared.db")
+    sent = Counter()
+
+    async def run():
+        managers = [broadcast_manager(path, sent) for _ in range(3)]
+        job = managers[0].submit(ITEMS)
+        workers = [asyncio.ensure_future(manager.run_worker(0.01)) for manager in managers]
+        try:
+            return await wait_for(job.id, managers[1])
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            for manager in managers:
+                await manager.close()
+
+    job = asyncio.run(run())
+
+    assert job.delivered == len(ITEMS)
+    assert sorted(sent) == sorted(ITEMS)
+    assert set(sent.values()) == {1}
+
+
+def test_expired_shard_lease_is_resumed_by_another_worker():
+    path = os.path.join(tempfile.mkdtemp(), "shared.db")
+    sent = Counter()
+
+    async def run():
+        dead = broadcast_manager(path, sent, lease=0.2)
+        alive = broadcast_manager(path, sent, lease=0.2)
+        job = dead.submit(ITEMS)
+        # A worker that claims a shard and then stops heartbeating.
+        job_id, shard = dead._claim_shard()  # pylint: disable=protected-access
+        dead.connection.execute(
+            "UPDATE broadcast_items SET status = ? WHERE job_id = ? AND shard = ? AND item_key = ?",
+            (SqliteBroadcastJobManager.DELIVERED, job_id, shard, ITEMS[shard * 10]),
+        )
+        dead.connection.commit()
+        running = alive.running
+        worker = asyncio.ensure_future(alive.run_worker(0.01))
+        try:
+            return running, await wait_for(job.id, alive)
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+            await dead.close()
+            await alive.close()
+
+    running, job = asyncio.run(run())
+
+    assert running == 1
+    assert job.delivered == len(ITEMS)
+    # The item the dead worker recorded as delivered isn't sent again.
+    assert len(sent) == len(ITEMS) - 1
+    assert set(sent.values()) == {1}
+
+
+def test_finished_broadcasts_are_not_counted_as_running():
+    path = os.path.join(tempfile.mkdtemp(), "shared.db")
+
+    async def run():
+        manager = broadcast_manager(path, Counter())
+        queued = manager.running
+        job = manager.submit(ITEMS)
+        worker = asyncio.ensure_future(manager.run_worker(0.01))
+        try:
+            await wait_for(job.id, manager)
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+        running = manager.running
+        await manager.close()
+        return queued, running
+
+    assert asyncio.run(run()) == (0, 0)
+
+
+def reference(user_id: str, service_url: str) -> ConversationReference:
+    return ConversationReference(
+        channel_id="msteams",
+        service_url=service_url,
+        user=ChannelAccount(id=user_id, name="User"),
+        conversation=ConversationAccount(id=f"a:{user_id}", conversation_type="personal"),
+    )
+
+
+def test_cached_references_expire_after_other_workers_write():
+    path = os.path.join(tempfile.mkdtemp(), "references.db")
+    reader = SqliteReferenceStore(path, cache_ttl=0.05)
+    writer = SqliteReferenceStore(path)
+    try:
+        writer["29:user"] = reference("29:user", "https://one.example")
+        assert reader["29:user"].service_url == "https://one.example"
+
+        writer["29:user"] = reference("29:user", "https://two.example")
+        assert reader["29:user"].service_url == "https://one.example"
+        time.sleep(0.1)
+        assert reader["29:user"].service_url == "https://two.example"
+
+        del writer["29:user"]
+        time.sleep(0.1)
+        assert "29:user" not in reader
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_busy_database_fails_fast():
+    path = os.path.join(tempfile.mkdtemp(), "references.db")
+    store = SqliteReferenceStore(path)
+    store["29:user"] = reference("29:user", "https://one.example")
+    blocker = sqlite3.connect(path)
+    blocker.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            store["29:other"] = reference("29:other", "https://one.example")
+    finally:
+        blocker.rollback()
+        blocker.close()
+        store.close()
+    assert time.monotonic() - started < 5